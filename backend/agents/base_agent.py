@@ -1,10 +1,16 @@
 import os
+import re
 import time
 from abc import ABC, abstractmethod
 from typing import Dict, Any, Optional, List
 import google.genai as genai
 import threading
 
+from utils.gemini_cassette import GeminiCassette
+from utils.stage_timer import record_agent_call
+from utils.tracing import span, log_event, run_in_context, gen_ai_usage_attributes, SPAN_KIND_CLIENT
+from .scheduler import GeminiCallScheduler, get_scheduling_context
+
 
 class GeminiAPIKeyManager:
     """
@@ -28,7 +34,7 @@ class GeminiAPIKeyManager:
             self.current_index = 0
             self.usage_lock = threading.Lock()
             self.initialized = True
-            print(f"🔑 GeminiAPIKeyManager initialized with {len(self.api_keys)} API keys")
+            log_event("gemini_key_manager_initialized", keys=len(self.api_keys))
     
     def _load_api_keys(self) -> List[str]:
         """Load all available API keys from environment variables."""
@@ -57,9 +63,8 @@ class GeminiAPIKeyManager:
             try:
                 client = genai.Client(api_key=api_key, vertexai=False)
                 clients.append(client)
-                print(f"✅ API key {i+1} client created successfully")
             except Exception as e:
-                print(f"❌ Failed to create client for API key {i+1}: {str(e)}")
+                log_event("gemini_client_failed", "error", key_index=i + 1, error=str(e))
         
         if not clients:
             raise ValueError("No valid Gemini clients could be created")
@@ -68,12 +73,15 @@ class GeminiAPIKeyManager:
     
     def get_next_client(self) -> genai.Client:
         """Get the next client in round-robin fashion (thread-safe)."""
+        return self.get_next_client_with_index()[1]
+    
+    def get_next_client_with_index(self) -> tuple:
+        """(1-based key index, client) for the next key in round-robin order."""
         with self.usage_lock:
             client = self.clients[self.current_index]
             key_index = self.current_index + 1
             self.current_index = (self.current_index + 1) % len(self.clients)
-            print(f"🔄 Using API key {key_index}/{len(self.clients)}")
-            return client
+            return key_index, client
     
     def get_client_count(self) -> int:
         """Get the number of available clients."""
@@ -87,11 +95,20 @@ class BaseContentAgent(ABC):
     Provides common functionality like Gemini client access and standardized interfaces.
     """
     
+    # User context fields that change this agent's output. Every agent builds its
+    # prompt from _get_user_background_context and _get_language_instruction;
+    # override in subclasses that read more (or fewer) fields.
+    context_fields = ("major", "academicLevel", "languagePreference")
+    
     def __init__(self):
         # Initialize API key manager for round-robin client usage
         self.api_manager = GeminiAPIKeyManager()
+        # Shared fair scheduler so concurrent pipelines take turns on the key pool
+        self.scheduler = GeminiCallScheduler()
+        self.scheduler.configure(self.api_manager.get_client_count())
+        # Pass-through unless GEMINI_CASSETTE_MODE records or replays traffic
+        self.cassette = GeminiCassette()
         self.model_name = 'models/gemini-2.5-flash'
-        print(f"🔧 Agent initialized with {self.api_manager.get_client_count()} API keys available")
         
     @abstractmethod
     async def generate_content(
@@ -113,6 +130,14 @@ class BaseContentAgent(ABC):
         """
         pass
     
+    @property
+    def agent_name(self) -> str:
+        """Orchestrator key for this agent (ExplanationAgent -> "explanation")."""
+        name = type(self).__name__
+        if name.endswith("Agent"):
+            name = name[:-len("Agent")]
+        return re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
+    
     def _get_user_background_context(self, user_context: Dict[str, Any]) -> str:
         """Extract user background for personalization."""
         major = user_context.get("major", "general")
@@ -136,31 +161,52 @@ class BaseContentAgent(ABC):
     async def _call_gemini(self, prompt: str) -> str:
         """Make a call to Gemini with round-robin API key selection and error handling."""
         import asyncio
-        start_time = time.time()
-        
-        # Get next available client (round-robin)
-        client = self.api_manager.get_next_client()
+        scheduling = get_scheduling_context()
         
-        try:
-            print(f"🤖 Making Gemini API call... (prompt length: {len(prompt)} chars)")
+        async with self.scheduler.slot(scheduling["priority"], scheduling["user_id"]) as queue_wait:
+            start_time = time.time()
             
-            # Run the synchronous Gemini call in a thread pool to make it truly async
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None, 
-                lambda: client.models.generate_content(
-                    model=self.model_name,
-                    contents=[prompt]
-                )
-            )
+            # Get next available client (round-robin)
+            key_index, client = self.api_manager.get_next_client_with_index()
             
-            api_time = time.time() - start_time
-            print(f"✅ Gemini API call completed in {api_time:.2f}s")
-            return response.text if hasattr(response, 'text') else str(response)
-        except Exception as e:
-            api_time = time.time() - start_time
-            print(f"❌ Gemini API call FAILED after {api_time:.2f}s: {str(e)}")
-            raise Exception(f"Gemini API call failed: {str(e)}")
+            with span(
+                "gemini.generate_content", SPAN_KIND_CLIENT,
+                **{
+                    "gen_ai.system": "gemini",
+                    "gen_ai.request.model": self.model_name,
+                    "gemini.key_index": key_index,
+                    "gemini.prompt_chars": len(prompt),
+                    "agent.name": self.agent_name,
+                    "scheduler.priority": scheduling["priority"],
+                    "scheduler.queue_wait_s": round(queue_wait, 4),
+                }
+            ) as call_span:
+                try:
+                    # Run the synchronous Gemini call in a thread pool to make it truly async
+                    loop = asyncio.get_event_loop()
+                    response = await loop.run_in_executor(
+                        None,
+                        run_in_context(
+                            self.cassette.generate_content,
+                            client,
+                            f"agent:{type(self).__name__}",
+                            model=self.model_name,
+                            contents=[prompt]
+                        )
+                    )
+                    
+                    api_time = time.time() - start_time
+                    record_agent_call(self.agent_name, queue_wait, api_time)
+                    call_span.set_attributes(gen_ai_usage_attributes(response))
+                    log_event("gemini_call_completed", agent=self.agent_name, key_index=key_index,
+                              api_time_s=round(api_time, 3), queue_wait_s=round(queue_wait, 3))
+                    return response.text if hasattr(response, 'text') else str(response)
+                except Exception as e:
+                    api_time = time.time() - start_time
+                    record_agent_call(self.agent_name, queue_wait, api_time)
+                    log_event("gemini_call_failed", "warning", agent=self.agent_name, key_index=key_index,
+                              api_time_s=round(api_time, 3), error=str(e))
+                    raise Exception(f"Gemini API call failed: {str(e)}")
     
     def _strip_code_fences(self, text: str) -> str:
         """Remove code fences from Gemini responses."""
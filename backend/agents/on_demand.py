@@ -0,0 +1,72 @@
+import asyncio
+from typing import Dict, Any, List, Tuple
+from fastapi import HTTPException
+
+from .orchestrator import ContentOrchestrator
+from utils.lecture_store import LectureStore
+from utils.tracing import log_event
+
+
+class OnDemandFormatGenerator:
+    """
+    Generates learning formats for stored lectures on first request (lazy mode).
+
+    The complete pipeline persists the analysis and work orders; each format is
+    then produced by a single agent the first time it is requested and stored
+    for every later request. Concurrent requests for the same format share one
+    generation instead of paying for it twice.
+    """
+
+    def __init__(self, orchestrator: ContentOrchestrator, store: LectureStore):
+        self.orchestrator = orchestrator
+        self.store = store
+        self._in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+    async def get_format(self, lecture_id: str, format_name: str, priority: str = "interactive") -> Tuple[Dict[str, Any], bool]:
+        """
+        Return (format entry, generated_now) for a lecture, generating it if needed.
+        """
+        stored = await self.store.get_format(lecture_id, format_name)
+        if stored is not None:
+            return stored, False
+
+        key = (lecture_id, format_name)
+        in_flight = self._in_flight.get(key)
+        if in_flight is None:
+            # Registered before any await, so concurrent requests can't each start one
+            in_flight = asyncio.ensure_future(self._generate(lecture_id, format_name, priority))
+            self._in_flight[key] = in_flight
+            in_flight.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        # Shield so one client disconnecting does not cancel a generation others wait on
+        return await asyncio.shield(in_flight), True
+
+    async def _generate(self, lecture_id: str, format_name: str, priority: str) -> Dict[str, Any]:
+        lecture = await self.store.get_lecture(lecture_id)
+        if lecture is None:
+            raise HTTPException(status_code=404, detail=f"Lecture '{lecture_id}' not found")
+
+        analysis = lecture.get("analysis", {})
+        user_context = dict(lecture.get("userContext") or {})
+        user_context["priority"] = priority
+
+        log_event("format_generating", format=format_name, lecture_id=lecture["lectureId"], priority=priority)
+        entry = await self.orchestrator.generate_format(
+            format_name,
+            analysis.get("work_orders", {}),
+            analysis.get("gemini_analysis", {}),
+            user_context
+        )
+
+        # Only keep real content; failures and fallbacks are retried on the next request
+        if self.orchestrator.is_storable(entry):
+            await self.store.save_format(lecture["lectureId"], format_name, entry)
+        return entry
+
+    async def prefetch(self, lecture_id: str, format_names: List[str]) -> None:
+        """Generate formats in the given priority order as background work."""
+        for format_name in format_names:
+            try:
+                await self.get_format(lecture_id, format_name, priority="background")
+            except Exception as e:
+                log_event("prefetch_failed", "warning", format=format_name, lecture_id=lecture_id, error=str(e))
@@ -10,6 +10,9 @@ from .visualization_agent import VisualizationAgent
 from .application_agent import ApplicationAgent
 from .summary_agent import SummaryAgent
 from .quiz_generation_agent import QuizGenerationAgent
+from .scheduler import scheduling_context
+from .result_cache import AgentResultCache
+from utils.tracing import span, log_event
 
 
 class ContentOrchestrator:
@@ -20,6 +23,27 @@ class ContentOrchestrator:
     of specialized agents to generate personalized learning content.
     """
     
+    # Map learning formats to the agent that produces them (video generation & animation removed for performance)
+    FORMAT_MAPPING = {
+        'concept_explanation': 'explanation', 
+        # 'static_animation': 'animation_config',  # COMMENTED OUT - performance optimization
+        'code_equations': 'code_equation',
+        'visual_diagrams': 'visualization',
+        'practice_problems': 'quiz_generation',
+        'real_world_applications': 'application',
+        'summary_cards': 'summary'
+    }
+    
+    # Background prefetch order for lazy mode - most opened formats first
+    PREFETCH_ORDER = [
+        'summary_cards',
+        'practice_problems',
+        'concept_explanation',
+        'real_world_applications',
+        'code_equations',
+        'visual_diagrams'
+    ]
+    
     def __init__(self):
         # Initialize all specialized agents (video generation & animation removed for performance)
         self.agents = {
@@ -31,6 +55,12 @@ class ContentOrchestrator:
             'summary': SummaryAgent(),
             'quiz_generation': QuizGenerationAgent()
         }
+        # User context fields that personalize agent output: exactly what the agents read
+        self.personalization_fields = tuple(sorted(
+            set().union(*(agent.context_fields for agent in self.agents.values()))
+        ))
+        # Shared results for users in the same personalization bucket
+        self.result_cache = AgentResultCache(self.personalization_fields)
         
     async def run_single_agent(
         self,
@@ -57,7 +87,7 @@ class ContentOrchestrator:
                 detail=f"Unknown agent type: {agent_type}. Available: {list(self.agents.keys())}"
             )
         
-        print(f"🔧 Running single agent: {agent_type}")
+        log_event("single_agent_started", agent=agent_type)
         start_time = time.time()
         
         try:
@@ -98,33 +128,47 @@ class ContentOrchestrator:
         Returns:
             Dictionary with generated content from all agents
         """
+        with span("orchestrate", **{"orchestrator.work_orders": len(work_orders)}) as current:
+            result = await self._orchestrate(work_orders, gemini_analysis, user_context)
+            summary = result["orchestration_summary"]
+            current.set_attributes({
+                "orchestrator.successful_agents": summary["successful_agents"],
+                "orchestrator.failed_agents": summary["failed_agents"],
+                "orchestrator.cache_hits": summary["cache_hits"],
+            })
+            return result
+    
+    async def _orchestrate(
+        self, 
+        work_orders: Dict[str, Any], 
+        gemini_analysis: Dict[str, Any],
+        user_context: Dict[str, Any]
+    ) -> Dict[str, Any]:
         start_time = time.time()
-        print(f"🎯 Starting content orchestration with {len(self.agents)} specialized agents...")
-        print(f"⏰ Orchestration started at: {time.strftime('%H:%M:%S')}")
+        log_event("orchestration_started", agents=len(self.agents), work_orders=len(work_orders))
         
         # Prepare tasks for parallel execution
         tasks = []
         agent_names = []
         agent_start_times = {}
+        cache_hits = set()
         
         for agent_type, order in work_orders.items():
             if agent_type in self.agents:
-                print(f"📋 Queuing {agent_type} agent with work order: {str(order)[:100]}...")
                 task = self._execute_agent_safely(
                     agent_type, 
                     order, 
                     gemini_analysis, 
-                    user_context
+                    user_context,
+                    cache_hits=cache_hits
                 )
                 tasks.append(task)
                 agent_names.append(agent_type)
                 agent_start_times[agent_type] = time.time()
             else:
-                print(f"⚠️  Unknown agent type: {agent_type}")
+                log_event("unknown_agent_type", "warning", agent=agent_type)
         
         # Execute agents with staggered start to reduce API rate limiting
-        print(f"🚀 Executing {len(tasks)} agents with staggered start...")
-        print(f"🔧 Agent types being executed: {', '.join(agent_names)}")
         
         # Intelligent staggering based on available API keys
         from .base_agent import GeminiAPIKeyManager
@@ -133,7 +177,7 @@ class ContentOrchestrator:
         
         # Reduce stagger delay if we have multiple API keys
         stagger_delay = 0.2 if api_key_count > 1 else 1.0
-        print(f"🔑 Using {api_key_count} API keys with {stagger_delay}s stagger delay")
+        log_event("agents_dispatched", agents=agent_names, api_keys=api_key_count, stagger_delay_s=stagger_delay)
         
         staggered_tasks = []
         for i, task in enumerate(tasks):
@@ -144,14 +188,25 @@ class ContentOrchestrator:
                 staggered_tasks.append(task)
         
         # Add timeout and better error handling
+        agent_tasks = [asyncio.ensure_future(task) for task in staggered_tasks]
         try:
-            results = await asyncio.wait_for(
-                asyncio.gather(*staggered_tasks, return_exceptions=True),
-                timeout=300  # 5 minute timeout
-            )
-        except asyncio.TimeoutError:
-            print("⏱️ TIMEOUT: Some agents took longer than 5 minutes!")
-            results = [Exception("Timeout after 5 minutes") for _ in staggered_tasks]
+            _, pending = await asyncio.wait(agent_tasks, timeout=300)  # 5 minute timeout
+        except asyncio.CancelledError:
+            # Request cancelled (client disconnected): stop agents that are queued or running,
+            # which hands their scheduler slots to other requests
+            for task in agent_tasks:
+                task.cancel()
+            await asyncio.gather(*agent_tasks, return_exceptions=True)
+            raise
+        if pending:
+            log_event("orchestration_timeout", "error", timeout_s=300, pending_agents=len(pending))
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        results = [
+            Exception("Timeout after 5 minutes") if task.cancelled() else (task.exception() or task.result())
+            for task in agent_tasks
+        ]
         
         # Process results and handle any failures
         content_results = {}
@@ -162,23 +217,13 @@ class ContentOrchestrator:
             agent_name = agent_names[i]
             execution_time = time.time() - agent_start_times[agent_name]
             
+            content_results[agent_name] = self._build_agent_entry(
+                agent_name, result, execution_time, agent_name in cache_hits
+            )
             if isinstance(result, Exception):
-                print(f"❌ Agent {agent_name} FAILED after {execution_time:.2f}s: {str(result)}")
                 failed_agents.append(agent_name)
-                content_results[agent_name] = {
-                    "status": "failed",
-                    "error": str(result),
-                    "execution_time": execution_time,
-                    "fallback_content": self._generate_fallback_content(agent_name)
-                }
             else:
-                print(f"✅ Agent {agent_name} SUCCESS in {execution_time:.2f}s")
                 successful_agents += 1
-                content_results[agent_name] = {
-                    "status": "success",
-                    "execution_time": execution_time,
-                    "content": result
-                }
         
         total_time = time.time() - start_time
         orchestration_summary = {
@@ -186,13 +231,15 @@ class ContentOrchestrator:
             "successful_agents": successful_agents,
             "failed_agents": len(failed_agents),
             "failed_agent_names": failed_agents,
+            "cache_hits": len(cache_hits),
+            "cached_agent_names": sorted(cache_hits),
             "execution_mode": "parallel",
             "total_execution_time": total_time,
             "average_agent_time": total_time / len(tasks) if tasks else 0
         }
         
-        print(f"🎉 Content orchestration complete! {successful_agents}/{len(tasks)} agents successful")
-        print(f"⏱️ Total orchestration time: {total_time:.2f} seconds")
+        log_event("orchestration_completed", successful_agents=successful_agents, total_agents=len(tasks),
+                  cache_hits=len(cache_hits), total_time_s=round(total_time, 3))
         
         return {
             "orchestration_summary": orchestration_summary,
@@ -200,34 +247,124 @@ class ContentOrchestrator:
             "learning_formats": self._structure_learning_formats(content_results)
         }
     
+    async def generate_format(
+        self,
+        format_name: str,
+        work_orders: Dict[str, Any],
+        gemini_analysis: Dict[str, Any],
+        user_context: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Generate a single learning format on demand (lazy mode).
+        
+        Returns the same entry shape as one item of ``learning_formats``.
+        """
+        agent_name = self.FORMAT_MAPPING.get(format_name)
+        if not agent_name or agent_name not in self.agents:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Unknown learning format: {format_name}. Available: {list(self.FORMAT_MAPPING.keys())}"
+            )
+        
+        start_time = time.time()
+        cache_hits = set()
+        try:
+            result = await self._execute_agent_safely(
+                agent_name,
+                work_orders.get(agent_name, {}),
+                gemini_analysis,
+                user_context,
+                cache_hits=cache_hits
+            )
+        except Exception as e:
+            result = e
+        return self._build_agent_entry(agent_name, result, time.time() - start_time, agent_name in cache_hits)
+    
+    @staticmethod
+    def is_storable(entry: Dict[str, Any]) -> bool:
+        """True for real agent output; failures and canned fallback content must not be stored."""
+        content = entry.get("content")
+        return entry.get("status") == "success" and not (
+            isinstance(content, dict) and content.get("status") == "fallback_generated"
+        )
+    
+    def changed_personalization_fields(self, old_context: Dict[str, Any], new_context: Dict[str, Any]) -> List[str]:
+        """Personalization fields whose value differs between two user contexts."""
+        return [
+            field for field in self.personalization_fields
+            if old_context.get(field) != new_context.get(field)
+        ]
+    
+    def formats_affected_by(self, changed_fields: List[str]) -> List[str]:
+        """Learning formats whose agent reads any of the changed user context fields."""
+        changed = set(changed_fields)
+        return [
+            format_name for format_name, agent_name in self.FORMAT_MAPPING.items()
+            if agent_name in self.agents and changed & set(self.agents[agent_name].context_fields)
+        ]
+    
+    def _build_agent_entry(self, agent_name: str, result: Any, execution_time: float, cache_hit: bool = False) -> Dict[str, Any]:
+        """Wrap an agent result (or exception) in the standard status envelope."""
+        if isinstance(result, Exception):
+            log_event("agent_failed", "warning", agent=agent_name, execution_time_s=round(execution_time, 3),
+                      error=str(result))
+            return {
+                "status": "failed",
+                "error": str(result),
+                "execution_time": execution_time,
+                "fallback_content": self._generate_fallback_content(agent_name)
+            }
+        return {
+            "status": "success",
+            "execution_time": execution_time,
+            "cache_hit": cache_hit,
+            "content": result
+        }
+    
     async def _execute_agent_safely(
         self, 
         agent_type: str, 
         work_order: Dict[str, Any],
         gemini_analysis: Dict[str, Any],
-        user_context: Dict[str, Any]
+        user_context: Dict[str, Any],
+        cache_hits: Optional[set] = None
     ) -> Any:
-        """Execute a single agent with error handling."""
+        """Execute a single agent with error handling, serving bucket-cached results when available."""
         agent_start = time.time()
-        try:
-            print(f"🔄 {agent_type} agent STARTING...")
-            agent = self.agents[agent_type]
-            print(f"🔧 {agent_type} agent initialized, calling generate_content...")
-            
-            result = await agent.generate_content(work_order, gemini_analysis, user_context)
-            
-            agent_time = time.time() - agent_start
-            print(f"✅ {agent_type} agent COMPLETED in {agent_time:.2f}s")
-            return result
-        except Exception as e:
-            agent_time = time.time() - agent_start
-            print(f"🚨 ERROR in {agent_type} agent after {agent_time:.2f}s: {str(e)}")
-            print(f"🔍 {agent_type} work_order keys: {list(work_order.keys()) if work_order else 'None'}")
-            raise e
+        with span(f"agent.{agent_type}", **{"agent.name": agent_type}) as current:
+            try:
+                cached = await self.result_cache.get(agent_type, work_order, gemini_analysis, user_context)
+                current.set_attribute("agent.cache_hit", cached is not None)
+                if cached is not None:
+                    log_event("agent_cache_hit", agent=agent_type)
+                    if cache_hits is not None:
+                        cache_hits.add(agent_type)
+                    return cached
+                
+                agent = self.agents[agent_type]
+                
+                # Tag this agent's Gemini calls so the shared scheduler can queue them fairly
+                with scheduling_context(user_context.get("userId"), user_context.get("priority")):
+                    result = await agent.generate_content(work_order, gemini_analysis, user_context)
+                
+                agent_time = time.time() - agent_start
+                log_event("agent_completed", agent=agent_type, execution_time_s=round(agent_time, 3))
+                await self.result_cache.set(agent_type, work_order, gemini_analysis, user_context, result)
+                return result
+            except Exception as e:
+                agent_time = time.time() - agent_start
+                log_event("agent_error", "warning", agent=agent_type, execution_time_s=round(agent_time, 3),
+                          error=str(e), work_order_keys=list(work_order.keys()) if work_order else None)
+                raise e
     
     async def _delayed_execution(self, task, delay_seconds: float):
         """Execute a task after a delay to stagger API calls."""
-        await asyncio.sleep(delay_seconds)
+        try:
+            await asyncio.sleep(delay_seconds)
+        except asyncio.CancelledError:
+            # Cancelled before starting: close the agent coroutine so it isn't reported as never awaited
+            task.close()
+            raise
         return await task
     
     def _generate_fallback_content(self, agent_name: str) -> Dict[str, Any]:
@@ -275,18 +412,7 @@ class ContentOrchestrator:
         """Structure the results into the 8 learning formats for the frontend."""
         formats = {}
         
-        # Map agent results to learning formats (video generation & animation removed for performance)
-        format_mapping = {
-            'concept_explanation': 'explanation', 
-            # 'static_animation': 'animation_config',  # COMMENTED OUT - performance optimization
-            'code_equations': 'code_equation',
-            'visual_diagrams': 'visualization',
-            'practice_problems': 'quiz_generation',
-            'real_world_applications': 'application',
-            'summary_cards': 'summary'
-        }
-        
-        for format_name, agent_name in format_mapping.items():
+        for format_name, agent_name in self.FORMAT_MAPPING.items():
             if agent_name in content_results:
                 formats[format_name] = content_results[agent_name]
             else:
@@ -312,5 +438,6 @@ class ContentOrchestrator:
                 "Summary Cards"
             ],
             "execution_mode": "parallel_async",
-            "fallback_strategy": "graceful_degradation"
+            "fallback_strategy": "graceful_degradation",
+            "result_cache": self.result_cache.get_stats()
         }
@@ -0,0 +1,237 @@
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Dict, Any, Iterable, Optional, List
+
+from utils.ttl_cache import TTLCache
+from utils.tracing import log_event
+
+
+# Majors that get the same analogies and depth from the agents share a bucket
+MAJOR_GROUPS = {
+    "computing": ["computer", "software", "cs", "data science", "information", "programming", "it"],
+    "engineering": ["engineer", "mechanical", "electrical", "civil", "aerospace"],
+    "physical_sciences": ["physics", "chemistry", "astronomy", "geology", "earth science"],
+    "life_sciences": ["biology", "biochem", "medicine", "medical", "nursing", "health", "neuroscience", "pre-med"],
+    "mathematics": ["math", "statistics", "actuarial"],
+    "business": ["business", "economics", "finance", "accounting", "management", "marketing"],
+    "social_sciences": ["psychology", "sociology", "political", "anthropology", "education"],
+    "humanities": ["history", "literature", "english", "philosophy", "art", "music", "language"],
+}
+
+ACADEMIC_LEVELS = {
+    "elementary": ["elementary", "primary"],
+    "middle_school": ["middle"],
+    "high_school": ["high school", "highschool", "secondary", "ap "],
+    # College first so "undergraduate" is not caught by the graduate keywords
+    "college": ["college", "university", "undergrad", "bachelor", "freshman", "sophomore", "junior", "senior"],
+    "graduate": ["graduate", "grad", "master", "phd", "doctoral", "postgrad"],
+}
+
+CACHE_FORMAT_VERSION = 4
+
+
+def _match_group(value: str, groups: Dict[str, List[str]]) -> Optional[str]:
+    padded = f" {value} "
+    for group, keywords in groups.items():
+        for keyword in keywords:
+            # Short keywords (cs, it) must match a whole word
+            if len(keyword) <= 3 and f" {keyword.strip()} " not in padded:
+                continue
+            if keyword in padded:
+                return group
+    return None
+
+
+def _normalize_styles(styles: Any) -> List[str]:
+    if isinstance(styles, str):
+        styles = [styles]
+    return sorted({str(s).strip().lower() for s in styles or [] if s})
+
+
+# Canonical form of each profile field; fields not listed compare as lowercased text
+BUCKET_NORMALIZERS = {
+    "major": lambda value: _match_group(str(value or "general").strip().lower(), MAJOR_GROUPS) or "general",
+    "academicLevel": lambda value: _match_group(str(value or "general").strip().lower(), ACADEMIC_LEVELS) or "general",
+    "languagePreference": lambda value: str(value or "English").strip().lower() or "english",
+    "learningStyles": _normalize_styles,
+}
+
+
+def personalization_bucket(user_context: Dict[str, Any], fields: Iterable[str]) -> Dict[str, Any]:
+    """
+    Normalize the profile fields the agents actually use into a canonical bucket.
+
+    `fields` is the union of the agents' context_fields; anything the prompts
+    don't read stays out of the key so it can't split identical output.
+    """
+    bucket = {}
+    for field in fields:
+        normalize = BUCKET_NORMALIZERS.get(field)
+        value = user_context.get(field)
+        bucket[field] = normalize(value) if normalize else str(value if value is not None else "").strip().lower()
+    return bucket
+
+
+class AgentResultCache:
+    """
+    Caches agent outputs per (agent, work order, subject/topic, personalization bucket).
+
+    Entries live in an in-process TTL/LRU cache backed by one JSON file per
+    entry on local disk, so warm results survive restarts. The disk tier is
+    bounded by entry count and evicts the least recently used files.
+    """
+
+    def __init__(self, context_fields: Iterable[str]):
+        self.context_fields = tuple(sorted(context_fields))
+        self.enabled = os.getenv("AGENT_CACHE_ENABLED", "true").lower() == "true"
+        self.ttl = float(os.getenv("AGENT_CACHE_TTL_SECONDS", "86400"))
+        self.disk_max_entries = int(os.getenv("AGENT_CACHE_DISK_MAX_ENTRIES", "5000"))
+        self.cache_dir = os.getenv(
+            "AGENT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "studysurf_agent_cache")
+        )
+        self.memory = TTLCache(
+            maxsize=int(os.getenv("AGENT_CACHE_MAX_ENTRIES", "512")), ttl=self.ttl
+        )
+        self.disk_hits = 0
+        self._writes_since_prune = 0
+        if self.enabled:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(
+        self,
+        agent_type: str,
+        work_order: Dict[str, Any],
+        gemini_analysis: Dict[str, Any],
+        user_context: Dict[str, Any]
+    ) -> str:
+        """Build a canonical cache key; the individual user never enters it."""
+        educational_analysis = gemini_analysis.get("educational_analysis", {}) or {}
+        key_material = {
+            "v": CACHE_FORMAT_VERSION,
+            "agent": agent_type,
+            "work_order": work_order,
+            "subject": str(educational_analysis.get("subject", "")).strip().lower(),
+            "topic": str(educational_analysis.get("topic", "")).strip().lower(),
+            "bucket": personalization_bucket(user_context, self.context_fields),
+        }
+        encoded = json.dumps(key_material, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[tuple]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("expires_at", 0) <= time.time():
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            return None
+        # Touch so disk eviction follows recency of use
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return entry["value"], entry["expires_at"]
+
+    def _write_disk(self, key: str, agent_type: str, value: Any, expires_at: float) -> None:
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"agent_type": agent_type, "expires_at": expires_at, "value": value}, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            log_event("agent_cache_write_failed", "warning", agent=agent_type, error=str(e))
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return
+
+        self._writes_since_prune += 1
+        if self._writes_since_prune >= 50:
+            self._writes_since_prune = 0
+            self._prune_disk()
+
+    def _prune_disk(self) -> None:
+        """Drop the least recently used files once the disk tier exceeds its cap."""
+        try:
+            entries = [
+                os.path.join(self.cache_dir, name)
+                for name in os.listdir(self.cache_dir) if name.endswith(".json")
+            ]
+            entries.sort(key=lambda p: os.path.getmtime(p))
+        except OSError:
+            return
+        overflow = len(entries) - self.disk_max_entries
+        for path in entries[:max(0, overflow)]:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    async def get(
+        self,
+        agent_type: str,
+        work_order: Dict[str, Any],
+        gemini_analysis: Dict[str, Any],
+        user_context: Dict[str, Any]
+    ) -> Optional[Any]:
+        """
+        Return a cached agent result, checking memory first and then disk.
+
+        Callers get their own deep copy, so annotating a result for one
+        request cannot leak into the shared entry served to the next.
+        """
+        if not self.enabled:
+            return None
+        key = self.make_key(agent_type, work_order, gemini_analysis, user_context)
+        value = self.memory.get(key)
+        if value is not None:
+            return copy.deepcopy(value)
+
+        entry = await asyncio.to_thread(self._read_disk, key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        self.disk_hits += 1
+        self.memory.set(key, value, expires_at=expires_at)
+        return copy.deepcopy(value)
+
+    async def set(
+        self,
+        agent_type: str,
+        work_order: Dict[str, Any],
+        gemini_analysis: Dict[str, Any],
+        user_context: Dict[str, Any],
+        value: Any
+    ) -> None:
+        """Store a successful agent result. Fallback content is never cached."""
+        if not self.enabled or not isinstance(value, dict):
+            return
+        if value.get("status") == "fallback_generated":
+            return
+        key = self.make_key(agent_type, work_order, gemini_analysis, user_context)
+        expires_at = time.time() + self.ttl
+        value = copy.deepcopy(value)
+        self.memory.set(key, value, expires_at=expires_at)
+        await asyncio.to_thread(self._write_disk, key, agent_type, value, expires_at)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.memory.stats()
+        stats.update({
+            "enabled": self.enabled,
+            "disk_hits": self.disk_hits,
+            "cache_dir": self.cache_dir,
+        })
+        return stats
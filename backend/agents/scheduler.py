@@ -0,0 +1,218 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Optional
+
+
+# Strict priority order: earlier classes are always dispatched first.
+PRIORITY_CLASSES = ("interactive", "background", "prewarm")
+DEFAULT_PRIORITY = "interactive"
+ANONYMOUS_USER = "anonymous"
+
+_scheduling_context: ContextVar[Optional[Dict[str, Any]]] = ContextVar(
+    "gemini_scheduling_context", default=None
+)
+
+
+def normalize_priority(priority: Optional[str]) -> str:
+    """Map an arbitrary priority string onto a known priority class."""
+    if priority and priority.lower() in PRIORITY_CLASSES:
+        return priority.lower()
+    return DEFAULT_PRIORITY
+
+
+@contextmanager
+def scheduling_context(user_id: Optional[str], priority: Optional[str] = None):
+    """
+    Tag every Gemini call made inside this block (including asyncio tasks
+    spawned from it) with the requesting user and priority class.
+    """
+    token = _scheduling_context.set({
+        "user_id": user_id or ANONYMOUS_USER,
+        "priority": normalize_priority(priority),
+    })
+    try:
+        yield
+    finally:
+        _scheduling_context.reset(token)
+
+
+def get_scheduling_context() -> Dict[str, Any]:
+    """Return the scheduling tags for the current task (defaults to anonymous/interactive)."""
+    return _scheduling_context.get() or {
+        "user_id": ANONYMOUS_USER,
+        "priority": DEFAULT_PRIORITY,
+    }
+
+
+class GeminiCallScheduler:
+    """
+    Process-wide fair scheduler in front of the shared Gemini key pool.
+
+    Calls are admitted into a fixed number of slots (keys x per-key concurrency).
+    Priority classes are served in strict order, and a slice of the slots is
+    reserved for interactive traffic so background work can never occupy the
+    whole pool. Inside a class, users are served by fair queuing
+    (start-time fair queuing on per-user finish tags), so one user's bulk
+    fan-out cannot starve everybody else.
+
+    Must be used from the server's event loop.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, 'initialized'):
+            self.per_key_concurrency = int(os.getenv("GEMINI_CONCURRENCY_PER_KEY", "4"))
+            self.interactive_reserve = float(os.getenv("GEMINI_INTERACTIVE_RESERVE", "0.25"))
+            self.capacity = self.per_key_concurrency
+            self._queues = {cls: [] for cls in PRIORITY_CLASSES}
+            self._queued = {cls: 0 for cls in PRIORITY_CLASSES}
+            self._active = {cls: 0 for cls in PRIORITY_CLASSES}
+            self._dispatched = {cls: 0 for cls in PRIORITY_CLASSES}
+            self._waits = {cls: deque(maxlen=512) for cls in PRIORITY_CLASSES}
+            self._virtual_time = {cls: 0.0 for cls in PRIORITY_CLASSES}
+            self._last_finish: Dict[tuple, float] = {}
+            self._queued_by_user: Dict[str, int] = {}
+            self._active_total = 0
+            self._seq = itertools.count()
+            self.initialized = True
+
+    def configure(self, key_count: int) -> None:
+        """Size the slot pool from the number of available API keys."""
+        self.capacity = max(1, key_count * self.per_key_concurrency)
+
+    def _class_limit(self, cls: str) -> int:
+        """Total active calls above which a class may not be admitted."""
+        if cls == "interactive":
+            return self.capacity
+        reserve = max(1, math.ceil(self.capacity * self.interactive_reserve)) if self.capacity > 1 else 0
+        shared = max(1, self.capacity - reserve)
+        if cls == "background":
+            return shared
+        return max(1, shared // 2)
+
+    def _has_waiters_at_or_above(self, cls: str) -> bool:
+        for other in PRIORITY_CLASSES:
+            if self._queued[other]:
+                return True
+            if other == cls:
+                return False
+        return False
+
+    def _grant(self, cls: str) -> None:
+        self._active[cls] += 1
+        self._active_total += 1
+        self._dispatched[cls] += 1
+
+    def _dispatch(self) -> None:
+        """Hand free slots to queued waiters, highest priority class first."""
+        for cls in PRIORITY_CLASSES:
+            queue = self._queues[cls]
+            while queue and self._active_total < self._class_limit(cls):
+                finish, _, user_id, waiter = heapq.heappop(queue)
+                if waiter.done():
+                    # Waiter was cancelled while queued; already accounted for
+                    continue
+                self._queued[cls] -= 1
+                self._decrement_user(user_id)
+                self._virtual_time[cls] = max(self._virtual_time[cls], finish)
+                key = (cls, user_id)
+                if not self._queued_by_user.get(user_id) and self._last_finish.get(key, 0.0) <= self._virtual_time[cls]:
+                    self._last_finish.pop(key, None)
+                self._grant(cls)
+                waiter.set_result(None)
+
+    def _decrement_user(self, user_id: str) -> None:
+        remaining = self._queued_by_user.get(user_id, 0) - 1
+        if remaining > 0:
+            self._queued_by_user[user_id] = remaining
+        else:
+            self._queued_by_user.pop(user_id, None)
+
+    async def acquire(self, priority: Optional[str] = None, user_id: Optional[str] = None) -> float:
+        """Wait for a slot. Returns the time spent queued in seconds."""
+        cls = normalize_priority(priority)
+        user_id = user_id or ANONYMOUS_USER
+        enqueued_at = time.monotonic()
+
+        if not self._has_waiters_at_or_above(cls) and self._active_total < self._class_limit(cls):
+            self._grant(cls)
+            self._waits[cls].append(0.0)
+            return 0.0
+
+        key = (cls, user_id)
+        start_tag = max(self._virtual_time[cls], self._last_finish.get(key, 0.0))
+        finish_tag = start_tag + 1.0
+        self._last_finish[key] = finish_tag
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queues[cls], (finish_tag, next(self._seq), user_id, waiter))
+        self._queued[cls] += 1
+        self._queued_by_user[user_id] = self._queued_by_user.get(user_id, 0) + 1
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.cancelled():
+                self._queued[cls] -= 1
+                self._decrement_user(user_id)
+            else:
+                # Slot was granted just as we were cancelled; pass it on
+                self.release(cls)
+            raise
+
+        wait = time.monotonic() - enqueued_at
+        self._waits[cls].append(wait)
+        return wait
+
+    def release(self, priority: Optional[str] = None) -> None:
+        """Return a slot to the pool and wake the next waiter."""
+        cls = normalize_priority(priority)
+        self._active[cls] -= 1
+        self._active_total -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[str] = None, user_id: Optional[str] = None):
+        """Hold a slot for the duration of the block; yields the queue wait in seconds."""
+        wait = await self.acquire(priority, user_id)
+        try:
+            yield wait
+        finally:
+            self.release(priority)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue-depth and wait-time metrics per priority class."""
+        classes = {}
+        for cls in PRIORITY_CLASSES:
+            waits = sorted(self._waits[cls])
+            classes[cls] = {
+                "queue_depth": self._queued[cls],
+                "active": self._active[cls],
+                "admission_limit": self._class_limit(cls),
+                "dispatched_total": self._dispatched[cls],
+                "wait_p50_s": round(waits[len(waits) // 2], 4) if waits else 0.0,
+                "wait_p95_s": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 4) if waits else 0.0,
+            }
+        return {
+            "capacity": self.capacity,
+            "active_total": self._active_total,
+            "queued_total": sum(self._queued.values()),
+            "queued_users": len(self._queued_by_user),
+            "classes": classes,
+        }
@@ -1,9 +1,15 @@
 import os
+import time
 from typing import Dict, Any, Optional
 from fastapi import HTTPException
 import google.genai as genai
 from dotenv import  load_dotenv
 
+from utils.gemini_cassette import GeminiCassette
+from utils.stage_timer import stage, current_timer
+from utils.tracing import span, log_event, gen_ai_usage_attributes, SPAN_KIND_CLIENT
+from utils.disconnect import ClientDisconnected, raise_if_cancelled
+
 load_dotenv()
 
 class GeminiSpeechToTextAgent:
@@ -21,6 +27,7 @@ class GeminiSpeechToTextAgent:
             
         # Initialize the GenAI client with API key (public API, not Vertex)
         self.client = genai.Client(api_key=self.gemini_api_key, vertexai=False)
+        self.cassette = GeminiCassette()
         self.model_name = 'models/gemini-2.5-flash'
         
     def _select_best_model(self, prefer_fast: bool = False) -> str:
@@ -129,19 +136,23 @@ class GeminiSpeechToTextAgent:
             }
         }
     
-    def transcribe_and_analyze(self, audio_path: str, user_context: Optional[Dict] = None) -> Dict[str, Any]:
+    def transcribe_and_analyze(self, audio_path: str, user_context: Optional[Dict] = None, client: Optional[Any] = None) -> Dict[str, Any]:
         """
         🏆 SHOWCASE GEMINI'S POWER: Audio Understanding + Educational Analysis
         
         Uses Google GenAI SDK v1.39.1 for advanced multimodal capabilities.
+        client picks a key from the pool (the upload, analysis and cleanup all use it);
+        defaults to the GOOGLE_GEMINI_API_KEY client.
         """
+        client = client or self.client
         try:
-            print(f"🎯 Uploading audio file to Gemini: {audio_path}")
-            
             # Upload audio file using the new google-genai SDK
-            uploaded_file = self.client.files.upload(file=audio_path)
+            with stage("gemini-upload"):
+                uploaded_file = self.cassette.upload_file(client, audio_path)
             
-            print(f"✅ Audio uploaded successfully! File ID: {uploaded_file.name}")
+            log_event("gemini_audio_uploaded", file=uploaded_file.name)
+            # Client gone during the upload: delete the file instead of analyzing it
+            raise_if_cancelled()
             
             # Prepare user context for personalized analysis
             user_background = user_context.get("major", "general") if user_context else "general"
@@ -302,7 +313,7 @@ class GeminiSpeechToTextAgent:
             chosen_model = None
             if force_model:
                 try:
-                    available_models = [getattr(m, 'name', '') for m in self.client.models.list()]
+                    available_models = [getattr(m, 'name', '') for m in client.models.list()]
                 except Exception:
                     available_models = []
                 candidate = force_model
@@ -312,20 +323,25 @@ class GeminiSpeechToTextAgent:
                 if candidate in available_models:
                     chosen_model = candidate
                 else:
-                    print(f"Invalid forced model '{force_model}', falling back to selection.")
+                    log_event("invalid_forced_model", "warning", model=force_model)
 
             if not chosen_model:
                 chosen_model = self._select_best_model(prefer_fast=prefer_fast)
-            print(f"🎯 Using Gemini model: {chosen_model}")
-            response = self.client.models.generate_content(
-                model=chosen_model,
-                contents=[audio_understanding_prompt + "\n" + json_output_constraint, uploaded_file]
-            )
+            with stage("analysis", **{"gen_ai.system": "gemini", "gen_ai.request.model": chosen_model}) as analysis_span:
+                response = self.cassette.generate_content(
+                    client,
+                    "speech:analysis",
+                    model=chosen_model,
+                    contents=[audio_understanding_prompt + "\n" + json_output_constraint, uploaded_file],
+                    meta={"user_context": user_context or {}}
+                )
+                analysis_span.set_attributes(gen_ai_usage_attributes(response))
             
-            print("🎉 Gemini analysis complete!")
+            log_event("gemini_analysis_completed", model=chosen_model)
+            raise_if_cancelled()
             
             # Clean up uploaded file from Gemini
-            self.client.files.delete(name=uploaded_file.name)
+            self.cassette.delete_file(client, uploaded_file.name)
             
             # Parse Gemini's response
             try:
@@ -357,6 +373,7 @@ class GeminiSpeechToTextAgent:
 
             # Work orders mode: guided (fast) or llm (have Gemini produce all work orders)
             work_orders_mode = (user_context or {}).get('work_orders_mode', 'guided')
+            work_orders_started = time.perf_counter()
             if work_orders_mode == 'llm':
                 # Ask Gemini for work orders based on its own analysis
                 try:
@@ -374,10 +391,17 @@ Return ONLY JSON with this shape:
 Output pure JSON, no code fences.
 CRITICAL: DO NOT include video_generation or animation_config agents - they are completely disabled for performance optimization.
 """
-                    work_orders_resp = self.client.models.generate_content(
-                        model=chosen_model,
-                        contents=[work_orders_prompt, str(analysis_data)]
-                    )
+                    with span(
+                        "gemini.generate_content", SPAN_KIND_CLIENT,
+                        **{"gen_ai.system": "gemini", "gen_ai.request.model": chosen_model, "gemini.site": "speech:work_orders"}
+                    ) as call_span:
+                        work_orders_resp = self.cassette.generate_content(
+                            client,
+                            "speech:work_orders",
+                            model=chosen_model,
+                            contents=[work_orders_prompt, str(analysis_data)]
+                        )
+                        call_span.set_attributes(gen_ai_usage_attributes(work_orders_resp))
                     wo_text = work_orders_resp.text if hasattr(work_orders_resp, 'text') else str(work_orders_resp)
                     import json as _json
                     work_orders = _json.loads(self._strip_code_fences(wo_text))
@@ -385,6 +409,9 @@ CRITICAL: DO NOT include video_generation or animation_config agents - they are
                     work_orders = self._build_work_orders(analysis_data)
             else:
                 work_orders = self._build_work_orders(analysis_data)
+            timer = current_timer()
+            if timer is not None:
+                timer.add("work-orders", time.perf_counter() - work_orders_started)
             
             return {
                 "gemini_analysis": analysis_data,
@@ -399,9 +426,12 @@ CRITICAL: DO NOT include video_generation or animation_config agents - they are
             # Clean up uploaded file if it exists
             try:
                 if 'uploaded_file' in locals():
-                    self.client.files.delete(name=uploaded_file.name)
+                    self.cassette.delete_file(client, uploaded_file.name)
             except:
                 pass
+            if isinstance(e, ClientDisconnected):
+                log_event("gemini_analysis_cancelled", "warning")
+                raise
                 
             raise HTTPException(
                 status_code=500,
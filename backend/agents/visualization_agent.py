@@ -2,10 +2,18 @@ import json
 from typing import Dict, Any, List
 from .base_agent import BaseContentAgent
 from models.chart_schemas import StandardizedChartConfig
+from utils.chart_data import synthesize_chart
+from utils.tracing import log_event
 
 
 class VisualizationAgent(BaseContentAgent):
-    """Generates visual diagrams and charts using standardized schema."""
+    """
+    Generates visual diagrams and charts using standardized schema.
+    
+    Gemini only returns compact chart specs (function expression, domain,
+    parameters or category labels); the chart data itself is synthesized
+    server-side so the numbers are exact and cost no output tokens.
+    """
 
     async def generate_content(self, work_order: Dict[str, Any], gemini_analysis: Dict[str, Any], user_context: Dict[str, Any]) -> Dict[str, Any]:
         user_bg = self._get_user_background_context(user_context)
@@ -14,14 +22,11 @@ class VisualizationAgent(BaseContentAgent):
         charts = work_order.get("charts", [])
         num_charts = len(charts) if charts else 3
         
-        # Get the standardized template for AI to follow
-        chart_template = StandardizedChartConfig.get_json_template_for_ai()
-        
         # Get language instruction
         language_instruction = self._get_language_instruction(user_context)
         
         prompt = f"""
-        Generate visual diagrams and chart specifications for educational content.
+        Generate visual diagrams and compact chart specifications for educational content.
         
         {user_bg}
         {subject_context}
@@ -29,9 +34,6 @@ class VisualizationAgent(BaseContentAgent):
         
         Charts needed: {', '.join(charts) if charts else 'Generate appropriate charts for the content'}
         
-        You must generate exactly {num_charts} charts following this EXACT structure for each chart:
-        {chart_template}
-        
         Return as JSON:
         {{
             "diagrams": [
@@ -44,25 +46,32 @@ class VisualizationAgent(BaseContentAgent):
                     "svg_code": "complete SVG code with proper dimensions and styling"
                 }}
             ],
-            "chart_configs": [
-                // Generate {num_charts} charts using the template structure above
-                // Fill in appropriate values for the educational content
-                // Make sure each chart has a unique chart_id
+            "chart_specs": [
+                {{
+                    "chart_id": "unique_snake_case_id",
+                    "chart_type": "line|scatter|bar|pie",
+                    "title": "chart title",
+                    "description": "what the chart shows",
+                    "data_format": "function|categories",
+                    "expression": "function charts only: expression in x, e.g. v*x - 0.5*g*x**2",
+                    "x_domain": [0, 10],
+                    "parameters": {{"g": 9.8, "v": 12}},
+                    "labels": ["categories charts only"],
+                    "values": [1, 2],
+                    "axes": {{"x_axis": "label", "y_axis": "label", "x_unit": "unit", "y_unit": "unit"}},
+                    "annotations": [{{"type": "point|line|text", "label": "what to highlight"}}]
+                }}
             ],
             "visual_metaphors": "describe visual analogies that help understanding"
         }}
         
         CRITICAL REQUIREMENTS: 
-        - Follow the chart template structure EXACTLY
-        - Generate real educational data, not placeholder values
-        - Each chart must have a unique chart_id
-        - Choose appropriate chart_type (line, scatter, bar, pie)
-        - Use proper data_format (points, function, categories)
-        - Include meaningful annotations
-        - FOR DATA POINTS: Always provide AT LEAST 10 data points in the "points" array
-        - FOR FUNCTIONS: Ensure the mathematical expression is complete and valid
-        - FOR CATEGORIES: Provide at least 5-8 categories with corresponding values
-        - Make data points realistic and educational, not just sequential numbers
+        - Generate exactly {num_charts} chart_specs, each with a unique chart_id
+        - DO NOT list data points; the server computes them from the spec
+        - FOR FUNCTIONS: give a valid expression in x using + - * / ** and sin, cos, tan, exp, log, sqrt, abs, pi;
+          put every named constant in "parameters" with a realistic value, and a meaningful x_domain
+        - FOR CATEGORIES: provide 5-8 labels with matching numeric values
+        - Make the specs realistic and educational, not placeholders
         
         Output pure JSON only.
         """
@@ -70,11 +79,14 @@ class VisualizationAgent(BaseContentAgent):
         try:
             response = await self._call_gemini(prompt)
             result = json.loads(self._strip_code_fences(response))
+            chart_specs = result.pop("chart_specs", None) or []
+            result["chart_configs"] = self._build_chart_configs(chart_specs) or [StandardizedChartConfig.get_fallback_chart()]
             result["agent"] = "visualization"
             result["schema_version"] = "1.0"
             return result
             
         except Exception as e:
+            log_event("visualization_fallback", "warning", error=str(e))
             # Simple fallback without validation crashes
             fallback_chart = StandardizedChartConfig.get_fallback_chart()
             
@@ -93,3 +105,23 @@ class VisualizationAgent(BaseContentAgent):
                 "status": "fallback_generated",
                 "schema_version": "1.0"
             }
+
+    def _build_chart_configs(self, chart_specs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Synthesize chart data from specs and keep the configs that pass schema validation."""
+        configs = []
+        seen_ids = set()
+        for i, spec in enumerate(chart_specs):
+            if not isinstance(spec, dict):
+                continue
+            try:
+                config = synthesize_chart(spec)
+                # chart_id must be unique within the response
+                if config["chart_id"] in seen_ids:
+                    config["chart_id"] = f"{config['chart_id']}_{i + 1}"
+                StandardizedChartConfig(**config)
+            except Exception as e:
+                log_event("chart_spec_dropped", "warning", chart_id=spec.get("chart_id", i), error=str(e))
+                continue
+            seen_ids.add(config["chart_id"])
+            configs.append(config)
+        return configs
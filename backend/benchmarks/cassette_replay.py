@@ -0,0 +1,160 @@
+"""
+Replay recorded Gemini traffic through the real analysis + orchestration path.
+
+Record on a server with GEMINI_CASSETTE_MODE=record, then replay the cassette
+here: every recorded audio analysis becomes a pipeline that starts at its
+original offset (times --arrival-scale) and runs transcribe_and_analyze and
+orchestrate_content_generation with the recorded user context. All Gemini
+calls are served from the cassette with recorded latency times --time-scale,
+so scheduler, cache and model-routing changes can be compared on real prompt
+sizes without network access. Calls that no longer match a recording (e.g.
+after a prompt change) are counted as misses and fail like API errors.
+
+Usage (from backend/):
+    python -m benchmarks.cassette_replay /path/to/cassette.jsonl.gz \
+        [--time-scale 1.0] [--arrival-scale 0.1] [--limit 200] [--json results.json]
+
+The agent result cache is left as configured (AGENT_CACHE_ENABLED), since
+cache changes are one of the things worth replaying.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.orchestrator_benchmark import (  # noqa: E402
+    count_fallbacks, git_revision, instrument_agents, percentile, _pipeline
+)
+from utils.gemini_cassette import CASSETTE_FILE_PREFIX, GeminiCassette, load_cassette  # noqa: E402
+
+
+def recorded_pipelines(path, limit=None):
+    """(offset seconds, audio sha, user context) per recorded audio analysis, in arrival order."""
+    analyses = [
+        entry for entry in load_cassette(path)
+        if entry.get("site") == "speech:analysis" and entry.get("files")
+    ]
+    analyses.sort(key=lambda entry: entry["at"])
+    if limit:
+        analyses = analyses[:limit]
+    first_at = analyses[0]["at"] if analyses else 0.0
+    return [
+        (entry["at"] - first_at, entry["files"][0], entry.get("meta", {}).get("user_context", {}))
+        for entry in analyses
+    ]
+
+
+async def replay_pipeline(stt_agent, orchestrator, audio_sha, user_context, analysis_in_thread):
+    record = {"started": time.perf_counter(), "agent_done": []}
+    _pipeline.set(record)
+    audio_path = f"{CASSETTE_FILE_PREFIX}{audio_sha}"
+    try:
+        if analysis_in_thread:
+            analysis = await asyncio.to_thread(stt_agent.transcribe_and_analyze, audio_path, dict(user_context))
+        else:
+            analysis = stt_agent.transcribe_and_analyze(audio_path, dict(user_context))
+        result = await orchestrator.orchestrate_content_generation(
+            work_orders=analysis.get("work_orders", {}),
+            gemini_analysis=analysis.get("gemini_analysis", {}),
+            user_context=dict(user_context)
+        )
+    except Exception as e:
+        return {"ok": False, "error": str(e), "elapsed": time.perf_counter() - record["started"]}
+
+    fallbacks, agents = count_fallbacks(result.get("content", {}))
+    return {
+        "ok": True,
+        "elapsed": time.perf_counter() - record["started"],
+        "first_agent": min(record["agent_done"]) if record["agent_done"] else None,
+        "fallbacks": fallbacks,
+        "agents": agents,
+        "cache_hits": result.get("orchestration_summary", {}).get("cache_hits", 0),
+    }
+
+
+async def run(args, pipelines):
+    from agents.orchestrator import ContentOrchestrator
+    from agents.speech_to_text_agent import GeminiSpeechToTextAgent
+
+    output = sys.stdout if args.verbose else io.StringIO()
+    with contextlib.redirect_stdout(output):
+        stt_agent = GeminiSpeechToTextAgent()
+        orchestrator = ContentOrchestrator()
+        instrument_agents(orchestrator)
+
+        async def scheduled(offset, audio_sha, user_context):
+            await asyncio.sleep(offset * args.arrival_scale)
+            return await replay_pipeline(stt_agent, orchestrator, audio_sha, user_context, args.analysis_in_thread)
+
+        cpu_started, wall_started = time.process_time(), time.perf_counter()
+        results = await asyncio.gather(*[scheduled(*pipeline) for pipeline in pipelines])
+        cpu_used, wall = time.process_time() - cpu_started, time.perf_counter() - wall_started
+
+    ok = [r for r in results if r["ok"]]
+    elapsed = [r["elapsed"] for r in ok]
+    first_agent = [r["first_agent"] for r in ok if r["first_agent"] is not None]
+    agents = sum(r["agents"] for r in ok)
+    return {
+        "pipelines": len(results),
+        "ok": len(ok),
+        "errors": len(results) - len(ok),
+        "wall_s": round(wall, 3),
+        "e2e_p50_s": round(percentile(elapsed, 0.5), 3),
+        "e2e_p95_s": round(percentile(elapsed, 0.95), 3),
+        "e2e_p99_s": round(percentile(elapsed, 0.99), 3),
+        "first_agent_p50_s": round(percentile(first_agent, 0.5), 3),
+        "fallback_rate": round(sum(r["fallbacks"] for r in ok) / agents, 4) if agents else 0.0,
+        "agent_cache_hits": sum(r["cache_hits"] for r in ok),
+        "cpu_ms_per_pipeline": round(cpu_used * 1000 / len(results), 2) if results else 0.0,
+        "cassette": GeminiCassette().get_stats(),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("cassette", help="Cassette recorded with GEMINI_CASSETTE_MODE=record")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Multiplier on recorded call latency")
+    parser.add_argument("--arrival-scale", type=float, default=1.0,
+                        help="Multiplier on recorded gaps between pipelines (0 starts them all at once)")
+    parser.add_argument("--limit", type=int, help="Replay only the first N pipelines")
+    parser.add_argument("--analysis-in-thread", action="store_true",
+                        help="Run transcribe_and_analyze on a worker thread instead of the event loop")
+    parser.add_argument("--verbose", action="store_true", help="Show the agents' own logging")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    GeminiCassette().configure(mode="replay", path=args.cassette, time_scale=args.time_scale)
+    pipelines = recorded_pipelines(args.cassette, args.limit)
+    if not pipelines:
+        sys.exit(f"No recorded audio analyses in {args.cassette}")
+
+    result = asyncio.run(run(args, pipelines))
+    print(
+        f"pipelines={result['pipelines']} p50={result['e2e_p50_s']}s p95={result['e2e_p95_s']}s "
+        f"p99={result['e2e_p99_s']}s  first agent p50={result['first_agent_p50_s']}s  "
+        f"fallback={result['fallback_rate']:.1%}  cache hits={result['agent_cache_hits']}  "
+        f"misses={result['cassette']['replay_misses']}  errors={result['errors']}"
+    )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "meta": {
+                    "revision": git_revision(),
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "cassette": args.cassette,
+                    "time_scale": args.time_scale,
+                    "arrival_scale": args.arrival_scale,
+                },
+                "result": result,
+            }, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,248 @@
+"""
+Offline stand-in for google.genai.Client used by the benchmarks.
+
+Replays payloads derived from the recorded pipeline responses in
+backend/responses/response*.json: the audio analysis prompt gets a recorded
+gemini_analysis, the LLM work-order prompt gets recorded work orders and each
+agent prompt gets that agent's recorded content. Calls block for a sampled
+latency (like the real synchronous SDK) and can fail with a 429 or return
+truncated JSON at configurable rates.
+
+Install it before any agent is constructed:
+
+    fake_genai.install(FakeGenaiConfig(...))
+"""
+import glob
+import json
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Dict, Any, List, Optional
+
+import google.genai as genai
+from google.genai import errors as genai_errors
+
+
+RESPONSES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "responses")
+
+# First line of each prompt identifies the caller
+PROMPT_MARKERS = (
+    ("EDUCATIONAL AUDIO ANALYSIS", "analysis"),
+    ("Generate JSON work orders for specialized agents", "work_orders"),
+    ("Create a comprehensive yet accessible explanation", "explanation"),
+    ("Generate code examples and equation explanations", "code_equation"),
+    ("Generate visual diagrams and compact chart specifications", "visualization"),
+    ("Generate real-world applications", "application"),
+    ("Generate concise summaries and learning cards", "summary"),
+    ("Generate personalized quiz questions", "quiz_generation"),
+)
+
+
+@dataclass
+class LatencyModel:
+    """Lognormal call latency (median seconds, sigma of the underlying normal); sigma 0 is fixed."""
+    median: float
+    sigma: float = 0.0
+
+    def sample(self, rng: random.Random) -> float:
+        if self.median <= 0:
+            return 0.0
+        if self.sigma <= 0:
+            return self.median
+        return rng.lognormvariate(0.0, self.sigma) * self.median
+
+
+@dataclass
+class FakeGenaiConfig:
+    analysis_latency: LatencyModel = field(default_factory=lambda: LatencyModel(0.5, 0.3))
+    agent_latency: LatencyModel = field(default_factory=lambda: LatencyModel(0.3, 0.5))
+    upload_latency: LatencyModel = field(default_factory=lambda: LatencyModel(0.05))
+    rate_429: float = 0.0
+    malformed_rate: float = 0.0
+    seed: Optional[int] = None
+    responses_dir: str = RESPONSES_DIR
+
+
+def classify_prompt(contents: Any) -> str:
+    first = contents[0] if isinstance(contents, (list, tuple)) and contents else contents
+    text = first if isinstance(first, str) else str(first)
+    for marker, kind in PROMPT_MARKERS:
+        if marker in text:
+            return kind
+    return "unknown"
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", str(text).lower()).strip("_")[:48] or "chart"
+
+
+def _chart_spec_from_config(config: Dict[str, Any], index: int) -> Dict[str, Any]:
+    """
+    Turn a recorded chart config back into the compact spec the agent now asks for.
+
+    Configs with points or labels/values keep their data; older descriptive
+    configs (no data) become a linear function spec.
+    """
+    data = config.get("data") if isinstance(config.get("data"), dict) else {}
+    spec = {
+        "chart_id": config.get("chart_id") or f"{_slug(config.get('title', 'chart'))}_{index}",
+        "chart_type": config.get("chart_type", "line"),
+        "title": config.get("title", "Chart"),
+        "description": config.get("description", ""),
+        "axes": config.get("axes") or config.get("axes_labels") or {"x_axis": "x", "y_axis": "y"},
+    }
+    if data.get("points"):
+        spec.update(data_format="points", points=data["points"])
+    elif data.get("labels") and data.get("values"):
+        spec.update(data_format="categories", labels=data["labels"], values=data["values"])
+    else:
+        spec.update(data_format="function", expression="a*x", x_domain=[0, 10], parameters={"a": 1})
+    return spec
+
+
+def _agent_payload(agent_name: str, content: Dict[str, Any]) -> Dict[str, Any]:
+    payload = {k: v for k, v in content.items() if k not in ("agent", "status", "schema_version")}
+    if agent_name == "visualization":
+        configs = payload.pop("chart_configs", None) or []
+        payload["chart_specs"] = [_chart_spec_from_config(c, i) for i, c in enumerate(configs)]
+    return payload
+
+
+def load_recordings(responses_dir: str = RESPONSES_DIR) -> List[Dict[str, Any]]:
+    """Per recorded response: {"source", "payloads": {prompt kind: JSON text}}."""
+    recordings = []
+    for path in sorted(glob.glob(os.path.join(responses_dir, "response*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            recorded = json.load(f)
+        analysis = recorded.get("gemini_analysis", {})
+        payloads = {
+            "analysis": json.dumps(analysis.get("gemini_analysis", {})),
+            "work_orders": json.dumps(analysis.get("work_orders", {})),
+        }
+        for agent_name, entry in recorded.get("content_generation", {}).get("content", {}).items():
+            content = entry.get("content") if isinstance(entry, dict) else None
+            if isinstance(content, dict):
+                payloads[agent_name] = json.dumps(_agent_payload(agent_name, content))
+        recordings.append({"source": os.path.basename(path), "payloads": payloads})
+    if not recordings:
+        raise FileNotFoundError(f"No recorded responses found in {responses_dir}")
+    return recordings
+
+
+class FakeGenaiStats:
+    """Thread-safe call counters shared by every fake client."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls: Dict[str, int] = {}
+            self.rate_limited = 0
+            self.malformed = 0
+            self.uploads = 0
+
+    def record_upload(self) -> None:
+        with self._lock:
+            self.uploads += 1
+
+    def record(self, kind: str, outcome: Optional[str] = None) -> None:
+        with self._lock:
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+            if outcome == "429":
+                self.rate_limited += 1
+            elif outcome == "malformed":
+                self.malformed += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": dict(self.calls),
+                "rate_limited": self.rate_limited,
+                "malformed": self.malformed,
+                "uploads": self.uploads,
+            }
+
+
+class _FakeModels:
+    def __init__(self, client: "FakeGenaiClient"):
+        self._client = client
+
+    def generate_content(self, model: str, contents: Any, config: Any = None):
+        return self._client._generate(model, contents)
+
+    def list(self):
+        return [SimpleNamespace(name="models/gemini-2.5-flash"), SimpleNamespace(name="models/gemini-2.5-pro")]
+
+
+class _FakeFiles:
+    def __init__(self, client: "FakeGenaiClient"):
+        self._client = client
+
+    def upload(self, file: Any, config: Any = None):
+        return self._client._upload(file)
+
+    def delete(self, name: str, config: Any = None):
+        return None
+
+
+class FakeGenaiClient:
+    """Drop-in for genai.Client(api_key=..., vertexai=False) covering the calls the backend makes."""
+
+    def __init__(self, config: FakeGenaiConfig, recordings: List[Dict[str, Any]], stats: FakeGenaiStats, **kwargs):
+        self.config = config
+        self.recordings = recordings
+        self.stats = stats
+        # Seeded so runs are repeatable (agent threads still interleave draws)
+        self._rng = random.Random(config.seed)
+        self.models = _FakeModels(self)
+        self.files = _FakeFiles(self)
+
+    def _upload(self, file: Any):
+        time.sleep(self.config.upload_latency.sample(self._rng))
+        self.stats.record_upload()
+        return SimpleNamespace(name=f"files/{self._rng.getrandbits(48):012x}", uri=str(file))
+
+    def _generate(self, model: str, contents: Any):
+        kind = classify_prompt(contents)
+        latency = self.config.analysis_latency if kind == "analysis" else self.config.agent_latency
+        time.sleep(latency.sample(self._rng))
+
+        if self._rng.random() < self.config.rate_429:
+            self.stats.record(kind, "429")
+            raise genai_errors.ClientError(429, {"error": {
+                "code": 429, "message": "Resource has been exhausted (e.g. check quota).",
+                "status": "RESOURCE_EXHAUSTED"
+            }})
+
+        recording = self._rng.choice(self.recordings)
+        text = recording["payloads"].get(kind, "{}")
+        if self._rng.random() < self.config.malformed_rate:
+            self.stats.record(kind, "malformed")
+            text = text[: max(1, len(text) // 2)]
+        else:
+            self.stats.record(kind)
+        # Rough token counts (~4 characters per token) so traces carry usage attributes
+        prompt_tokens = sum(len(part) for part in contents if isinstance(part, str)) // 4
+        output_tokens = len(text) // 4
+        return SimpleNamespace(text=text, usage_metadata=SimpleNamespace(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=output_tokens,
+            total_token_count=prompt_tokens + output_tokens
+        ))
+
+
+stats = FakeGenaiStats()
+
+
+def install(config: Optional[FakeGenaiConfig] = None) -> FakeGenaiConfig:
+    """Replace genai.Client for every client created from now on."""
+    config = config or FakeGenaiConfig()
+    recordings = load_recordings(config.responses_dir)
+    genai.Client = lambda **kwargs: FakeGenaiClient(config, recordings, stats, **kwargs)
+    return config
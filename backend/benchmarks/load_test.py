@@ -0,0 +1,330 @@
+"""
+End-to-end HTTP load test for the upload pipeline, auth and profile endpoints.
+
+Starts benchmarks.stub_server under uvicorn as a subprocess (real app, fake
+Gemini, SQLite stores, real ffmpeg) and sends open-loop Poisson arrivals
+at each requested rate. Video scenarios upload multipart bodies generated
+with ffmpeg (test pattern + tone) at a target size. While a rate runs, it
+samples RSS and open file descriptors of every server process. Afterwards
+it counts files left in the server's private TMPDIR (including the artifact
+store under it; audio from extract-audio stays there until
+ARTIFACT_TTL_SECONDS, as a client may still transcribe it).
+
+Scenarios:
+    pipeline       POST /api/process-video-complete
+    extract-audio  POST /api/extract-audio
+    signin         POST /api/auth/signin
+    profile        GET /api/user/profile + PUT /api/user/preferences (alternating)
+
+Usage (from backend/, Linux, ffmpeg on PATH):
+    python -m benchmarks.load_test --scenarios extract-audio pipeline --rates 0.5 1 2 4 \
+        --duration 30 --video-mb 20 --workers 1 [--json results.json]
+
+A rate is marked saturated when more than 5% of requests fail or p95 exceeds
+--slo seconds; escalation for that scenario stops there. 429s from admission
+control are reported as shed load rather than failures, so with admission on
+throughput should level off at the admitted limit while the shed rate grows.
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_KEY = os.getenv("API_KEY", "study_surf_users_secret_key")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+# ============= SERVER PROCESS =============
+
+def count_temp_files(path):
+    """Files anywhere under path (the artifact store is a subdirectory of TMPDIR)."""
+    return sum(len(files) for _, _, files in os.walk(path))
+
+
+def process_tree(pid):
+    """pid plus all descendants (uvicorn workers, bcrypt pool processes)."""
+    pids = [pid]
+    for tid_children in glob.glob(f"/proc/{pid}/task/*/children"):
+        try:
+            with open(tid_children) as f:
+                for child in f.read().split():
+                    pids.extend(process_tree(int(child)))
+        except OSError:
+            continue
+    return pids
+
+
+def process_usage(pid):
+    """(RSS bytes, open fds) from /proc, or None if the process is gone."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            rss_pages = int(f.read().split()[1])
+        return rss_pages * PAGE_SIZE, len(os.listdir(f"/proc/{pid}/fd"))
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def start_server(args, state_dir):
+    server_tmp = os.path.join(state_dir, "tmp")
+    os.makedirs(server_tmp, exist_ok=True)
+    env = dict(
+        os.environ,
+        TMPDIR=server_tmp,
+        LOADTEST_STATE_DIR=state_dir,
+        LOADTEST_ANALYSIS_LATENCY=args.analysis_latency,
+        LOADTEST_AGENT_LATENCY=args.agent_latency,
+        PYTHONUNBUFFERED="1",
+    )
+    log = open(os.path.join(state_dir, "server.log"), "w")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.stub_server:app", "--host", "127.0.0.1",
+         "--port", str(args.port), "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with {server.returncode}, see {log.name}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{args.port}/health", timeout=1).status_code == 200:
+                return server, server_tmp
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    server.kill()
+    raise RuntimeError(f"Server did not become healthy, see {log.name}")
+
+
+def stop_server(server):
+    server.send_signal(signal.SIGINT)
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+# ============= REQUEST BODIES =============
+
+def generate_video(path, size_mb, seconds):
+    """Test-pattern video with a tone, encoded so the file lands near size_mb."""
+    bitrate = max(100_000, int(size_mb * 1024 * 1024 * 8 / seconds) - 128_000)
+    subprocess.run([
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"testsrc=size=1280x720:rate=25:duration={seconds}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+        "-c:v", "mpeg4", "-b:v", str(bitrate), "-c:a", "aac", "-b:a", "128k", "-shortest", path
+    ], check=True)
+    return path
+
+
+class Scenario:
+    def __init__(self, name, video=None, token=None, username=None, password=None):
+        self.name = name
+        self.video = video
+        self.token = token
+        self.username = username
+        self.password = password
+        self._count = 0
+
+    async def send(self, client):
+        self._count += 1
+        if self.name == "pipeline":
+            with open(self.video, "rb") as f:
+                return await client.post(
+                    "/api/process-video-complete",
+                    headers={"X-API-Key": API_KEY},
+                    files={"video": ("lecture.mp4", f, "video/mp4")},
+                    data={"auth_token": self.token, "generation_mode": "eager"}
+                )
+        if self.name == "extract-audio":
+            with open(self.video, "rb") as f:
+                return await client.post(
+                    "/api/extract-audio",
+                    headers={"X-API-Key": API_KEY},
+                    files={"video": ("lecture.mp4", f, "video/mp4")}
+                )
+        if self.name == "signin":
+            return await client.post(
+                "/api/auth/signin", json={"username": self.username, "password": self.password}
+            )
+        headers = {"Authorization": f"Bearer {self.token}", "X-API-Key": API_KEY}
+        if self._count % 2:
+            return await client.get("/api/user/profile", headers=headers)
+        return await client.put(
+            "/api/user/preferences", headers=headers,
+            json={"major": random.choice(["Physics", "Biology", "Computer Science"])}
+        )
+
+
+# ============= LOAD =============
+
+async def sample_server(root_pid, server_tmp, stop, samples):
+    while not stop.is_set():
+        for pid in process_tree(root_pid):
+            usage = process_usage(pid)
+            if usage is None:
+                continue
+            peak = samples["processes"].setdefault(pid, {"rss_mb": 0.0, "fds": 0})
+            peak["rss_mb"] = max(peak["rss_mb"], round(usage[0] / (1024 * 1024), 1))
+            peak["fds"] = max(peak["fds"], usage[1])
+        samples["temp_files_peak"] = max(samples["temp_files_peak"], count_temp_files(server_tmp))
+        await asyncio.sleep(0.5)
+
+
+async def run_rate(args, scenario, rate, server, server_tmp):
+    latencies, statuses, failures, shed = [], {}, [], []
+    samples = {"processes": {}, "temp_files_peak": 0}
+    stop = asyncio.Event()
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=64)
+
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{args.port}", timeout=args.timeout, limits=limits
+    ) as client:
+        async def one():
+            started = time.perf_counter()
+            try:
+                response = await scenario.send(client)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                if response.status_code < 400:
+                    latencies.append(time.perf_counter() - started)
+                elif response.status_code == 429:
+                    shed.append(time.perf_counter() - started)
+                else:
+                    failures.append(response.status_code)
+            except httpx.HTTPError as e:
+                failures.append(type(e).__name__)
+
+        sampler = asyncio.create_task(sample_server(server.pid, server_tmp, stop, samples))
+        tasks = []
+        started = time.perf_counter()
+        # Open loop: arrivals keep coming whether or not the server keeps up
+        while time.perf_counter() - started < args.duration:
+            tasks.append(asyncio.create_task(one()))
+            await asyncio.sleep(random.expovariate(rate))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(1.0)
+        stop.set()
+        await sampler
+
+    sent = len(tasks)
+    error_rate = len(failures) / sent if sent else 0.0
+    p95 = percentile(latencies, 0.95)
+    return {
+        "scenario": scenario.name,
+        "rate_rps": rate,
+        "sent": sent,
+        "ok": len(latencies),
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "transport_errors": sorted({f for f in failures if isinstance(f, str)}),
+        "error_rate": round(error_rate, 4),
+        "shed_rate": round(len(shed) / sent, 4) if sent else 0.0,
+        "shed_latency_p95_s": round(percentile(shed, 0.95), 3),
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "latency_p50_s": round(percentile(latencies, 0.5), 3),
+        "latency_p95_s": round(p95, 3),
+        "latency_p99_s": round(percentile(latencies, 0.99), 3),
+        "processes": {str(pid): peak for pid, peak in samples["processes"].items()},
+        "rss_mb_total_peak": round(sum(p["rss_mb"] for p in samples["processes"].values()), 1),
+        "temp_files_peak": samples["temp_files_peak"],
+        "temp_files_leftover": count_temp_files(server_tmp),
+        "saturated": error_rate > 0.05 or p95 > args.slo,
+    }
+
+
+async def prepare_user(port):
+    username, password = f"load_{time.time_ns()}", "load-test-pass"
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+        response = await client.post("/api/auth/signup", json={
+            "name": "Load Test", "username": username, "password": password,
+            "age": 20, "academicLevel": "college", "major": "Physics"
+        })
+        response.raise_for_status()
+        return response.json()["access_token"], username, password
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", default=["signin", "profile", "extract-audio", "pipeline"],
+                        choices=["pipeline", "extract-audio", "signin", "profile"])
+    parser.add_argument("--rates", type=float, nargs="+", default=[0.5, 1, 2, 4], help="Arrivals per second")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of arrivals per rate")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--video-mb", type=float, default=20)
+    parser.add_argument("--video-seconds", type=int, default=60)
+    parser.add_argument("--analysis-latency", default="2.0,0.3", help="Fake analysis latency 'median,sigma'")
+    parser.add_argument("--agent-latency", default="1.5,0.5", help="Fake agent latency 'median,sigma'")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--slo", type=float, default=60, help="p95 seconds above which a rate counts as saturated")
+    parser.add_argument("--keep-state", action="store_true", help="Keep the server's state directory")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    needs_video = {"pipeline", "extract-audio"} & set(args.scenarios)
+    if needs_video and not shutil.which("ffmpeg"):
+        sys.exit("ffmpeg is required on PATH for the video scenarios")
+    if not os.path.isdir("/proc/self/fd"):
+        sys.exit("RSS and file descriptor sampling reads /proc; run on Linux")
+
+    state_dir = tempfile.mkdtemp(prefix="studysurf_loadtest_")
+    video = None
+    if needs_video:
+        video = generate_video(os.path.join(state_dir, "upload.mp4"), args.video_mb, args.video_seconds)
+        print(f"🎬 Upload body: {os.path.getsize(video) / (1024 * 1024):.1f} MB")
+
+    server, server_tmp = start_server(args, state_dir)
+    results = []
+    try:
+        token, username, password = asyncio.run(prepare_user(args.port))
+        for name in args.scenarios:
+            scenario = Scenario(name, video=video, token=token, username=username, password=password)
+            for rate in sorted(args.rates):
+                result = asyncio.run(run_rate(args, scenario, rate, server, server_tmp))
+                results.append(result)
+                print(
+                    f"{name:<14} {rate:>6} req/s  sent={result['sent']:<5} ok={result['ok']:<5} "
+                    f"p50={result['latency_p50_s']}s p95={result['latency_p95_s']}s  "
+                    f"rss={result['rss_mb_total_peak']}MB  temp peak/left="
+                    f"{result['temp_files_peak']}/{result['temp_files_leftover']}  shed={result['shed_rate']:.1%}  "
+                    f"statuses={result['statuses']}"
+                    f"{'  SATURATED' if result['saturated'] else ''}"
+                )
+                if result["saturated"] or server.poll() is not None:
+                    break
+            if server.poll() is not None:
+                print(f"💥 Server exited with {server.returncode}")
+                break
+    finally:
+        stop_server(server)
+        if not args.keep_state:
+            shutil.rmtree(state_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "meta": {"workers": args.workers, "video_mb": args.video_mb, "duration_s": args.duration,
+                         "analysis_latency": args.analysis_latency, "agent_latency": args.agent_latency},
+                "results": results,
+            }, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main_cli()
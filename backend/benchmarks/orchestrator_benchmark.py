@@ -0,0 +1,267 @@
+"""
+Offline benchmark for the analysis + content orchestration pipeline.
+
+Runs GeminiSpeechToTextAgent.transcribe_and_analyze followed by
+ContentOrchestrator.orchestrate_content_generation against a fake genai
+client (benchmarks/fake_genai.py) that replays payloads derived from
+responses/response*.json, so changes to the orchestrator, scheduler or
+agents can be measured without network access or API quota.
+
+For each concurrency level it reports end-to-end p50/p95/p99, time to the
+first finished agent, fallback rate (failed agents plus agents that fell
+back to canned content) and process CPU per pipeline.
+
+Usage (from backend/):
+    python -m benchmarks.orchestrator_benchmark --concurrency 1 10 50 --pipelines 50 \
+        [--agent-latency 0.3 0.5] [--rate-429 0.02] [--malformed-rate 0.05] \
+        [--json results.json] [--compare baseline.json --max-regression 0.15]
+
+--compare exits with status 1 if p95 or CPU per pipeline regressed by more
+than --max-regression against the baseline, so it can gate CI.
+"""
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("GOOGLE_GEMINI_API_KEY", "offline-benchmark")
+
+from benchmarks import fake_genai  # noqa: E402
+from benchmarks.fake_genai import FakeGenaiConfig, LatencyModel  # noqa: E402
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Start time of the pipeline the current task belongs to (copied into agent tasks)
+_pipeline = contextvars.ContextVar("benchmark_pipeline", default=None)
+
+
+def instrument_agents(orchestrator):
+    """Record when each agent finishes, relative to its pipeline's start."""
+    for agent in orchestrator.agents.values():
+        generate = agent.generate_content
+
+        async def timed(work_order, gemini_analysis, user_context, _generate=generate):
+            try:
+                return await _generate(work_order, gemini_analysis, user_context)
+            finally:
+                record = _pipeline.get()
+                if record is not None:
+                    record["agent_done"].append(time.perf_counter() - record["started"])
+
+        agent.generate_content = timed
+
+
+def count_fallbacks(content_results):
+    fallbacks = 0
+    for entry in content_results.values():
+        content = entry.get("content")
+        if entry.get("status") != "success" or (
+            isinstance(content, dict) and content.get("status") == "fallback_generated"
+        ):
+            fallbacks += 1
+    return fallbacks, len(content_results)
+
+
+async def run_pipeline(stt_agent, orchestrator, index, analysis_in_thread):
+    record = {"started": time.perf_counter(), "agent_done": []}
+    _pipeline.set(record)
+    user_context = {
+        "userId": f"bench-user-{index % 8}",
+        "major": "Physics",
+        "academicLevel": "college",
+        "languagePreference": "English",
+        "learningStyles": ["visual"],
+    }
+    try:
+        if analysis_in_thread:
+            analysis = await asyncio.to_thread(stt_agent.transcribe_and_analyze, "bench-audio.wav", user_context)
+        else:
+            # Same as the /api/complete-pipeline handler: a blocking call on the event loop
+            analysis = stt_agent.transcribe_and_analyze("bench-audio.wav", user_context)
+        analysis_done = time.perf_counter() - record["started"]
+        result = await orchestrator.orchestrate_content_generation(
+            work_orders=analysis.get("work_orders", {}),
+            gemini_analysis=analysis.get("gemini_analysis", {}),
+            user_context=user_context
+        )
+    except Exception as e:
+        return {"ok": False, "error": str(e), "elapsed": time.perf_counter() - record["started"]}
+
+    fallbacks, agents = count_fallbacks(result.get("content", {}))
+    return {
+        "ok": True,
+        "elapsed": time.perf_counter() - record["started"],
+        "analysis": analysis_done,
+        "first_agent": min(record["agent_done"]) if record["agent_done"] else None,
+        "analysis_fallback": "educational_analysis" not in analysis.get("gemini_analysis", {}),
+        "fallbacks": fallbacks,
+        "agents": agents,
+    }
+
+
+async def run_level(stt_agent, orchestrator, concurrency, total_pipelines, analysis_in_thread):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(index):
+        async with semaphore:
+            return await run_pipeline(stt_agent, orchestrator, index, analysis_in_thread)
+
+    fake_genai.stats.reset()
+    cpu_started, wall_started = time.process_time(), time.perf_counter()
+    results = await asyncio.gather(*[bounded(i) for i in range(total_pipelines)])
+    cpu_used, wall = time.process_time() - cpu_started, time.perf_counter() - wall_started
+
+    ok = [r for r in results if r["ok"]]
+    elapsed = [r["elapsed"] for r in ok]
+    first_agent = [r["first_agent"] for r in ok if r["first_agent"] is not None]
+    agents = sum(r["agents"] for r in ok)
+    return {
+        "concurrency": concurrency,
+        "pipelines": total_pipelines,
+        "ok": len(ok),
+        "errors": len(results) - len(ok),
+        "wall_s": round(wall, 3),
+        "throughput_pps": round(total_pipelines / wall, 3) if wall else 0.0,
+        "e2e_p50_s": round(percentile(elapsed, 0.5), 3),
+        "e2e_p95_s": round(percentile(elapsed, 0.95), 3),
+        "e2e_p99_s": round(percentile(elapsed, 0.99), 3),
+        "analysis_p50_s": round(percentile([r["analysis"] for r in ok], 0.5), 3),
+        "first_agent_p50_s": round(percentile(first_agent, 0.5), 3),
+        "first_agent_p95_s": round(percentile(first_agent, 0.95), 3),
+        "fallback_rate": round(sum(r["fallbacks"] for r in ok) / agents, 4) if agents else 0.0,
+        "analysis_fallback_rate": round(sum(r["analysis_fallback"] for r in ok) / len(ok), 4) if ok else 0.0,
+        "cpu_ms_per_pipeline": round(cpu_used * 1000 / total_pipelines, 2),
+        "fake_genai": fake_genai.stats.snapshot(),
+    }
+
+
+async def run(args):
+    from agents.orchestrator import ContentOrchestrator
+    from agents.speech_to_text_agent import GeminiSpeechToTextAgent
+
+    log = io.StringIO()
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else log):
+        stt_agent = GeminiSpeechToTextAgent()
+        orchestrator = ContentOrchestrator()
+    instrument_agents(orchestrator)
+
+    levels = []
+    for concurrency in args.concurrency:
+        total = max(args.pipelines, concurrency)
+        with contextlib.redirect_stdout(sys.stdout if args.verbose else io.StringIO()):
+            result = await run_level(stt_agent, orchestrator, concurrency, total, args.analysis_in_thread)
+        levels.append(result)
+        print(
+            f"concurrency={concurrency:<3} pipelines={total:<4} "
+            f"p50={result['e2e_p50_s']}s p95={result['e2e_p95_s']}s p99={result['e2e_p99_s']}s  "
+            f"first agent p50={result['first_agent_p50_s']}s  fallback={result['fallback_rate']:.1%}  "
+            f"cpu={result['cpu_ms_per_pipeline']}ms/pipeline  errors={result['errors']}"
+        )
+    return levels
+
+
+def compare(results, baseline, max_regression):
+    """Print per-level deltas against a baseline run; True if nothing regressed past the threshold."""
+    baseline_levels = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    passed = True
+    for level in results["levels"]:
+        base = baseline_levels.get(level["concurrency"])
+        if base is None:
+            continue
+        for metric in ("e2e_p50_s", "e2e_p95_s", "e2e_p99_s", "first_agent_p50_s", "cpu_ms_per_pipeline"):
+            before, after = base.get(metric), level.get(metric)
+            if not before:
+                continue
+            change = (after - before) / before
+            gated = metric in ("e2e_p95_s", "cpu_ms_per_pipeline")
+            flag = "REGRESSION" if gated and change > max_regression else ""
+            if flag:
+                passed = False
+            print(f"  c={level['concurrency']:<3} {metric:<20} {before:>9} -> {after:<9} {change:+.1%} {flag}")
+    return passed
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--pipelines", type=int, default=50, help="Pipelines per level (at least the concurrency)")
+    parser.add_argument("--keys", type=int, default=3, help="Number of fake API keys in the pool")
+    parser.add_argument("--analysis-latency", type=float, nargs=2, default=[0.5, 0.3], metavar=("MEDIAN", "SIGMA"))
+    parser.add_argument("--agent-latency", type=float, nargs=2, default=[0.3, 0.5], metavar=("MEDIAN", "SIGMA"))
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--analysis-in-thread", action="store_true",
+                        help="Run transcribe_and_analyze on a worker thread instead of the event loop")
+    parser.add_argument("--verbose", action="store_true", help="Show the agents' own logging")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--compare", help="Baseline results file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.15)
+    args = parser.parse_args()
+
+    # Every pipeline must reach the fake client; cached agent results would hide it
+    os.environ["AGENT_CACHE_ENABLED"] = "false"
+    for i in range(2, args.keys + 1):
+        os.environ.setdefault(f"GOOGLE_GEMINI_API_KEY_{i}", f"offline-benchmark-{i}")
+    config = fake_genai.install(FakeGenaiConfig(
+        analysis_latency=LatencyModel(*args.analysis_latency),
+        agent_latency=LatencyModel(*args.agent_latency),
+        rate_429=args.rate_429,
+        malformed_rate=args.malformed_rate,
+        seed=args.seed,
+    ))
+
+    results = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "keys": args.keys,
+            "analysis_latency": list(args.analysis_latency),
+            "agent_latency": list(args.agent_latency),
+            "rate_429": config.rate_429,
+            "malformed_rate": config.malformed_rate,
+            "seed": config.seed,
+            "analysis_in_thread": args.analysis_in_thread,
+        },
+        "levels": asyncio.run(run(args)),
+    }
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        print(f"Compared with {args.compare} (revision {baseline.get('meta', {}).get('revision')}):")
+        if not compare(results, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,128 @@
+"""
+Signin throughput benchmark across bcrypt cost factors and hashing pool sizes.
+
+Drives the real /api/auth/signin endpoint in process (httpx ASGI transport)
+against the in-memory user store, while probing /health to show how much
+the event loop is held up by password hashing.
+
+Usage (from backend/):
+    python -m benchmarks.signin_benchmark --rounds 10 12 --pool-sizes 0 1 2 4 \
+        --requests 200 --concurrency 32 [--json results.json]
+
+Pool size 0 hashes on worker threads (the pre-pool behaviour).
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("USER_STORE_BACKEND", "memory")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+async def probe_health(client, stop, latencies):
+    """Hit a trivial endpoint every 10 ms; its latency is the event loop's stall time."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/health")
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.01)
+
+
+async def run_case(rounds, pool_size, total_requests, concurrency):
+    main.password_pool.configure(pool_size=pool_size, rounds=rounds)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        username = f"bench_{rounds}_{pool_size}_{time.time_ns()}"
+        signup = await client.post("/api/auth/signup", json={
+            "name": "Bench", "username": username, "password": "benchmark-pass",
+            "age": 20, "academicLevel": "college", "major": "Computer Science"
+        })
+        signup.raise_for_status()
+        # Warm up the worker processes so spawn cost is not measured
+        await asyncio.gather(*[
+            client.post("/api/auth/signin", json={"username": username, "password": "benchmark-pass"})
+            for _ in range(max(1, pool_size))
+        ])
+
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies, statuses, health = [], [], []
+        stop = asyncio.Event()
+
+        async def signin():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post(
+                    "/api/auth/signin", json={"username": username, "password": "benchmark-pass"}
+                )
+                latencies.append(time.perf_counter() - started)
+                statuses.append(response.status_code)
+
+        prober = asyncio.create_task(probe_health(client, stop, health))
+        started = time.perf_counter()
+        await asyncio.gather(*[signin() for _ in range(total_requests)])
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await prober
+
+    return {
+        "rounds": rounds,
+        "pool_size": pool_size,
+        "requests": total_requests,
+        "concurrency": concurrency,
+        "ok": statuses.count(200),
+        "rejected": statuses.count(503),
+        "throughput_rps": round(total_requests / elapsed, 2),
+        "latency_p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+        "latency_p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "health_p50_ms": round(percentile(health, 0.5) * 1000, 1),
+        "health_max_ms": round(max(health) * 1000, 1) if health else 0.0,
+        "mean_hash_run_ms": round(statistics.mean(main.password_pool._run_times) * 1000, 1)
+        if main.password_pool._run_times else 0.0,
+    }
+
+
+async def run(args):
+    results = []
+    for rounds in args.rounds:
+        for pool_size in args.pool_sizes:
+            result = await run_case(rounds, pool_size, args.requests, args.concurrency)
+            results.append(result)
+            print(
+                f"cost={rounds:<3} pool={pool_size:<3} {result['throughput_rps']:>8} req/s  "
+                f"p50={result['latency_p50_ms']}ms p95={result['latency_p95_ms']}ms  "
+                f"health max={result['health_max_ms']}ms  rejected={result['rejected']}"
+            )
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 12])
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main_cli()
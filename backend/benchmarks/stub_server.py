@@ -0,0 +1,49 @@
+"""
+The real FastAPI app with Gemini and storage stubbed out, for load tests.
+
+Importing this module installs the fake genai client (benchmarks/fake_genai.py)
+and points the user and lecture stores at SQLite files before main is
+imported, so every uvicorn worker gets the same setup:
+
+    python -m uvicorn benchmarks.stub_server:app --workers 2 --port 8765
+
+ffmpeg still runs for real; that is what the load test is meant to exercise.
+Fake latencies are read from LOADTEST_ANALYSIS_LATENCY and
+LOADTEST_AGENT_LATENCY ("median,sigma" in seconds).
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_state_dir = os.getenv("LOADTEST_STATE_DIR", os.path.join(tempfile.gettempdir(), "studysurf_loadtest"))
+os.makedirs(_state_dir, exist_ok=True)
+os.environ.setdefault("GOOGLE_GEMINI_API_KEY", "load-test")
+os.environ.setdefault("ELEVENLABS_API_KEY", "load-test")
+os.environ.setdefault("USER_STORE_BACKEND", "sqlite")
+os.environ.setdefault("USER_STORE_PATH", os.path.join(_state_dir, "users.db"))
+os.environ.setdefault("LECTURE_STORE_BACKEND", "local")
+os.environ.setdefault("LECTURE_STORE_PATH", os.path.join(_state_dir, "lectures.db"))
+os.environ.setdefault("AGENT_CACHE_DIR", os.path.join(_state_dir, "agent_cache"))
+os.environ.setdefault("IDEMPOTENCY_STORE_PATH", os.path.join(_state_dir, "idempotency.db"))
+
+from benchmarks import fake_genai  # noqa: E402
+from benchmarks.fake_genai import FakeGenaiConfig, LatencyModel  # noqa: E402
+
+
+def _latency(name: str, default: str) -> LatencyModel:
+    median, _, sigma = os.getenv(name, default).partition(",")
+    return LatencyModel(float(median), float(sigma or 0))
+
+
+fake_genai.install(FakeGenaiConfig(
+    analysis_latency=_latency("LOADTEST_ANALYSIS_LATENCY", "2.0,0.3"),
+    agent_latency=_latency("LOADTEST_AGENT_LATENCY", "1.5,0.5"),
+    rate_429=float(os.getenv("LOADTEST_RATE_429", "0")),
+    malformed_rate=float(os.getenv("LOADTEST_MALFORMED_RATE", "0")),
+))
+
+from main import app  # noqa: E402
+
+__all__ = ["app"]
@@ -1,17 +1,34 @@
-from fastapi import FastAPI, Depends, HTTPException, Header, UploadFile, File, Form, status
+from fastapi import FastAPI, Depends, HTTPException, Header, UploadFile, File, Form, Query, status, BackgroundTasks, Response, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import APIKeyHeader, HTTPBearer, HTTPAuthorizationCredentials
 from mangum import Mangum
+from brotli_asgi import BrotliMiddleware
 import os
-import tempfile
-from typing import Optional
+import asyncio
+from contextlib import asynccontextmanager
+from typing import List, Optional
 from dotenv import load_dotenv
 
 from utils.video_processor import VideoProcessor
-from utils.auth import AuthManager, get_current_user_id
-from utils.firestore_client import FirestoreClient
+from utils.auth import AuthManager, get_current_user_id, get_token_claims, get_token_cache_stats
+from utils.user_store import create_user_store
+from utils.password_pool import PasswordHashPool
+from utils.lecture_store import create_lecture_store, payload_etag
+from utils.response_format import (
+    RESPONSE_FORMAT_VERSIONS, render_pipeline_response, validate_fields, conditional_response,
+    etag_matches, not_modified_response, timed_json_response
+)
+from utils.stage_timer import ServerTimingMiddleware, stage, timings_summary
+from utils.tracing import RequestTracingMiddleware, log_event, span
+from utils.admission import AdmissionController, AdmissionMiddleware
+from utils.idempotency import IdempotencyMiddleware, IdempotencyStore
+from utils.disconnect import ClientDisconnected, DisconnectCancellationMiddleware, detach_from_client
+from utils.artifact_store import Artifact, ArtifactStore
 from agents.speech_to_text_agent import GeminiSpeechToTextAgent
 from agents.orchestrator import ContentOrchestrator
+from agents.scheduler import GeminiCallScheduler, normalize_priority
+from agents.base_agent import GeminiAPIKeyManager
+from agents.on_demand import OnDemandFormatGenerator
 from models.schemas import (
     UserSignupRequest, UserSigninRequest, UserPreferencesUpdate, 
     UserResponse, AuthResponse, VideoProcessingRequest
@@ -23,10 +40,23 @@ load_dotenv(dotenv_path="../../.env")
 # Simple API key from environment
 API_KEY = os.getenv("API_KEY", "study_surf_users_secret_key")
 
+# Most audio artifacts one /api/gemini-transcribe call may analyze
+TRANSCRIBE_MAX_BATCH = int(os.getenv("TRANSCRIBE_MAX_BATCH", "50"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Periodically remove expired temp artifacts (unclaimed audio, uploads of crashed requests)
+    sweeper = asyncio.create_task(ArtifactStore().run_sweeper())
+    try:
+        yield
+    finally:
+        sweeper.cancel()
+
 app = FastAPI(
     title="StudySurf Backend - StudySurf AI", 
     version="1.0.0",
     description="Educational video processing backend with AI-powered content extraction and user management",
+    lifespan=lifespan,
     tags_metadata=[
         {
             "name": "Health & Status",
@@ -54,25 +84,50 @@ app = FastAPI(
 # Initialize services
 video_processor = VideoProcessor()
 auth_manager = AuthManager()
-db_client = FirestoreClient()
+db_client = create_user_store()
+password_pool = PasswordHashPool()
+lecture_store = create_lecture_store()
+artifact_store = ArtifactStore()
 
 # Initialize Gemini agent (for Best Use of Gemini API prize!)
 try:
     gemini_agent = GeminiSpeechToTextAgent()
-    print("🏆 Google Gemini 2.5 Pro initialized for Best Use of Gemini API!")
+    log_event("gemini_agent_initialized")
 except ValueError as e:
-    print(f"⚠️ Gemini agent initialization failed: {e}")
+    log_event("gemini_agent_init_failed", "error", error=str(e))
     gemini_agent = None
 
 # Initialize Content Orchestrator
 try:
     content_orchestrator = ContentOrchestrator()
-    print("🎯 Content Orchestrator initialized with 6 specialized agents!")
+    log_event("content_orchestrator_initialized", agents=len(content_orchestrator.agents))
 except Exception as e:
-    print(f"⚠️ Content Orchestrator initialization failed: {e}")
+    log_event("content_orchestrator_init_failed", "error", error=str(e))
     content_orchestrator = None
 
+# Size pipeline admission from the Gemini key pool (plus CPU and temp disk headroom)
+admission_controller = AdmissionController()
+if content_orchestrator:
+    admission_controller.configure_from_resources(
+        key_count=GeminiAPIKeyManager().get_client_count(),
+        per_key_concurrency=GeminiCallScheduler().per_key_concurrency,
+        agents_per_pipeline=len(content_orchestrator.agents)
+    )
+
+# Lazy per-format generation for stored lectures
+format_generator = OnDemandFormatGenerator(content_orchestrator, lecture_store) if content_orchestrator else None
+
+
 
+# Innermost: cancel upload pipelines whose client has disconnected (unless detached)
+app.add_middleware(DisconnectCancellationMiddleware)
+
+# Bounded concurrency + wait queue for the expensive endpoints (fast 429 when saturated)
+app.add_middleware(AdmissionMiddleware)
+
+# Idempotency-Key on the upload endpoints: retries attach to the running pipeline or replay
+# its stored result, without taking an admission slot
+app.add_middleware(IdempotencyMiddleware)
 
 # Add CORS middleware to allow all origins
 app.add_middleware(
@@ -81,8 +136,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all methods (GET, POST, PUT, DELETE, etc.)
     allow_headers=["*"],  # Allow all headers
+    expose_headers=["ETag", "X-Access-Token", "Server-Timing", "X-Request-ID", "Retry-After", "Idempotent-Replayed"],  # Readable by frontend JS
 )
 
+# Compress responses (brotli when accepted, gzip fallback) - pipeline responses run to hundreds of KB
+app.add_middleware(BrotliMiddleware, minimum_size=1024)
+
+# Per-request stage timer, reported in the Server-Timing header
+app.add_middleware(ServerTimingMiddleware)
+
+# Outermost: request ID + root trace span, so every stage and log line below is correlated
+app.add_middleware(RequestTracingMiddleware)
+
 # Security schemes
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 bearer_scheme = HTTPBearer()
@@ -102,6 +167,45 @@ def get_current_user_from_token(credentials: HTTPAuthorizationCredentials = Depe
         )
     return user_id
 
+def merge_profile_into_context(user_context: dict, user_profile: dict, user_id: str) -> dict:
+    """
+    Override personalization fields in user_context with the stored user preferences.
+    
+    Only fields present in user_profile are merged, so a partial snapshot (the token's
+    prefs claim has no age or name) keeps whatever the context already had.
+    """
+    prefs = user_profile.get('preferences', {})
+    for field in ("major", "academicLevel", "dyslexiaSupport", "languagePreference", "learningStyles", "age"):
+        if field in prefs:
+            user_context[field] = prefs[field]
+    user_context.setdefault("dyslexiaSupport", False)
+    user_context.setdefault("languagePreference", "English")
+    user_context.setdefault("learningStyles", [])
+    if user_profile.get('name'):
+        user_context["userName"] = user_profile['name']
+    user_context["userId"] = user_id
+    return user_context
+
+async def get_owned_lecture(lecture_id: str, user_id: str) -> dict:
+    """The stored lecture if user_id owns it; otherwise 404, so lecture IDs of other users aren't revealed."""
+    lecture = await lecture_store.get_lecture(lecture_id)
+    if not lecture or lecture.get("userId") != user_id:
+        raise HTTPException(status_code=404, detail=f"Lecture '{lecture_id}' not found")
+    return lecture
+
+async def save_upload(video: UploadFile) -> Artifact:
+    """Write an uploaded video to the artifact store; the caller deletes it when done."""
+    with stage("temp-write"):
+        content = await video.read()
+        upload = artifact_store.create(".mp4", expected_bytes=len(content))
+        try:
+            with open(upload.path, "wb") as f:
+                f.write(content)
+            return artifact_store.commit(upload)
+        except BaseException:
+            artifact_store.delete(upload.artifact_id)
+            raise
+
 # ============= HEALTH & STATUS ENDPOINTS =============
 
 @app.get("/", tags=["Health & Status"])
@@ -121,21 +225,13 @@ def health():
 # ============= AUTHENTICATION ENDPOINTS =============
 
 @app.post("/api/auth/signup", response_model=AuthResponse, tags=["Authentication"])
-def signup_user(user_data: UserSignupRequest):
+async def signup_user(user_data: UserSignupRequest):
     """
     User signup with preferences. Creates account and returns auth token.
     No API key required for signup.
     """
-    # Check if username already exists
-    existing_user = db_client.get_user_by_username(user_data.username)
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Username already registered"
-        )
-    
-    # Hash password
-    password_hash = auth_manager.hash_password(user_data.password)
+    # Hash password (username uniqueness is enforced atomically by create_user)
+    password_hash = await password_pool.hash_password(user_data.password)
     
     # Prepare user data for DynamoDB
     user_db_data = {
@@ -152,11 +248,12 @@ def signup_user(user_data: UserSignupRequest):
     }
     
     # Create new user in DynamoDB
-    new_user = db_client.create_user(user_db_data)
+    new_user = await db_client.create_user(user_db_data)
     
     # Create access token
     access_token = auth_manager.create_access_token(
-        data={"user_id": new_user['userId'], "username": new_user['username']}
+        data={"user_id": new_user['userId'], "username": new_user['username']},
+        preferences=new_user['preferences']
     )
     
     # Convert to response model
@@ -177,13 +274,13 @@ def signup_user(user_data: UserSignupRequest):
     return AuthResponse(access_token=access_token, user=user_response)
 
 @app.post("/api/auth/signin", response_model=AuthResponse, tags=["Authentication"])
-def signin_user(signin_data: UserSigninRequest):
+async def signin_user(signin_data: UserSigninRequest, background_tasks: BackgroundTasks):
     """
     User signin. Returns auth token if credentials are valid.
     No API key required for signin.
     """
     # Find user
-    user = db_client.get_user_by_username(signin_data.username)
+    user = await db_client.get_user_by_username(signin_data.username)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -191,15 +288,21 @@ def signin_user(signin_data: UserSigninRequest):
         )
     
     # Verify password
-    if not auth_manager.verify_password(signin_data.password, user['passwordHash']):
+    # bcrypt runs on the hashing process pool, off the event loop
+    if not await password_pool.verify_password(signin_data.password, user['passwordHash']):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid username or password"
         )
     
+    # Bring hashes made with another cost factor up to BCRYPT_ROUNDS after responding
+    if password_pool.needs_rehash(user['passwordHash']):
+        background_tasks.add_task(rehash_password, user['userId'], signin_data.password)
+    
     # Create access token
     access_token = auth_manager.create_access_token(
-        data={"user_id": user['userId'], "username": user['username']}
+        data={"user_id": user['userId'], "username": user['username']},
+        preferences=user['preferences']
     )
     
     # Convert to response model
@@ -219,13 +322,26 @@ def signin_user(signin_data: UserSigninRequest):
     
     return AuthResponse(access_token=access_token, user=user_response)
 
+async def rehash_password(user_id: str, password: str):
+    """Replace a user's password hash with one at the configured cost factor."""
+    try:
+        await db_client.update_password_hash(user_id, await password_pool.hash_password(password))
+        log_event("password_rehashed", user_id=user_id, rounds=password_pool.rounds)
+    except Exception as e:
+        log_event("password_rehash_failed", "warning", user_id=user_id, error=str(e))
+
+@app.get("/api/auth/hash-pool-stats", tags=["Authentication"])
+def get_hash_pool_stats(api_key: str = Depends(validate_api_key)):
+    """📈 AUTH: Queue depth, wait and run times of the bcrypt process pool."""
+    return password_pool.get_stats()
+
 @app.get("/api/user/profile", response_model=UserResponse, tags=["User Management"])
-def get_user_profile(
+async def get_user_profile(
     user_id: str = Depends(get_current_user_from_token),
     api_key: str = Depends(validate_api_key)
 ):
     """Get current user's profile. Requires API key + JWT token authentication."""
-    user = db_client.get_user_by_id(user_id)
+    user = await db_client.get_user_by_id(user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -247,23 +363,25 @@ def get_user_profile(
     )
 
 @app.put("/api/user/preferences", response_model=UserResponse, tags=["User Management"])
-def update_user_preferences(
+async def update_user_preferences(
     preferences: UserPreferencesUpdate,
+    response: Response,
     user_id: str = Depends(get_current_user_from_token),
     api_key: str = Depends(validate_api_key)
 ):
-    """Update user preferences. Requires API key + JWT token authentication."""
-    # Get current user to verify existence
-    current_user = db_client.get_user_by_id(user_id)
-    if not current_user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
+    """
+    Update user preferences. Requires API key + JWT token authentication.
     
-    # Update only provided fields
+    Returns a refreshed token in the X-Access-Token header whose preference claims
+    match the new preferences; clients should replace their stored token with it.
+    """
+    # Update only provided fields (a missing user is a 404 from the update itself)
     update_data = preferences.dict(exclude_unset=True)
-    updated_user = db_client.update_user_preferences(user_id, update_data)
+    updated_user = await db_client.update_user_preferences(user_id, update_data)
+    response.headers["X-Access-Token"] = auth_manager.create_access_token(
+        data={"user_id": updated_user['userId'], "username": updated_user['username']},
+        preferences=updated_user['preferences']
+    )
     
     return UserResponse(
         id=updated_user['userId'],
@@ -304,14 +422,11 @@ async def extract_audio_from_video(
         raise HTTPException(status_code=400, detail="Video file too large (max 100MB)")
     
     # Save uploaded file temporarily
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_video:
-        content = await video.read()
-        temp_video.write(content)
-        temp_video_path = temp_video.name
+    upload = await save_upload(video)
     
     try:
         # Extract audio with detailed info
-        result = video_processor.extract_audio(temp_video_path, return_info=True)
+        result = await video_processor.extract_audio_async(upload.path)
         
         # Add upload metadata
         result["upload_info"] = {
@@ -320,26 +435,51 @@ async def extract_audio_from_video(
             "size_bytes": video.size,
             "size_mb": round(video.size / (1024 * 1024), 2) if video.size else 0
         }
+        result["timings"] = timings_summary()
         
-        return result
+        return timed_json_response(result)
         
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Audio extraction failed: {str(e)}")
     finally:
-        # Cleanup video file
-        if os.path.exists(temp_video_path):
-            os.unlink(temp_video_path)
+        # Cleanup video file; the audio stays in the artifact store for /api/gemini-transcribe
+        artifact_store.delete(upload.artifact_id)
+
+async def analyze_audio(audio_path: str, user_context: dict, priority: Optional[str]) -> dict:
+    """
+    Run transcribe_and_analyze on the next key of the pool inside a scheduler slot.
+
+    Queued with the agents' calls, so uploads get the same fair share and
+    interactive reserve as every other Gemini request.
+    """
+    with span("gemini.transcribe") as transcribe_span:
+        async with GeminiCallScheduler().slot(priority, user_context.get("userId")) as queue_wait:
+            key_index, client = GeminiAPIKeyManager().get_next_client_with_index()
+            transcribe_span.set_attributes({"gemini.key_index": key_index, "scheduler.queue_wait_s": round(queue_wait, 4)})
+            return await asyncio.to_thread(
+                gemini_agent.transcribe_and_analyze, audio_path, dict(user_context), client
+            )
+
+async def transcribe_artifact(artifact_id: str, user_context: dict, priority: str) -> dict:
+    """Analyze one extracted audio artifact, then delete it."""
+    try:
+        with span("transcribe.artifact", **{"artifact.id": artifact_id}), artifact_store.use(artifact_id) as audio:
+            return await analyze_audio(audio.path, user_context, priority)
+    finally:
+        artifact_store.delete(artifact_id)
 
 @app.post("/api/gemini-transcribe", tags=["Video Processing"])
 async def gemini_transcribe_audio(
-    audio_file_path: str = Form(...),
+    audio_artifact_id: Optional[str] = Form(default=None),
+    audio_artifact_ids: List[str] = Form(default=[]),
     user_background: Optional[str] = Form(default="general"),
     academic_level: Optional[str] = Form(default="general"),
     mode: Optional[str] = Form(default="speed"),
     model: Optional[str] = Form(default=None),
     work_orders_mode: Optional[str] = Form(default="guided"),
+    priority: Optional[str] = Form(default=None),
     api_key: str = Depends(validate_api_key)
 ):
     """
@@ -349,13 +489,17 @@ async def gemini_transcribe_audio(
     Goes beyond simple transcription to provide personalized educational insights.
     
     Args:
-        audio_file_path: Path to the extracted audio file (from /api/extract-audio)
+        audio_artifact_id: audio_artifact_id returned by /api/extract-audio (deleted after processing)
+        audio_artifact_ids: Repeat the field to analyze several artifacts in one call; they run
+            concurrently across the Gemini key pool and results are returned per item
         user_background: User's field of study (e.g., "Computer Science", "Physics")
         academic_level: User's academic level (e.g., "High School", "College")
+        priority: Gemini scheduler class (default interactive for one artifact, background for a batch)
         api_key: API authentication key
     
     Returns:
-        Dict containing Gemini's intelligent analysis of the educational content
+        Dict containing Gemini's intelligent analysis of the educational content; for
+        audio_artifact_ids, a results list with one entry (analysis or error) per artifact
     """
     
     if not gemini_agent:
@@ -364,52 +508,86 @@ async def gemini_transcribe_audio(
             detail="🚫 Google Gemini API not available. Please set GOOGLE_GEMINI_API_KEY in .env file."
         )
     
-    # Validate audio file exists
-    if not os.path.exists(audio_file_path):
+    batch = bool(audio_artifact_ids)
+    # Order-preserving dedupe: each artifact is consumed by its first analysis
+    artifact_ids = list(dict.fromkeys(([audio_artifact_id] if audio_artifact_id else []) + audio_artifact_ids))
+    if not artifact_ids:
         raise HTTPException(
             status_code=400,
-            detail="Audio file not found. Use /api/extract-audio first to get the audio_path."
+            detail="Provide audio_artifact_id or audio_artifact_ids. Use /api/extract-audio first to get one."
+        )
+    if len(artifact_ids) > TRANSCRIBE_MAX_BATCH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many artifacts ({len(artifact_ids)}); at most {TRANSCRIBE_MAX_BATCH} per call"
+        )
+    if not batch and artifact_store.get(audio_artifact_id) is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Audio artifact not found or expired. Use /api/extract-audio first to get an audio_artifact_id."
         )
     
-    try:
-        # Prepare user context for personalized analysis
-        user_context = {
-            "major": user_background,
-            "academicLevel": academic_level,
-            "prefer_fast": mode == "speed",
-            "force_model": model,
-            "work_orders_mode": work_orders_mode
-        }
-        
-        # Use Gemini for intelligent analysis
-        result = gemini_agent.transcribe_and_analyze(audio_file_path, user_context)
-        
-        # Add processing metadata
-        result["processing_info"] = {
-            "audio_file_processed": audio_file_path,
-            "personalization": {
-                "user_background": user_background,
-                "academic_level": academic_level
-            },
-            "gemini_features_used": [
-                "Multimodal audio understanding",
-                "Educational content analysis",
-                "Personalized learning insights",
-                "Concept extraction",
-                "Real-world application mapping"
-            ]
-        }
-        
-        return result
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Gemini processing failed: {str(e)}")
-    finally:
-        # Cleanup audio file after processing
-        if os.path.exists(audio_file_path):
-            os.unlink(audio_file_path)
+    # Prepare user context for personalized analysis
+    user_context = {
+        "major": user_background,
+        "academicLevel": academic_level,
+        "prefer_fast": mode == "speed",
+        "force_model": model,
+        "work_orders_mode": work_orders_mode
+    }
+    priority = normalize_priority(priority or ("background" if batch else "interactive"))
+    processing_info = {
+        "personalization": {
+            "user_background": user_background,
+            "academic_level": academic_level
+        },
+        "gemini_features_used": [
+            "Multimodal audio understanding",
+            "Educational content analysis",
+            "Personalized learning insights",
+            "Concept extraction",
+            "Real-world application mapping"
+        ]
+    }
+    
+    if not batch:
+        try:
+            # Use Gemini for intelligent analysis
+            result = await transcribe_artifact(audio_artifact_id, user_context, priority)
+            
+            # Add processing metadata
+            result["processing_info"] = dict(audio_artifact_id=audio_artifact_id, **processing_info)
+            result["timings"] = timings_summary()
+            
+            return timed_json_response(result)
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Gemini processing failed: {str(e)}")
+    
+    async def transcribe_item(artifact_id: str) -> dict:
+        try:
+            analysis = await transcribe_artifact(artifact_id, user_context, priority)
+            return {"audio_artifact_id": artifact_id, "status": "success", "analysis": analysis}
+        except ClientDisconnected:
+            raise
+        except HTTPException as e:
+            return {"audio_artifact_id": artifact_id, "status": "error", "status_code": e.status_code, "error": e.detail}
+        except Exception as e:
+            return {"audio_artifact_id": artifact_id, "status": "error", "status_code": 500,
+                    "error": f"Gemini processing failed: {str(e)}"}
+    
+    results = await asyncio.gather(*(transcribe_item(artifact_id) for artifact_id in artifact_ids))
+    succeeded = sum(1 for item in results if item["status"] == "success")
+    log_event("transcribe_batch_completed", items=len(results), succeeded=succeeded, priority=priority)
+    
+    return timed_json_response({
+        "results": results,
+        "summary": {"total": len(results), "succeeded": succeeded, "failed": len(results) - succeeded},
+        "processing_info": dict(priority=priority, **processing_info),
+        "timings": timings_summary(),
+    })
 
 @app.get("/api/gemini-capabilities", tags=["Video Processing"])
 def get_gemini_capabilities(api_key: str = Depends(validate_api_key)):
@@ -427,6 +605,35 @@ def get_orchestrator_info(api_key: str = Depends(validate_api_key)):
     
     return content_orchestrator.get_orchestrator_info()
 
+@app.get("/api/scheduler-stats", tags=["Video Processing"])
+def get_scheduler_stats(api_key: str = Depends(validate_api_key)):
+    """📊 METRICS: Queue depth, active calls and wait times per priority class for the Gemini key pool."""
+    return GeminiCallScheduler().get_stats()
+
+@app.get("/api/admission-stats", tags=["Health & Status"])
+def get_admission_stats(api_key: str = Depends(validate_api_key)):
+    """🚦 ADMISSION: Limits, queue depth, waits and 429 rejections per expensive endpoint class."""
+    return admission_controller.get_stats()
+
+@app.get("/api/idempotency-stats", tags=["Health & Status"])
+def get_idempotency_stats(api_key: str = Depends(validate_api_key)):
+    """🔁 IDEMPOTENCY: In-flight runs, attached retries, replayed and stored results."""
+    return IdempotencyStore().get_stats()
+
+@app.get("/api/artifact-stats", tags=["Health & Status"])
+def get_artifact_stats(api_key: str = Depends(validate_api_key)):
+    """🗄️ ARTIFACTS: Temp disk usage, quotas and eviction/expiry counters of uploads and extracted audio."""
+    return artifact_store.get_stats()
+
+@app.get("/api/cache-stats", tags=["Health & Status"])
+def get_cache_stats(api_key: str = Depends(validate_api_key)):
+    """📈 CACHES: Hit/miss counters of the user profile, verified token and agent result caches."""
+    return {
+        "user_profiles": db_client.get_cache_stats(),
+        "verified_tokens": get_token_cache_stats(),
+        "agent_results": content_orchestrator.result_cache.get_stats() if content_orchestrator else None
+    }
+
 @app.post("/api/test-single-agent", tags=["Debug"])
 async def test_single_agent(
     agent_name: str = Form(...),
@@ -453,8 +660,7 @@ async def test_single_agent(
             "academicLevel": "College"
         }
         
-        print(f"🧪 Testing single agent: {agent_name}")
-        print(f"📋 Available agents: {list(content_orchestrator.agents.keys())}")
+        log_event("agent_test_started", agent=agent_name, available_agents=list(content_orchestrator.agents.keys()))
         
         # Use the new orchestrator method for consistent execution
         result = await content_orchestrator.run_single_agent(
@@ -472,58 +678,229 @@ async def test_single_agent(
         }
 
 @app.get("/api/view-content/{format_name}", tags=["Video Processing"])
-def view_content_format(format_name: str, api_key: str = Depends(validate_api_key)):
-    """📺 VIEW: Display generated content in readable format for frontend preview."""
-    
-    # This would normally come from a database or cache
-    # For now, return a sample of what each format looks like
-    
-    sample_formats = {
-        "hook_video": {
-            "script": "Ready to unlock the secrets of projectile motion? Whether you're a computer science student or just curious about physics, this topic will change how you see moving objects forever! Today we'll explore how objects fly through the air, from basketball shots to rocket launches, using the same principles that power video game physics engines. Let's dive into the fascinating world of parabolic trajectories and discover the math behind the motion!",
-            "hook_line": "Ready to unlock the secrets of projectile motion?",
-            "estimated_duration": "45 seconds",
-            "visual_suggestions": ["animated projectile paths", "split-screen comparisons"]
-        },
-        "concept_explanation": {
-            "main_explanation": "Projectile motion is like programming a video game character's jump - you have horizontal movement (constant velocity) and vertical movement (affected by gravity). Think of it as two separate functions running simultaneously: one for X-coordinates and one for Y-coordinates.",
-            "key_concepts": [
-                {
-                    "concept": "Horizontal Motion",
-                    "explanation": "Moves at constant velocity, like a car on cruise control",
-                    "analogy": "Like updating x-position in a game loop with constant velocity",
-                    "example": "A ball thrown horizontally maintains its horizontal speed"
-                }
-            ]
-        },
-        # "static_animation": {  # COMMENTED OUT - performance optimization (138s bottleneck)
-        #     "javascript_code": "// Three.js Projectile Motion Animation\nconst scene = new THREE.Scene();\nconst camera = new THREE.PerspectiveCamera(75, window.innerWidth/window.innerHeight, 0.1, 1000);\n\n// Create projectile\nconst geometry = new THREE.SphereGeometry(0.1, 32, 32);\nconst material = new THREE.MeshPhongMaterial({color: 0xff6b6b});\nconst projectile = new THREE.Mesh(geometry, material);\n\n// Animation parameters\nlet t = 0;\nconst v0x = 10; // initial horizontal velocity\nconst v0y = 15; // initial vertical velocity\nconst g = -9.81; // gravity\n\nfunction animate() {\n    t += 0.01;\n    \n    // Update position using kinematic equations\n    projectile.position.x = v0x * t;\n    projectile.position.y = v0y * t + 0.5 * g * t * t;\n    \n    if (projectile.position.y < 0) t = 0; // Reset when hits ground\n    \n    renderer.render(scene, camera);\n    requestAnimationFrame(animate);\n}",
-        #     "description": "Interactive 3D visualization showing parabolic trajectory with real physics"
-        # },
-        "practice_problems": {
-            "questions": [
-                {
-                    "question": "In a video game, a character jumps with initial velocity 20 m/s horizontally and 15 m/s vertically. How far does the character travel horizontally before landing?",
-                    "options": ["30.6 m", "45.2 m", "61.2 m", "52.8 m"],
-                    "correct_answer": "61.2 m",
-                    "explanation": "Use kinematic equations: time of flight = 2*v0y/g, then horizontal distance = v0x * time"
-                }
-            ]
-        }
-    }
-    
-    if format_name not in sample_formats:
+async def view_content_format(
+    format_name: str,
+    lecture_id: str = Query(...),
+    if_none_match: Optional[str] = Header(default=None),
+    user_id: str = Depends(get_current_user_from_token),
+    api_key: str = Depends(validate_api_key)
+):
+    """📺 VIEW: Display a stored learning format of one of the user's lectures for frontend preview."""
+    if format_name not in ContentOrchestrator.FORMAT_MAPPING:
         raise HTTPException(status_code=404, detail=f"Format '{format_name}' not found")
+    await get_owned_lecture(lecture_id, user_id)
     
-    return {
+    # Revalidation is answered from the stored tag without loading the payload
+    stored_etag = await lecture_store.get_format_etag(lecture_id, format_name)
+    if etag_matches(if_none_match, stored_etag):
+        return not_modified_response(stored_etag)
+    
+    entry = await lecture_store.get_format(lecture_id, format_name)
+    if entry is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Format '{format_name}' not generated yet - request /api/lectures/{lecture_id}/formats/{format_name}"
+        )
+    
+    return conditional_response({
+        "lecture_id": lecture_id,
         "format_name": format_name,
-        "content": sample_formats[format_name],
+        "content": entry.get("content"),
         "frontend_usage": {
-            "hook_video": "Display script with video player UI, show visual suggestions as thumbnails",
             "concept_explanation": "Render as expandable cards with analogies highlighted",
-            # "static_animation": "Embed Three.js code in canvas component with play/pause controls",  # COMMENTED OUT - performance optimization
-            "practice_problems": "Interactive quiz component with immediate feedback"
+            "code_equations": "Syntax-highlighted code blocks and rendered equations",
+            "visual_diagrams": "Render chart configs with the charting component",
+            "practice_problems": "Interactive quiz component with immediate feedback",
+            "real_world_applications": "Card list of applications with short case studies",
+            "summary_cards": "Flashcard deck with flip interaction"
         }.get(format_name, "Render as structured content with appropriate UI components")
+    }, if_none_match, etag=payload_etag(entry))
+
+@app.get("/api/lectures", tags=["Video Processing"])
+async def list_user_lectures(
+    limit: int = Query(default=50, ge=1, le=200),
+    user_id: str = Depends(get_current_user_from_token),
+    api_key: str = Depends(validate_api_key)
+):
+    """📚 LECTURES: List the current user's processed lectures, newest first."""
+    lectures = await lecture_store.list_lectures(user_id, limit)
+    return {
+        "lectures": [
+            {
+                "lecture_id": lecture.get("lectureId"),
+                "subject": lecture.get("subject"),
+                "topic": lecture.get("topic"),
+                "generation_mode": lecture.get("generationMode"),
+                "created_at": lecture.get("createdAt"),
+                "updated_at": lecture.get("updatedAt")
+            }
+            for lecture in lectures
+        ],
+        "count": len(lectures)
+    }
+
+@app.get("/api/lectures/changes", tags=["Video Processing"])
+async def get_lecture_changes(
+    since: str = Query(default=""),
+    limit: int = Query(default=200, ge=1, le=500),
+    if_none_match: Optional[str] = Header(default=None),
+    user_id: str = Depends(get_current_user_from_token),
+    api_key: str = Depends(validate_api_key)
+):
+    """
+    🔄 SYNC: Lectures changed since a timestamp, with the ETag of every stored format.
+    
+    Pass the previous response's next_since as ?since= to sync the whole library with
+    one small request; refetch only formats whose ETag differs from the local copy.
+    next_since is an opaque "<changed_at>|<lecture_id>" cursor; a bare timestamp
+    also works and re-sends lectures changed exactly at it.
+    """
+    changed_since, _, after_id = since.partition("|")
+    changes = await lecture_store.list_changes(user_id, changed_since, limit, after_id=after_id)
+    return conditional_response({
+        "since": since,
+        "next_since": f'{changes[-1]["changedAt"]}|{changes[-1]["lectureId"]}' if changes else since,
+        "has_more": len(changes) == limit,
+        "lectures": [
+            {
+                "lecture_id": change["lectureId"],
+                "changed_at": change["changedAt"],
+                "formats": change["formats"]
+            }
+            for change in changes
+        ]
+    }, if_none_match)
+
+@app.get("/api/lectures/{lecture_id}", tags=["Video Processing"])
+async def get_lecture(
+    lecture_id: str,
+    include_analysis: bool = Query(default=False),
+    if_none_match: Optional[str] = Header(default=None),
+    user_id: str = Depends(get_current_user_from_token),
+    api_key: str = Depends(validate_api_key)
+):
+    """📖 LECTURE: Metadata and available formats of one of the user's lectures, without reprocessing."""
+    lecture = await get_owned_lecture(lecture_id, user_id)
+    
+    format_etags = await lecture_store.list_format_etags(lecture_id)
+    response = {
+        "lecture_id": lecture_id,
+        "subject": lecture.get("subject"),
+        "topic": lecture.get("topic"),
+        "generation_mode": lecture.get("generationMode"),
+        "video_info": lecture.get("videoInfo"),
+        "created_at": lecture.get("createdAt"),
+        "updated_at": lecture.get("updatedAt"),
+        "learning_formats": {
+            format_name: {
+                "status": "ready" if format_name in format_etags else "pending",
+                "etag": format_etags.get(format_name),
+                "url": f"/api/lectures/{lecture_id}/formats/{format_name}"
+            }
+            for format_name in ContentOrchestrator.FORMAT_MAPPING
+        }
+    }
+    if include_analysis:
+        response["analysis"] = lecture.get("analysis")
+    return conditional_response(response, if_none_match)
+
+@app.get("/api/lectures/{lecture_id}/formats/{format_name}", tags=["Video Processing"])
+async def get_lecture_format(
+    lecture_id: str,
+    format_name: str,
+    if_none_match: Optional[str] = Header(default=None),
+    user_id: str = Depends(get_current_user_from_token),
+    api_key: str = Depends(validate_api_key)
+):
+    """
+    🪄 LAZY: Get one learning format for one of the user's processed lectures.
+    
+    Formats not generated yet (lazy mode) are produced by their agent on first
+    request and stored, so later requests return immediately. Stored formats carry
+    an ETag; send it back as If-None-Match to get a 304 instead of the payload.
+    """
+    if not format_generator:
+        raise HTTPException(status_code=503, detail="Content orchestrator not available")
+    if format_name not in ContentOrchestrator.FORMAT_MAPPING:
+        raise HTTPException(status_code=404, detail=f"Format '{format_name}' not found")
+    await get_owned_lecture(lecture_id, user_id)
+    
+    stored_etag = await lecture_store.get_format_etag(lecture_id, format_name)
+    if etag_matches(if_none_match, stored_etag):
+        return not_modified_response(stored_etag)
+    
+    entry, generated_now = await format_generator.get_format(lecture_id, format_name)
+    body = {
+        "lecture_id": lecture_id,
+        "format_name": format_name,
+        "generated_on_demand": generated_now,
+        "format": entry
+    }
+    if generated_now:
+        # Fresh generations are not a stored representation yet; the next GET gets the ETag
+        return body
+    return conditional_response(body, if_none_match, etag=payload_etag(entry))
+
+@app.post("/api/lectures/{lecture_id}/repersonalize", tags=["Video Processing"])
+async def repersonalize_lecture(
+    lecture_id: str,
+    user_id: str = Depends(get_current_user_from_token),
+    api_key: str = Depends(validate_api_key)
+):
+    """
+    🔁 RE-PERSONALIZE: Refresh a processed lecture after the user's preferences changed.
+    
+    Reuses the stored transcript, Gemini analysis and work orders, works out which
+    agents depend on the changed preference fields, and regenerates only those
+    formats in one round of agent calls - no re-upload, ffmpeg or audio analysis.
+    """
+    if not format_generator:
+        raise HTTPException(status_code=503, detail="Content orchestrator not available")
+    
+    # Lectures without an owner can't be repersonalized (update_lecture would hand them to the caller)
+    lecture = await get_owned_lecture(lecture_id, user_id)
+    
+    user = await db_client.get_user_by_id(user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    old_context = lecture.get("userContext") or {}
+    new_context = merge_profile_into_context(dict(old_context), user, user_id)
+    new_context["priority"] = "interactive"
+    
+    changed_fields = content_orchestrator.changed_personalization_fields(old_context, new_context)
+    stored_formats = await lecture_store.list_formats(lecture_id)
+    affected_formats = content_orchestrator.formats_affected_by(changed_fields)
+    to_regenerate = [f for f in stored_formats if f in affected_formats]
+    
+    log_event("lecture_repersonalizing", lecture_id=lecture_id, changed=changed_fields, regenerating=to_regenerate)
+    
+    analysis = lecture.get("analysis", {})
+    entries = await asyncio.gather(*[
+        content_orchestrator.generate_format(
+            format_name,
+            analysis.get("work_orders", {}),
+            analysis.get("gemini_analysis", {}),
+            new_context
+        )
+        for format_name in to_regenerate
+    ])
+    
+    regenerated = {}
+    for format_name, entry in zip(to_regenerate, entries):
+        regenerated[format_name] = entry
+        if ContentOrchestrator.is_storable(entry):
+            await lecture_store.save_format(lecture_id, format_name, entry)
+    
+    # Formats not generated yet (lazy mode) pick up the new context on first request
+    await lecture_store.update_lecture(lecture_id, {"userId": user_id, "userContext": new_context})
+    
+    return {
+        "lecture_id": lecture_id,
+        "changed_fields": changed_fields,
+        "regenerated_formats": to_regenerate,
+        "unchanged_formats": [f for f in stored_formats if f not in to_regenerate],
+        "learning_formats": regenerated
     }
 
 # Removed Gemini debug models endpoint
@@ -549,14 +926,12 @@ async def process_video_pipeline(
     if video.size and video.size > 100 * 1024 * 1024:
         raise HTTPException(status_code=400, detail="Video file too large (max 100MB)")
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_video:
-        content = await video.read()
-        temp_video.write(content)
-        temp_video_path = temp_video.name
+    upload = await save_upload(video)
+    audio_id = None
 
     try:
-        extraction = video_processor.extract_audio(temp_video_path, return_info=True)
-        audio_path = extraction["audio_path"] if isinstance(extraction, dict) else extraction
+        extraction = await video_processor.extract_audio_async(upload.path)
+        audio_id = extraction["audio_artifact_id"]
 
         user_context = {
             "major": user_background,
@@ -566,20 +941,26 @@ async def process_video_pipeline(
             "work_orders_mode": work_orders_mode
         }
 
-        analysis = gemini_agent.transcribe_and_analyze(audio_path, user_context)
-        return {
+        with artifact_store.use(audio_id) as audio:
+            analysis = await analyze_audio(audio.path, user_context, "interactive")
+        return timed_json_response({
             "pipeline": "video->audio->gemini",
             "extraction": extraction,
             "analysis": analysis,
-        }
+            "timings": timings_summary(),
+        })
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Pipeline failed: {str(e)}")
     finally:
-        if os.path.exists(temp_video_path):
-            os.unlink(temp_video_path)
+        artifact_store.delete(upload.artifact_id)
+        artifact_store.delete(audio_id)
 
 @app.post("/api/process-video-complete", tags=["Video Processing"])
 async def process_video_complete_pipeline(
+    request: Request,
+    background_tasks: BackgroundTasks,
     video: UploadFile = File(...),
     user_background: Optional[str] = Form(default="general"),
     academic_level: Optional[str] = Form(default="general"),
@@ -587,6 +968,12 @@ async def process_video_complete_pipeline(
     model: Optional[str] = Form(default=None),
     work_orders_mode: Optional[str] = Form(default="guided"),
     auth_token: Optional[str] = Form(default=None),
+    priority: Optional[str] = Form(default="interactive"),
+    generation_mode: Optional[str] = Form(default="eager"),
+    prefetch: bool = Form(default=False),
+    detach: bool = Form(default=False),
+    response_format: Optional[str] = Query(default="v1"),
+    fields: Optional[str] = Query(default=None),
     api_key: str = Depends(validate_api_key)
 ):
     """
@@ -603,6 +990,30 @@ async def process_video_complete_pipeline(
     - User preferences override form parameters for enhanced personalization
     - Includes: major, academicLevel, dyslexiaSupport, languagePreference, learningStyles, age
     - Falls back to form parameters if auth_token is invalid/missing
+    - Without a valid auth_token nothing is stored and lecture_id is null
+    
+    ⚖️ Scheduling:
+    - priority (interactive | background | prewarm) selects the Gemini scheduler class
+    - Agent calls are queued fairly per user ID from the auth_token
+    
+    🪄 Generation mode:
+    - eager (default): run all agents now and return every learning format
+    - lazy: return the analysis and work orders right away; each format is generated on
+      first request via /api/lectures/{lecture_id}/formats/{format_name} (needs auth_token;
+      lectures are only served to their owner)
+    - prefetch (lazy only): generate formats in the background, most used first
+    
+    🔌 Disconnects:
+    - If the client disconnects, ffmpeg is killed, pending agents are cancelled and the
+      Gemini upload is deleted
+    - detach=true keeps the run going to completion (an owned lecture and its formats are stored; with an
+      Idempotency-Key a later retry returns the result)
+    
+    📦 Response format:
+    - ?response_format=v1 (default): original nested response
+    - ?response_format=v2: each agent payload stored once, learning_formats reference it,
+      analysis flattened
+    - ?fields=learning_formats.summary_cards,lecture_id: sparse field selection
     """
     if not gemini_agent or not content_orchestrator:
         missing = []
@@ -619,16 +1030,24 @@ async def process_video_complete_pipeline(
         raise HTTPException(status_code=400, detail="File must be a video")
     if video.size and video.size > 100 * 1024 * 1024:
         raise HTTPException(status_code=400, detail="Video file too large (max 100MB)")
+    if (response_format or "v1").lower() not in RESPONSE_FORMAT_VERSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown response_format '{response_format}'. Available: {list(RESPONSE_FORMAT_VERSIONS)}"
+        )
+    validate_fields(fields, response_format, ContentOrchestrator.FORMAT_MAPPING)
+    if generation_mode == "lazy" and not auth_token:
+        # Stored lectures are only served to their owner
+        raise HTTPException(status_code=400, detail="generation_mode=lazy requires auth_token")
+    if detach:
+        detach_from_client(request)
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_video:
-        content = await video.read()
-        temp_video.write(content)
-        temp_video_path = temp_video.name
+    upload = await save_upload(video)
+    audio_id = None
 
     try:
-        print("🎬 Step 1: Extracting audio from video...")
-        extraction = video_processor.extract_audio(temp_video_path, return_info=True)
-        audio_path = extraction["audio_path"] if isinstance(extraction, dict) else extraction
+        extraction = await video_processor.extract_audio_async(upload.path)
+        audio_id = extraction["audio_artifact_id"]
 
         # Build user context - start with form parameters as defaults
         user_context = {
@@ -636,45 +1055,89 @@ async def process_video_complete_pipeline(
             "academicLevel": academic_level,
             "prefer_fast": mode == "speed",
             "force_model": model,
-            "work_orders_mode": work_orders_mode
+            "work_orders_mode": work_orders_mode,
+            "priority": priority
         }
         
         # If auth_token provided, get user profile and merge preferences
         if auth_token:
             try:
-                print("👤 Getting user profile from auth token...")
-                user_id = get_current_user_id(f"Bearer {auth_token}")
-                if user_id:
-                    user_profile = db_client.get_user_by_id(user_id)
+                claims = get_token_claims(f"Bearer {auth_token}") or {}
+                user_id = claims.get("user_id")
+                if user_id and claims.get("prefs"):
+                    # Preference snapshot in the token: personalize without a profile read
+                    merge_profile_into_context(user_context, {"preferences": claims["prefs"]}, user_id)
+                    log_event("user_context_from_token", user_id=user_id)
+                elif user_id:
+                    user_profile = await db_client.get_user_by_id(user_id)
                     if user_profile and 'preferences' in user_profile:
-                        prefs = user_profile['preferences']
                         # Override defaults with user preferences
-                        user_context.update({
-                            "major": prefs.get('major', user_context["major"]),
-                            "academicLevel": prefs.get('academicLevel', user_context["academicLevel"]),
-                            "dyslexiaSupport": prefs.get('dyslexiaSupport', False),
-                            "languagePreference": prefs.get('languagePreference', 'English'),
-                            "learningStyles": prefs.get('learningStyles', []),
-                            "age": prefs.get('age'),
-                            "userName": user_profile.get('name'),
-                            "userId": user_id
-                        })
-                        print(f"✅ Enhanced context with user preferences for: {user_profile.get('name')}")
+                        merge_profile_into_context(user_context, user_profile, user_id)
+                        log_event("user_context_from_profile", user_id=user_id)
                     else:
-                        print("⚠️ User profile not found or missing preferences")
+                        log_event("user_profile_missing_preferences", "warning", user_id=user_id)
                 else:
-                    print("⚠️ Invalid auth token - user ID not found")
+                    log_event("auth_token_without_user", "warning")
             except Exception as e:
-                print(f"⚠️ Error retrieving user profile: {str(e)} - continuing with form parameters")
+                log_event("user_profile_failed", "warning", error=str(e))
                 # Continue with form parameters if auth fails
 
-        print("🧠 Step 2: Gemini analysis and work order generation...")
-        analysis = gemini_agent.transcribe_and_analyze(audio_path, user_context)
+        if generation_mode == "lazy" and not user_context.get("userId"):
+            # Lazy formats are served from the stored lecture, which needs an owner
+            raise HTTPException(status_code=401, detail="generation_mode=lazy requires a valid auth_token")
+        
+        with artifact_store.use(audio_id) as audio:
+            analysis = await analyze_audio(audio.path, user_context, priority)
         
-        print("🎯 Step 3: Orchestrating 8 specialized content agents...")
         work_orders = analysis.get("work_orders", {})
         gemini_analysis = analysis.get("gemini_analysis", {})
         
+        # Persist the analysis so formats can be (re)generated without reprocessing the video.
+        # Only the owner can read a stored lecture back, so anonymous runs are not stored.
+        lecture_id = None
+        if user_context.get("userId"):
+            lecture = await lecture_store.create_lecture({
+                "userId": user_context["userId"],
+                "generationMode": generation_mode,
+                "videoInfo": extraction.get("video_info") if isinstance(extraction, dict) else None,
+                "userContext": user_context,
+                "analysis": analysis
+            })
+            lecture_id = lecture["lectureId"]
+        
+        if generation_mode == "lazy":
+            format_urls = {
+                format_name: f"/api/lectures/{lecture_id}/formats/{format_name}"
+                for format_name in ContentOrchestrator.FORMAT_MAPPING
+            }
+            if prefetch:
+                background_tasks.add_task(
+                    format_generator.prefetch, lecture_id, ContentOrchestrator.PREFETCH_ORDER
+                )
+            
+            log_event("pipeline_completed", lecture_id=lecture_id, generation_mode="lazy")
+            return render_pipeline_response({
+                "pipeline": "video->audio->gemini->lazy_formats",
+                "lecture_id": lecture_id,
+                "extraction": extraction,
+                "gemini_analysis": analysis,
+                "content_generation": {
+                    "generation_mode": "lazy",
+                    "prefetch_scheduled": bool(prefetch),
+                    "learning_formats": {
+                        format_name: {"status": "pending", "url": url}
+                        for format_name, url in format_urls.items()
+                    }
+                },
+                "processing_summary": {
+                    "total_steps": 2,
+                    "video_processed": True,
+                    "gemini_analysis_complete": True,
+                    "agents_executed": 0,
+                    "learning_formats_generated": 0
+                }
+            }, response_format, fields, ContentOrchestrator.FORMAT_MAPPING)
+        
         # Run the complete orchestration
         orchestration_result = await content_orchestrator.orchestrate_content_generation(
             work_orders=work_orders,
@@ -682,10 +1145,15 @@ async def process_video_complete_pipeline(
             user_context=user_context
         )
         
-        print("🎉 Complete pipeline finished successfully!")
+        for format_name, entry in orchestration_result.get("learning_formats", {}).items():
+            if lecture_id and ContentOrchestrator.is_storable(entry):
+                await lecture_store.save_format(lecture_id, format_name, entry)
         
-        return {
+        log_event("pipeline_completed", lecture_id=lecture_id, generation_mode=generation_mode)
+        
+        return render_pipeline_response({
             "pipeline": "video->audio->gemini->orchestrator->8_agents",
+            "lecture_id": lecture_id,
             "extraction": extraction,
             "gemini_analysis": analysis,
             "content_generation": orchestration_result,
@@ -696,13 +1164,15 @@ async def process_video_complete_pipeline(
                 "agents_executed": orchestration_result.get("orchestration_summary", {}).get("total_agents", 0),
                 "learning_formats_generated": len(orchestration_result.get("learning_formats", {}))
             }
-        }
+        }, response_format, fields, ContentOrchestrator.FORMAT_MAPPING)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Complete pipeline failed: {str(e)}")
     finally:
-        if os.path.exists(temp_video_path):
-            os.unlink(temp_video_path)
+        artifact_store.delete(upload.artifact_id)
+        artifact_store.delete(audio_id)
 
 @app.get("/api/processing-status/{job_id}", tags=["Video Processing"])
 def get_processing_status(job_id: str, api_key: str = Depends(validate_api_key)):
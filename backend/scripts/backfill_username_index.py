@@ -0,0 +1,39 @@
+"""
+One-off backfill of the Firestore usernames index.
+
+Signup and signin resolve usernames through FIRESTORE_USERNAMES_COLLECTION.
+Users created before that index existed have no entry there, so they could
+only be found by the USERNAME_INDEX_LEGACY_FALLBACK collection query. Run this
+once per project to create their entries; afterwards the fallback can stay off.
+
+Usage (from backend/, with GCP_PROJECT_ID and GOOGLE_APPLICATION_CREDENTIALS set):
+    python -m scripts.backfill_username_index [--dry-run] [--page-size 400]
+
+Safe to re-run: existing entries are left alone. A username whose entry points
+at a different user is reported as a conflict and must be resolved by hand.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.firestore_client import FirestoreClient  # noqa: E402
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="report what would be created without writing")
+    # A batch commit holds at most 500 writes
+    parser.add_argument("--page-size", type=int, default=400)
+    args = parser.parse_args()
+
+    stats = asyncio.run(FirestoreClient().backfill_username_index(min(args.page_size, 500), args.dry_run))
+    print(json.dumps(stats, indent=2))
+    sys.exit(1 if stats["conflicts"] else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
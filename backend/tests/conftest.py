@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import uuid
+
+import httpx
+import pytest
+
+
+@pytest.fixture(scope="session")
+def app():
+    """The real app on the stub setup (fake Gemini, SQLite stores) in a private state directory."""
+    state_dir = tempfile.mkdtemp(prefix="studysurf_tests_")
+    os.environ.update({
+        "LOADTEST_STATE_DIR": state_dir,
+        "LOADTEST_ANALYSIS_LATENCY": "0",
+        "LOADTEST_AGENT_LATENCY": "0",
+        "ARTIFACT_DIR": os.path.join(state_dir, "artifacts"),
+        "BCRYPT_ROUNDS": "4",
+        "BCRYPT_POOL_SIZE": "0",
+        "ADMISSION_ENABLED": "false",
+        # Two keys cut the orchestrator's stagger between agent launches to 0.2s
+        "GOOGLE_GEMINI_API_KEY": "test-key",
+        "GOOGLE_GEMINI_API_KEY_2": "test-key-2",
+    })
+    from benchmarks.stub_server import app
+    return app
+
+
+@pytest.fixture
+def http(app):
+    """Factory for in-process HTTP clients of the app; use inside asyncio.run."""
+    return lambda: httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test", timeout=30)
+
+
+SIGNUP = {
+    "name": "Test User", "password": "test-password", "age": 20, "academicLevel": "College",
+    "major": "Physics", "dyslexiaSupport": False, "languagePreference": "English",
+    "learningStyles": [], "metadata": [],
+}
+
+
+@pytest.fixture
+def signup():
+    """Coroutine function creating a user with default preferences; returns the auth response."""
+    async def create(client, username: str) -> dict:
+        response = await client.post("/api/auth/signup", json=dict(SIGNUP, username=f"{username}_{uuid.uuid4().hex[:8]}"))
+        response.raise_for_status()
+        return response.json()
+    return create
+
+
+@pytest.fixture
+def api_headers():
+    return {"X-API-Key": os.getenv("API_KEY", "study_surf_users_secret_key")}
+
+
+@pytest.fixture(scope="session")
+def video_file(tmp_path_factory):
+    """A one-second test-pattern video with a tone (needs ffmpeg on PATH)."""
+    if shutil.which("ffmpeg") is None:
+        pytest.skip("ffmpeg is not installed")
+    from benchmarks.load_test import generate_video
+    return generate_video(str(tmp_path_factory.mktemp("video") / "lecture.mp4"), 0.1, 1)
+
+
+@pytest.fixture
+def upload(video_file):
+    """Multipart files for a video upload, freshly opened per request."""
+    return lambda: {"video": ("lecture.mp4", open(video_file, "rb").read(), "video/mp4")}
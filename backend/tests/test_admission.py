@@ -0,0 +1,106 @@
+import asyncio
+
+import httpx
+import pytest
+
+from utils.admission import AdmissionMiddleware
+
+
+class Endpoint:
+    """ASGI app standing in for an upload endpoint; holds its slot until the gate opens."""
+
+    def __init__(self):
+        self.bodies = []
+        self.gate = None
+
+    async def __call__(self, scope, receive, send):
+        message = await receive()
+        self.bodies.append(message.get("body", b""))
+        await self.gate.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+@pytest.fixture
+def endpoint(monkeypatch):
+    endpoint = Endpoint()
+    middleware = AdmissionMiddleware(endpoint)
+    controller = middleware.controller
+    # The controller is the app's singleton; everything set here is restored afterwards
+    monkeypatch.setattr(controller, "enabled", True)
+    monkeypatch.setattr(controller, "max_wait", 5.0)
+    monkeypatch.setattr(controller, "_classes", controller._classes)
+    controller.configure({"media": (1, 1)})
+    endpoint.controller = controller
+    endpoint.client = lambda: httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=middleware), base_url="http://test", timeout=10
+    )
+    return endpoint
+
+
+def _post(client, body: bytes):
+    return client.post("/api/extract-audio", content=body)
+
+
+async def _queued(controller, count: int) -> None:
+    while len(controller._classes["media"].waiters) < count:
+        await asyncio.sleep(0.01)
+
+
+def test_full_queue_is_rejected_before_the_body_is_read(endpoint):
+    endpoint.controller._classes["media"].service_times.append(4.0)
+
+    async def scenario():
+        endpoint.gate = asyncio.Event()
+        async with endpoint.client() as client:
+            running = asyncio.create_task(_post(client, b"first"))
+            while not endpoint.bodies:
+                await asyncio.sleep(0.01)
+            queued = asyncio.create_task(_post(client, b"second"))
+            await _queued(endpoint.controller, 1)
+            rejected = await _post(client, b"third")
+            endpoint.gate.set()
+            return await running, await queued, rejected
+
+    running, queued, rejected = asyncio.run(scenario())
+
+    assert running.status_code == queued.status_code == 200
+    assert rejected.status_code == 429
+    # Median service time 4s, one waiter ahead, one slot: 4 * 2 / 1
+    assert rejected.headers["retry-after"] == "8"
+    assert rejected.json()["reason"] == "queue full"
+    assert endpoint.bodies == [b"first", b"second"]
+
+
+def test_request_waiting_too_long_is_rejected(endpoint):
+    endpoint.controller.max_wait = 0.1
+
+    async def scenario():
+        endpoint.gate = asyncio.Event()
+        async with endpoint.client() as client:
+            running = asyncio.create_task(_post(client, b"first"))
+            while not endpoint.bodies:
+                await asyncio.sleep(0.01)
+            timed_out = await _post(client, b"second")
+            endpoint.gate.set()
+            return await running, timed_out
+
+    running, timed_out = asyncio.run(scenario())
+
+    assert running.status_code == 200
+    assert timed_out.status_code == 429
+    assert timed_out.json()["reason"] == "wait timeout"
+    assert int(timed_out.headers["retry-after"]) >= 1
+    stats = endpoint.controller.get_stats()["classes"]["media"]
+    assert (stats["active"], stats["queue_depth"], stats["rejected_wait_timeout"]) == (0, 0, 1)
+
+
+def test_unclassified_endpoints_are_not_limited(endpoint):
+    async def scenario():
+        endpoint.gate = asyncio.Event()
+        endpoint.gate.set()
+        async with endpoint.client() as client:
+            return await asyncio.gather(*(client.post("/api/auth/signin", content=b"x") for _ in range(5)))
+
+    assert all(response.status_code == 200 for response in asyncio.run(scenario()))
+    assert endpoint.controller.get_stats()["classes"]["media"]["admitted_total"] == 0
@@ -0,0 +1,105 @@
+import os
+import time
+import types
+
+import pytest
+from fastapi import HTTPException
+
+from utils import artifact_store
+from utils.artifact_store import PARTIAL_MAX_AGE_SECONDS, ArtifactStore
+
+KB = 1024
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [time.time()]
+    monkeypatch.setattr(artifact_store, "time", types.SimpleNamespace(time=lambda: now[0], monotonic=time.monotonic))
+    return now
+
+
+@pytest.fixture
+def store(tmp_path, clock):
+    store = ArtifactStore()
+    # The store is the app's singleton; put its configuration back afterwards
+    saved = dict(vars(store))
+    store.configure(directory=str(tmp_path / "artifacts"), quota_mb=1, ttl_seconds=60, sweep_interval=3600)
+    store._last_sweep = time.monotonic()
+    yield store
+    vars(store).clear()
+    vars(store).update(saved)
+
+
+def _write(store, size: int, ttl_seconds=None):
+    artifact = store.create(".wav", expected_bytes=size, ttl_seconds=ttl_seconds)
+    with open(artifact.path, "wb") as f:
+        f.write(b"\0" * size)
+    return store.commit(artifact)
+
+
+def _age(artifact, seconds: float) -> None:
+    past = time.time() - seconds
+    os.utime(artifact.path, (past, past))
+
+
+def test_quota_evicts_least_recently_used_idle_artifact(store):
+    older = _write(store, 400 * KB)
+    newer = _write(store, 400 * KB)
+    _age(older, 200)
+    _age(newer, 100)
+    # Reading refreshes the LRU clock, so `newer` becomes the oldest
+    assert store.get(older.artifact_id) is not None
+
+    third = _write(store, 400 * KB)
+
+    assert store.get(newer.artifact_id) is None
+    assert store.get(older.artifact_id) is not None
+    assert store.get(third.artifact_id) is not None
+    assert store.get_stats()["evicted_total"] == 1
+
+
+def test_pinned_artifacts_are_not_evicted(store):
+    pinned = _write(store, 600 * KB)
+
+    with store.use(pinned.artifact_id):
+        with pytest.raises(HTTPException) as error:
+            store.create(".mp4", expected_bytes=600 * KB)
+
+    assert error.value.status_code == 503
+    assert error.value.headers["Retry-After"] == "5"
+    assert store.get(pinned.artifact_id) is not None
+    assert store.get_stats()["rejected_total"] == 1
+
+
+def test_expired_artifacts_are_not_served(store, clock):
+    artifact = _write(store, KB, ttl_seconds=10)
+    assert store.get(artifact.artifact_id) is not None
+
+    clock[0] += 11
+
+    assert store.get(artifact.artifact_id) is None
+    assert not os.path.exists(artifact.path)
+    with pytest.raises(HTTPException) as error:
+        with store.use(artifact.artifact_id):
+            pass
+    assert error.value.status_code == 404
+
+
+def test_sweep_removes_expired_and_abandoned_files(store, clock):
+    expired = _write(store, KB, ttl_seconds=10)
+    pinned = _write(store, KB, ttl_seconds=10)
+    fresh = _write(store, KB, ttl_seconds=3600)
+    abandoned = store.create(".wav", expected_bytes=KB)
+    # As if its writer died: no longer pending in this process and old
+    store._pending.pop(abandoned.artifact_id)
+    _age(abandoned, PARTIAL_MAX_AGE_SECONDS + 1)
+
+    with store.use(pinned.artifact_id):
+        clock[0] += 11
+        result = store.sweep()
+
+    assert result == {"expired": 1, "partials_reclaimed": 1}
+    assert not os.path.exists(expired.path)
+    assert not os.path.exists(abandoned.path)
+    assert os.path.exists(pinned.path)
+    assert os.path.exists(fresh.path)
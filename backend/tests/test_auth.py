@@ -0,0 +1,90 @@
+import asyncio
+import time
+import types
+
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+
+from utils import ttl_cache
+from utils.auth import JWT_ALGORITHM, JWT_SECRET_KEY, AuthManager, get_token_cache_stats
+from utils.password_pool import hash_cost
+
+
+def test_signin_rehashes_passwords_made_with_another_cost(app, http, signup):
+    import main
+
+    async def scenario():
+        async with http() as client:
+            user = (await signup(client, "rehash"))["user"]
+            stored = await main.db_client.get_user_by_id(user["id"])
+            assert hash_cost(stored["passwordHash"]) == 4
+
+            main.password_pool.configure(pool_size=0, rounds=5)
+            try:
+                response = await client.post("/api/auth/signin", json={
+                    "username": user["username"], "password": "test-password"
+                })
+                assert response.status_code == 200
+                # The rehash runs as a background task after the response
+                rehashed = await main.db_client.get_user_by_id(user["id"])
+                assert hash_cost(rehashed["passwordHash"]) == 5
+
+                again = await client.post("/api/auth/signin", json={
+                    "username": user["username"], "password": "test-password"
+                })
+                assert again.status_code == 200
+            finally:
+                main.password_pool.configure(pool_size=0, rounds=4)
+
+    asyncio.run(scenario())
+
+
+def test_wrong_password_is_rejected_without_rehash(app, http, signup):
+    import main
+
+    async def scenario():
+        async with http() as client:
+            user = (await signup(client, "wrongpw"))["user"]
+            main.password_pool.configure(pool_size=0, rounds=5)
+            try:
+                response = await client.post("/api/auth/signin", json={
+                    "username": user["username"], "password": "not-the-password"
+                })
+                assert response.status_code == 401
+                stored = await main.db_client.get_user_by_id(user["id"])
+                assert hash_cost(stored["passwordHash"]) == 4
+            finally:
+                main.password_pool.configure(pool_size=0, rounds=4)
+
+    asyncio.run(scenario())
+
+
+def test_verified_tokens_are_cached_until_their_exp(monkeypatch):
+    now = [time.time()]
+    monkeypatch.setattr(ttl_cache, "time", types.SimpleNamespace(time=lambda: now[0]))
+    exp = int(now[0]) + 60
+    token = jwt.encode({"user_id": "u1", "exp": exp}, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
+
+    claims = AuthManager.verify_token(token)
+    claims["user_id"] = "mutated by caller"
+    before = get_token_cache_stats()
+
+    now[0] = exp - 1
+    assert AuthManager.verify_token(token)["user_id"] == "u1"
+    assert get_token_cache_stats()["hits"] == before["hits"] + 1
+
+    now[0] = exp
+    AuthManager.verify_token(token)
+    assert get_token_cache_stats()["misses"] == before["misses"] + 1
+
+
+def test_invalid_tokens_are_rejected_and_not_cached():
+    token = jwt.encode({"user_id": "u1", "exp": int(time.time()) + 60}, "another-secret", algorithm=JWT_ALGORITHM)
+    size = get_token_cache_stats()["size"]
+
+    with pytest.raises(HTTPException) as error:
+        AuthManager.verify_token(token)
+
+    assert error.value.status_code == 401
+    assert get_token_cache_stats()["size"] == size
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from utils.chart_data import (
+    MAX_SAMPLES, MIN_SAMPLES, ChartExpressionError, compile_expression, parse_expression, sample_function
+)
+
+
+@pytest.mark.parametrize("expression", [
+    "y = a * x^2 + b",
+    "sin(2*pi*x) + exp(-x) * sqrt(abs(x))",
+    "-x // 2 % 3",
+    "log10(x + 1) - ln(e)",
+])
+def test_whitelisted_expressions_parse(expression):
+    parse_expression(expression, ["x", "a", "b"])
+
+
+@pytest.mark.parametrize("expression", [
+    "__import__('os').system('true')",
+    "x.__class__",
+    "open('secrets')",
+    "[x for x in range(3)]",
+    "lambda: 1",
+    "x if x else 1",
+    "sin(x=1)",
+    "'text'",
+    "True + x",
+    "x < 1",
+    "unknown_name * x",
+    "(",
+])
+def test_unsafe_or_invalid_expressions_are_rejected(expression):
+    with pytest.raises(ChartExpressionError):
+        parse_expression(expression, ["x"])
+
+
+def test_literal_powers_fail_fast_instead_of_building_huge_integers():
+    f = compile_expression("10 ** 10 ** 10 + x")
+    with pytest.raises(ChartExpressionError, match="could not be evaluated"):
+        f(np.array([1.0]))
+
+
+def test_smooth_functions_use_few_samples():
+    points = sample_function("x^2", (0, 10))
+    assert len(points) == MIN_SAMPLES
+    assert points[-1] == {"x": 10.0, "y": 100.0}
+
+
+def test_oscillating_functions_are_sampled_densely_enough():
+    points = sample_function("sin(50*x)", (0, 1))
+    xs = np.array([p["x"] for p in points])
+    ys = np.array([p["y"] for p in points])
+    dense_x = np.linspace(0, 1, 10001)
+    assert np.max(np.abs(np.interp(dense_x, xs, ys) - np.sin(50 * dense_x))) < 0.05
+
+
+def test_functions_too_fast_for_max_samples_are_rejected():
+    # At MIN_SAMPLES every point lands on a zero crossing and the curve aliases
+    with pytest.raises(ChartExpressionError, match="oscillates too fast"):
+        sample_function("sin(50*x)", (0, 10))
+
+
+def test_singularities_are_dropped_not_rejected():
+    points = sample_function("1/x", (-5, 5))
+    assert 0 < len(points) <= MAX_SAMPLES
+    assert all(np.isfinite(p["y"]) for p in points)
+
+
+def test_invalid_domains_are_rejected():
+    with pytest.raises(ChartExpressionError):
+        sample_function("x", (1, 1))
+    with pytest.raises(ChartExpressionError):
+        sample_function("x", (0, float("inf")))
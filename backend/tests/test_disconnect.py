@@ -0,0 +1,94 @@
+import asyncio
+import time
+
+from utils.disconnect import ClientDisconnected, DisconnectCancellationMiddleware, raise_if_cancelled
+
+SCOPE = {"type": "http", "method": "POST", "path": "/api/extract-audio"}
+
+
+class Client:
+    """ASGI receive side: sends the body, then disconnects when told to."""
+
+    def __init__(self):
+        self.gone = asyncio.Event()
+        self.sent_body = False
+
+    async def receive(self):
+        if not self.sent_body:
+            self.sent_body = True
+            return {"type": "http.request", "body": b"video", "more_body": False}
+        await self.gone.wait()
+        return {"type": "http.disconnect"}
+
+
+class Handler:
+    """Reads the body, then works on a worker thread that checks for cancellation."""
+
+    def __init__(self, state=None):
+        self.state = state or {}
+        self.started = asyncio.Event()
+        self.outcome = None
+
+    def _work(self):
+        for _ in range(50):
+            raise_if_cancelled()
+            time.sleep(0.01)
+        return "finished"
+
+    async def __call__(self, scope, receive, send):
+        scope.setdefault("state", {}).update(self.state)
+        await receive()
+        self.started.set()
+        try:
+            self.outcome = await asyncio.to_thread(self._work)
+        except asyncio.CancelledError:
+            self.outcome = "cancelled"
+            raise
+
+
+async def _disconnect_during(handler):
+    client = Client()
+    middleware = DisconnectCancellationMiddleware(handler)
+    request = asyncio.create_task(middleware(dict(SCOPE), client.receive, None))
+    await handler.started.wait()
+    client.gone.set()
+    await request
+    return handler.outcome
+
+
+def test_disconnect_cancels_handler_and_worker_thread():
+    checkpoints = []
+
+    class Recording(Handler):
+        def _work(self):
+            try:
+                return super()._work()
+            except ClientDisconnected:
+                checkpoints.append("raised")
+                raise
+
+    handler = Recording()
+
+    async def scenario():
+        outcome = await _disconnect_during(handler)
+        # The worker thread notices at its next checkpoint
+        for _ in range(100):
+            if checkpoints:
+                break
+            await asyncio.sleep(0.01)
+        return outcome
+
+    assert asyncio.run(scenario()) == "cancelled"
+    assert checkpoints == ["raised"]
+
+
+def test_detached_requests_keep_running():
+    handler = Handler(state={"detached": True})
+
+    assert asyncio.run(_disconnect_during(handler)) == "finished"
+
+
+def test_requests_with_attached_retries_keep_running():
+    handler = Handler(state={"idempotency_waiters": lambda: 1})
+
+    assert asyncio.run(_disconnect_during(handler)) == "finished"
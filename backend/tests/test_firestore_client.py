@@ -0,0 +1,123 @@
+import asyncio
+import types
+
+from google.api_core.exceptions import FailedPrecondition, NotFound
+
+from utils import ttl_cache
+from utils.firestore_client import FirestoreClient
+from utils.user_store import merge_update
+
+
+class FakeDocument:
+    def __init__(self, db, doc_id):
+        self.db = db
+        self.id = doc_id
+
+    async def get(self):
+        self.db.rpcs.append("get")
+        doc = self.db.docs.get(self.id)
+        return types.SimpleNamespace(
+            exists=doc is not None, to_dict=lambda: dict(doc), update_time=self.db.update_times.get(self.id)
+        )
+
+    async def update(self, data, option=None):
+        self.db.rpcs.append("update")
+        if self.id not in self.db.docs:
+            raise NotFound("no document")
+        if option is not None and option != self.db.update_times[self.id]:
+            raise FailedPrecondition("stale update_time")
+        self.db.write(self.id, merge_update(self.db.docs[self.id], data))
+        return types.SimpleNamespace(update_time=self.db.update_times[self.id])
+
+
+class FakeFirestore:
+    """The slice of firestore.AsyncClient the profile cache uses; update_time is a write counter."""
+
+    def __init__(self):
+        self.docs = {}
+        self.update_times = {}
+        self.rpcs = []
+
+    def write(self, doc_id, doc):
+        self.docs[doc_id] = doc
+        self.update_times[doc_id] = self.update_times.get(doc_id, 0) + 1
+
+    def collection(self, name):
+        return types.SimpleNamespace(document=lambda doc_id: FakeDocument(self, doc_id))
+
+    def write_option(self, last_update_time):
+        return last_update_time
+
+
+def _client(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ttl_cache, "time", types.SimpleNamespace(time=lambda: now[0]))
+    client = FirestoreClient()
+    client._db = FakeFirestore()
+    client._db.write("u1", {"userId": "u1", "name": "Ada", "preferences": {"major": "Physics"}})
+    return client, now
+
+
+def test_profiles_are_served_from_cache_until_ttl(monkeypatch):
+    client, now = _client(monkeypatch)
+
+    async def scenario():
+        first = await client.get_user_by_id("u1")
+        first["preferences"]["major"] = "mutated by caller"
+        cached = await client.get_user_by_id("u1")
+        rpcs_while_fresh = list(client._db.rpcs)
+        now[0] += client.user_cache.ttl + 1
+        await client.get_user_by_id("u1")
+        return cached, rpcs_while_fresh
+
+    cached, rpcs_while_fresh = asyncio.run(scenario())
+
+    assert cached["preferences"]["major"] == "Physics"
+    assert rpcs_while_fresh == ["get"]
+    assert client._db.rpcs == ["get", "get"]
+
+
+def test_cached_update_is_one_guarded_write(monkeypatch):
+    client, _ = _client(monkeypatch)
+
+    async def scenario():
+        await client.get_user_by_id("u1")
+        client._db.rpcs.clear()
+        updated = await client.update_user_preferences("u1", {"major": "Biology"})
+        return updated, await client.get_user_by_id("u1")
+
+    updated, reread = asyncio.run(scenario())
+
+    assert client._db.rpcs == ["update"]
+    assert updated["preferences"]["major"] == reread["preferences"]["major"] == "Biology"
+
+
+def test_write_elsewhere_invalidates_cached_profile(monkeypatch):
+    client, _ = _client(monkeypatch)
+
+    async def scenario():
+        await client.get_user_by_id("u1")
+        # Another instance renames the user; our cached update_time is now stale
+        client._db.write("u1", dict(client._db.docs["u1"], name="Grace"))
+        client._db.rpcs.clear()
+        return await client.update_user_preferences("u1", {"major": "Biology"})
+
+    updated = asyncio.run(scenario())
+
+    assert client._db.rpcs == ["update", "update", "get"]
+    assert updated["name"] == "Grace"
+    assert updated["preferences"]["major"] == "Biology"
+
+
+def test_password_change_drops_cached_profile(monkeypatch):
+    client, _ = _client(monkeypatch)
+
+    async def scenario():
+        await client.get_user_by_id("u1")
+        await client.update_password_hash("u1", "new-hash")
+        return await client.get_user_by_id("u1")
+
+    reread = asyncio.run(scenario())
+
+    assert reread["passwordHash"] == "new-hash"
+    assert client._db.rpcs == ["get", "update", "get"]
@@ -0,0 +1,151 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from utils.idempotency import IdempotencyMiddleware
+
+
+class Endpoint:
+    """ASGI app standing in for an upload endpoint: reads the body, answers with the next queued status."""
+
+    def __init__(self):
+        self.bodies = []
+        self.statuses = []
+        self.gate = None
+
+    async def __call__(self, scope, receive, send):
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body", False):
+                break
+        self.bodies.append(body)
+        run = len(self.bodies)
+        if self.gate is not None:
+            await self.gate.wait()
+        status = self.statuses.pop(0) if self.statuses else 200
+        payload = json.dumps({"run": run}).encode("utf-8")
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": payload})
+
+
+@pytest.fixture
+def endpoint(tmp_path):
+    endpoint = Endpoint()
+    middleware = IdempotencyMiddleware(endpoint)
+    middleware.store.configure(path=str(tmp_path / "idempotency.db"))
+    endpoint.store = middleware.store
+    endpoint.client = lambda: httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=middleware), base_url="http://test", timeout=10
+    )
+    return endpoint
+
+
+def _post(client, body: bytes, key: str = "upload-1"):
+    return client.post("/api/extract-audio", content=body,
+                       headers={"X-API-Key": "test-key", "Idempotency-Key": key})
+
+
+async def _attached(store, count: int = 1) -> None:
+    while store.get_stats()["attached_waiters"] < count:
+        await asyncio.sleep(0.01)
+
+
+def test_retry_after_completion_replays_stored_response(endpoint):
+    async def scenario():
+        async with endpoint.client() as client:
+            first = await _post(client, b"video-bytes")
+            retry = await _post(client, b"video-bytes")
+            return first, retry
+
+    first, retry = asyncio.run(scenario())
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert len(endpoint.bodies) == 1
+
+
+def test_reused_key_with_different_body_of_same_size_is_rejected(endpoint):
+    async def scenario():
+        async with endpoint.client() as client:
+            await _post(client, b"video-AAAA")
+            return await _post(client, b"video-BBBB")
+
+    assert asyncio.run(scenario()).status_code == 422
+    assert endpoint.bodies == [b"video-AAAA"]
+
+
+def test_retry_attached_to_running_request_gets_its_response(endpoint):
+    async def scenario():
+        endpoint.gate = asyncio.Event()
+        async with endpoint.client() as client:
+            first = asyncio.create_task(_post(client, b"video-bytes"))
+            retry = asyncio.create_task(_post(client, b"video-bytes"))
+            await _attached(endpoint.store)
+            endpoint.gate.set()
+            return await first, await retry
+
+    first, retry = asyncio.run(scenario())
+
+    assert retry.json() == first.json() == {"run": 1}
+    assert retry.headers["idempotent-replayed"] == "true"
+
+
+def test_running_request_rejects_retry_with_different_body(endpoint):
+    async def scenario():
+        endpoint.gate = asyncio.Event()
+        async with endpoint.client() as client:
+            first = asyncio.create_task(_post(client, b"video-AAAA"))
+            while not endpoint.bodies:
+                await asyncio.sleep(0.01)
+            retry = await _post(client, b"video-BBBB")
+            endpoint.gate.set()
+            return await first, retry
+
+    first, retry = asyncio.run(scenario())
+
+    assert first.status_code == 200
+    assert retry.status_code == 422
+
+
+def test_server_error_releases_key(endpoint):
+    endpoint.statuses = [503]
+
+    async def scenario():
+        async with endpoint.client() as client:
+            failed = await _post(client, b"video-bytes")
+            retry = await _post(client, b"video-bytes")
+            return failed, retry
+
+    failed, retry = asyncio.run(scenario())
+
+    assert failed.status_code == 503
+    assert retry.status_code == 200
+    assert "idempotent-replayed" not in retry.headers
+    assert endpoint.bodies == [b"video-bytes", b"video-bytes"]
+
+
+def test_retry_attached_to_failing_request_runs_again(endpoint):
+    endpoint.statuses = [500]
+
+    async def scenario():
+        endpoint.gate = asyncio.Event()
+        async with endpoint.client() as client:
+            first = asyncio.create_task(_post(client, b"video-bytes"))
+            retry = asyncio.create_task(_post(client, b"video-bytes"))
+            await _attached(endpoint.store)
+            endpoint.gate.set()
+            return await first, await retry
+
+    first, retry = asyncio.run(scenario())
+
+    assert first.status_code == 500
+    assert retry.status_code == 200
+    assert retry.json() == {"run": 2}
+    # The retry's body was read ahead for the comparison and replayed to its own run
+    assert endpoint.bodies == [b"video-bytes", b"video-bytes"]
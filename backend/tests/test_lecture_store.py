@@ -0,0 +1,36 @@
+import asyncio
+import sqlite3
+
+from utils.lecture_store import LocalLectureStore
+
+
+def _page_all(store, user_id, limit):
+    since, after_id, seen = "", "", []
+    while True:
+        page = asyncio.run(store.list_changes(user_id, since, limit, after_id=after_id))
+        seen.extend(change["lectureId"] for change in page)
+        if len(page) < limit:
+            return seen
+        since, after_id = page[-1]["changedAt"], page[-1]["lectureId"]
+
+
+def test_changes_feed_pages_through_equal_timestamps(tmp_path):
+    store = LocalLectureStore(str(tmp_path / "lectures.db"))
+    ids = [asyncio.run(store.create_lecture({"userId": "u1"}))["lectureId"] for _ in range(5)]
+    store._execute("UPDATE lectures SET changed_at = '2026-01-01T00:00:00'")
+
+    assert sorted(_page_all(store, "u1", 2)) == sorted(ids)
+
+
+def test_legacy_rows_are_backfilled_into_the_feed(tmp_path):
+    path = str(tmp_path / "lectures.db")
+    store = LocalLectureStore(path)
+    lecture = asyncio.run(store.create_lecture({"userId": "u1"}))
+    store._execute("UPDATE lectures SET changed_at = NULL")
+    store._conn.close()
+
+    reopened = LocalLectureStore(path)
+    changes = asyncio.run(reopened.list_changes("u1", ""))
+    assert [change["lectureId"] for change in changes] == [lecture["lectureId"]]
+    assert changes[0]["changedAt"] == lecture["updatedAt"]
+    assert sqlite3.connect(path).execute("SELECT COUNT(*) FROM lectures WHERE changed_at IS NULL").fetchone() == (0,)
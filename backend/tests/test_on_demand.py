@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from agents.on_demand import OnDemandFormatGenerator
+from utils.lecture_store import LocalLectureStore
+
+
+class FakeOrchestrator:
+    """Counts generate_format calls; each waits for the gate so requests can pile up."""
+
+    def __init__(self, storable: bool = True):
+        self.calls = []
+        self.gate = None
+        self.storable = storable
+
+    async def generate_format(self, format_name, work_orders, analysis, user_context):
+        self.calls.append((format_name, user_context["priority"]))
+        await self.gate.wait()
+        return {"format": format_name, "content": f"generated #{len(self.calls)}"}
+
+    def is_storable(self, entry):
+        return self.storable
+
+
+def _generator(tmp_path, storable: bool = True):
+    store = LocalLectureStore(str(tmp_path / "lectures.db"))
+    lecture = asyncio.run(store.create_lecture({"userId": "u1", "analysis": {"work_orders": {}}}))
+    return OnDemandFormatGenerator(FakeOrchestrator(storable), store), lecture["lectureId"]
+
+
+def test_concurrent_requests_share_one_generation(tmp_path):
+    generator, lecture_id = _generator(tmp_path)
+
+    async def scenario():
+        generator.orchestrator.gate = asyncio.Event()
+        requests = [asyncio.create_task(generator.get_format(lecture_id, "summary_cards")) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        generator.orchestrator.gate.set()
+        results = await asyncio.gather(*requests)
+        later = await generator.get_format(lecture_id, "summary_cards")
+        return results, later
+
+    results, later = asyncio.run(scenario())
+
+    assert len(generator.orchestrator.calls) == 1
+    assert all(result == (results[0][0], True) for result in results)
+    assert later == (results[0][0], False)
+
+
+def test_cancelled_request_does_not_cancel_shared_generation(tmp_path):
+    generator, lecture_id = _generator(tmp_path)
+
+    async def scenario():
+        generator.orchestrator.gate = asyncio.Event()
+        leaving = asyncio.create_task(generator.get_format(lecture_id, "summary_cards"))
+        staying = asyncio.create_task(generator.get_format(lecture_id, "summary_cards"))
+        await asyncio.sleep(0.05)
+        leaving.cancel()
+        generator.orchestrator.gate.set()
+        return await staying
+
+    entry, generated_now = asyncio.run(scenario())
+
+    assert generated_now and entry["content"] == "generated #1"
+    assert len(generator.orchestrator.calls) == 1
+
+
+def test_unstorable_result_is_generated_again(tmp_path):
+    generator, lecture_id = _generator(tmp_path, storable=False)
+
+    async def scenario():
+        generator.orchestrator.gate = asyncio.Event()
+        generator.orchestrator.gate.set()
+        await generator.get_format(lecture_id, "summary_cards")
+        return await generator.get_format(lecture_id, "summary_cards", priority="background")
+
+    entry, generated_now = asyncio.run(scenario())
+
+    assert generated_now
+    assert generator.orchestrator.calls == [("summary_cards", "interactive"), ("summary_cards", "background")]
+
+
+def test_missing_lecture_is_not_found(tmp_path):
+    generator, _ = _generator(tmp_path)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(generator.get_format("missing", "summary_cards"))
+
+    assert error.value.status_code == 404
+    assert generator.orchestrator.calls == []
@@ -0,0 +1,51 @@
+import google.genai as genai
+
+from benchmarks import fake_genai
+from benchmarks.fake_genai import FakeGenaiConfig, LatencyModel
+
+
+CONTEXT = {
+    "major": "Physics", "academicLevel": "College", "languagePreference": "English",
+    "learningStyles": ["visual"], "dyslexiaSupport": False, "age": 20,
+}
+
+
+def _orchestrator(monkeypatch, tmp_path):
+    monkeypatch.setenv("GOOGLE_GEMINI_API_KEY", "test-key")
+    monkeypatch.setenv("AGENT_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(genai, "Client", genai.Client)
+    fake_genai.install(FakeGenaiConfig(
+        analysis_latency=LatencyModel(0), agent_latency=LatencyModel(0), upload_latency=LatencyModel(0), seed=1
+    ))
+    from agents.orchestrator import ContentOrchestrator
+    return ContentOrchestrator()
+
+
+def test_personalization_fields_are_what_the_agents_read(monkeypatch, tmp_path):
+    orchestrator = _orchestrator(monkeypatch, tmp_path)
+    read = set().union(*(agent.context_fields for agent in orchestrator.agents.values()))
+    assert set(orchestrator.personalization_fields) == read
+
+
+def test_unread_field_changes_regenerate_nothing(monkeypatch, tmp_path):
+    orchestrator = _orchestrator(monkeypatch, tmp_path)
+    new_context = dict(CONTEXT, learningStyles=["auditory"], dyslexiaSupport=True, age=35)
+
+    changed = orchestrator.changed_personalization_fields(CONTEXT, new_context)
+
+    assert changed == []
+    assert orchestrator.formats_affected_by(changed) == []
+
+
+def test_major_change_regenerates_formats_whose_agent_reads_it(monkeypatch, tmp_path):
+    orchestrator = _orchestrator(monkeypatch, tmp_path)
+    monkeypatch.setattr(orchestrator.agents["summary"], "context_fields", ("languagePreference",))
+
+    changed = orchestrator.changed_personalization_fields(CONTEXT, dict(CONTEXT, major="History"))
+
+    assert changed == ["major"]
+    affected = orchestrator.formats_affected_by(changed)
+    assert "summary_cards" not in affected
+    assert sorted(affected) == sorted(
+        name for name, agent in orchestrator.FORMAT_MAPPING.items() if agent != "summary"
+    )
@@ -0,0 +1,78 @@
+import asyncio
+
+
+def test_anonymous_runs_are_not_stored(app, http, upload, api_headers):
+    import main
+
+    async def scenario():
+        async with http() as client:
+            response = await client.post("/api/process-video-complete", headers=api_headers, files=upload())
+            assert response.status_code == 200
+            assert response.json()["lecture_id"] is None
+            assert await main.lecture_store.list_lectures(None) == []
+
+    asyncio.run(scenario())
+
+
+def test_owned_runs_are_stored_for_their_owner(app, http, upload, signup, api_headers):
+    async def scenario():
+        async with http() as client:
+            token = (await signup(client, "pipeline"))["access_token"]
+            response = await client.post(
+                "/api/process-video-complete", headers=api_headers, files=upload(), data={"auth_token": token}
+            )
+            lecture_id = response.json()["lecture_id"]
+            assert lecture_id
+
+            owner = dict(api_headers, Authorization=f"Bearer {token}")
+            assert (await client.get(f"/api/lectures/{lecture_id}", headers=owner)).status_code == 200
+            other = (await signup(client, "other"))["access_token"]
+            stranger = dict(api_headers, Authorization=f"Bearer {other}")
+            assert (await client.get(f"/api/lectures/{lecture_id}", headers=stranger)).status_code == 404
+
+    asyncio.run(scenario())
+
+
+def test_lazy_runs_need_a_valid_token(app, http, upload, api_headers):
+    async def scenario():
+        async with http() as client:
+            missing = await client.post(
+                "/api/process-video-complete", headers=api_headers, files=upload(), data={"generation_mode": "lazy"}
+            )
+            assert missing.status_code == 400
+            invalid = await client.post(
+                "/api/process-video-complete", headers=api_headers, files=upload(),
+                data={"generation_mode": "lazy", "auth_token": "not-a-token"}
+            )
+            assert invalid.status_code == 401
+
+    asyncio.run(scenario())
+
+
+def test_batch_transcription_reports_failed_items_alongside_results(app, http, api_headers):
+    import main
+
+    def audio_artifact():
+        artifact = main.artifact_store.create(".wav", expected_bytes=64)
+        with open(artifact.path, "wb") as f:
+            f.write(b"\0" * 64)
+        return main.artifact_store.commit(artifact).artifact_id
+
+    async def scenario():
+        good = [audio_artifact(), audio_artifact()]
+        missing = "0" * 32
+        async with http() as client:
+            response = await client.post("/api/gemini-transcribe", headers=api_headers, data={
+                "audio_artifact_ids": [good[0], missing, good[1], good[0]]
+            })
+        assert response.status_code == 200
+        body = response.json()
+        assert [item["audio_artifact_id"] for item in body["results"]] == [good[0], missing, good[1]]
+        assert [item["status"] for item in body["results"]] == ["success", "error", "success"]
+        assert body["results"][1]["status_code"] == 404
+        assert body["summary"] == {"total": 3, "succeeded": 2, "failed": 1}
+        assert body["processing_info"]["priority"] == "background"
+        # Analyzed artifacts are consumed
+        assert all(main.artifact_store.get(artifact_id) is None for artifact_id in good)
+
+    asyncio.run(scenario())
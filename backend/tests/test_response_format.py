@@ -0,0 +1,65 @@
+import pytest
+from fastapi import HTTPException
+
+from utils.response_format import build_slim_response, conditional_response, select_fields, validate_fields
+
+
+FORMAT_MAPPING = {"summary_cards": "summary", "practice_problems": "quiz_generation"}
+
+
+def _full_response():
+    return {
+        "pipeline": "video->audio->gemini->orchestrator->8_agents",
+        "lecture_id": "lec-1",
+        "gemini_analysis": {"gemini_analysis": {"subject": "Physics"}, "model": "m"},
+        "content_generation": {
+            "content": {
+                "summary": {"status": "success", "content": {"cards": [1, 2], "title": "t"}},
+                "quiz_generation": {"status": "success", "content": {"questions": ["q"]}},
+            },
+            "learning_formats": {
+                "summary_cards": {"status": "success", "content": {"cards": [1, 2], "title": "t"}},
+                "practice_problems": {"status": "success", "content": {"questions": ["q"]}},
+            },
+        },
+    }
+
+
+def test_unknown_fields_are_rejected_before_running():
+    with pytest.raises(HTTPException) as error:
+        validate_fields("lecture_id,no_such_key", "v1", FORMAT_MAPPING)
+    assert error.value.status_code == 400
+    with pytest.raises(HTTPException):
+        validate_fields("learning_formats.no_such_format", "v2", FORMAT_MAPPING)
+    validate_fields("learning_formats.summary_cards.content,lecture_id", "v2", FORMAT_MAPPING)
+
+
+def test_broader_path_wins_regardless_of_order():
+    full = _full_response()
+    narrow_first = select_fields(full, "content_generation.content.summary.content,content_generation.content")
+    broad_first = select_fields(full, "content_generation.content,content_generation.content.summary.content")
+    expected = {"content_generation": {"content": full["content_generation"]["content"]}}
+    assert narrow_first == expected
+    assert broad_first == expected
+
+
+def test_selection_does_not_modify_the_response():
+    full = _full_response()
+    select_fields(full, "content_generation.content.summary,content_generation.content.summary.content.extra")
+    assert "extra" not in full["content_generation"]["content"]["summary"]["content"]
+
+
+def test_refs_pull_in_referenced_payloads():
+    slim = build_slim_response(_full_response(), FORMAT_MAPPING)
+    selected = select_fields(slim, "learning_formats.summary_cards")
+    assert selected["learning_formats"]["summary_cards"]["$ref"] == "agents.summary"
+    assert selected["agents"] == {"summary": {"cards": [1, 2], "title": "t"}}
+    assert selected["format_version"] == "v2"
+
+
+def test_etags_are_weak_and_round_trip():
+    response = conditional_response({"a": 1}, None, etag="abc")
+    assert response.headers["ETag"] == 'W/"abc"'
+    not_modified = conditional_response({"a": 1}, response.headers["ETag"], etag="abc")
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == 'W/"abc"'
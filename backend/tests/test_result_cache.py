@@ -0,0 +1,44 @@
+import asyncio
+
+from agents.result_cache import AgentResultCache, personalization_bucket
+
+
+ANALYSIS = {"educational_analysis": {"subject": "Physics", "topic": "Motion"}}
+CONTEXT = {"major": "Physics", "academicLevel": "College", "age": 20}
+FIELDS = ("academicLevel", "languagePreference", "major")
+
+
+def _cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_CACHE_DIR", str(tmp_path))
+    return AgentResultCache(FIELDS)
+
+
+def test_hits_are_independent_copies(tmp_path, monkeypatch):
+    cache = _cache(tmp_path, monkeypatch)
+    stored = {"status": "success", "content": {"cards": ["a"]}}
+    asyncio.run(cache.set("summary", {}, ANALYSIS, CONTEXT, stored))
+    stored["content"]["cards"].append("mutated by producer")
+
+    first = asyncio.run(cache.get("summary", {}, ANALYSIS, CONTEXT))
+    first["content"]["cards"].append("mutated by consumer")
+    second = asyncio.run(cache.get("summary", {}, ANALYSIS, CONTEXT))
+    assert second["content"]["cards"] == ["a"]
+
+    cache.memory.clear()
+    from_disk = asyncio.run(cache.get("summary", {}, ANALYSIS, CONTEXT))
+    from_disk["content"]["cards"].clear()
+    assert asyncio.run(cache.get("summary", {}, ANALYSIS, CONTEXT))["content"]["cards"] == ["a"]
+
+
+def test_bucket_only_keys_on_fields_the_agents_read():
+    base = personalization_bucket(CONTEXT, FIELDS)
+    assert set(base) == set(FIELDS)
+    assert personalization_bucket({**CONTEXT, "dyslexiaSupport": True, "age": 12}, FIELDS) == base
+    assert personalization_bucket({**CONTEXT, "major": "computer science"}, FIELDS) != base
+    # Majors and levels in the same group share a bucket
+    assert personalization_bucket({**CONTEXT, "major": "astronomy", "academicLevel": "undergrad"}, FIELDS) == base
+
+
+def test_fields_without_a_normalizer_still_split_the_bucket():
+    fields = FIELDS + ("dyslexiaSupport",)
+    assert personalization_bucket({**CONTEXT, "dyslexiaSupport": True}, fields) != personalization_bucket(CONTEXT, fields)
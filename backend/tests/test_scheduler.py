@@ -0,0 +1,120 @@
+import asyncio
+
+from agents import scheduler as scheduler_module
+from agents.scheduler import GeminiCallScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def _scheduler(monkeypatch, capacity):
+    monkeypatch.setattr(GeminiCallScheduler, "_instance", None)
+    monkeypatch.setenv("GEMINI_CONCURRENCY_PER_KEY", str(capacity))
+    monkeypatch.setenv("GEMINI_INTERACTIVE_RESERVE", "0.25")
+    clock = FakeClock()
+    monkeypatch.setattr(scheduler_module.time, "monotonic", clock)
+    scheduler = GeminiCallScheduler()
+    scheduler.configure(1)
+    return scheduler, clock
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def _run_queued(scheduler, requests):
+    """Hold the only slot, queue `requests` in order, then release and record dispatch order."""
+    order = []
+    blocker = await scheduler.acquire("interactive", "blocker")
+
+    async def call(priority, user_id):
+        async with scheduler.slot(priority, user_id):
+            order.append(user_id)
+            await asyncio.sleep(0)
+
+    tasks = [asyncio.create_task(call(priority, user_id)) for priority, user_id in requests]
+    await _settle()
+    scheduler.release("interactive")
+    await asyncio.gather(*tasks)
+    return blocker, order
+
+
+def test_users_in_a_class_take_turns(monkeypatch):
+    scheduler, _ = _scheduler(monkeypatch, capacity=1)
+    requests = [("interactive", "bulk")] * 4 + [("interactive", "other")] * 2
+
+    _, order = asyncio.run(_run_queued(scheduler, requests))
+
+    assert order == ["bulk", "other", "bulk", "other", "bulk", "bulk"]
+
+
+def test_higher_classes_are_dispatched_first(monkeypatch):
+    scheduler, _ = _scheduler(monkeypatch, capacity=1)
+    requests = [("prewarm", "p"), ("background", "b"), ("interactive", "i")]
+
+    _, order = asyncio.run(_run_queued(scheduler, requests))
+
+    assert order == ["i", "b", "p"]
+
+
+def test_background_work_cannot_take_the_interactive_reserve(monkeypatch):
+    scheduler, _ = _scheduler(monkeypatch, capacity=4)
+
+    async def scenario():
+        for _ in range(3):
+            await scheduler.acquire("background", "batch")
+        queued = asyncio.create_task(scheduler.acquire("background", "batch"))
+        await _settle()
+        assert not queued.done()
+        # The reserved slot still admits interactive calls immediately
+        assert await asyncio.wait_for(scheduler.acquire("interactive", "user"), 0.1) == 0.0
+        stats = scheduler.get_stats()
+        assert stats["classes"]["background"]["queue_depth"] == 1
+        assert stats["active_total"] == 4
+        # Background may only use the shared slots, so one background release is not enough
+        scheduler.release("background")
+        await _settle()
+        assert not queued.done()
+        scheduler.release("interactive")
+        await _settle()
+        assert queued.done()
+
+    asyncio.run(scenario())
+
+
+def test_queue_wait_is_measured_on_the_clock(monkeypatch):
+    scheduler, clock = _scheduler(monkeypatch, capacity=1)
+
+    async def scenario():
+        await scheduler.acquire("interactive", "a")
+        waiter = asyncio.create_task(scheduler.acquire("interactive", "b"))
+        await _settle()
+        clock.now += 2.5
+        scheduler.release("interactive")
+        assert await waiter == 2.5
+        assert scheduler.get_stats()["classes"]["interactive"]["wait_p95_s"] == 2.5
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiters_leave_the_queue(monkeypatch):
+    scheduler, _ = _scheduler(monkeypatch, capacity=1)
+
+    async def scenario():
+        await scheduler.acquire("interactive", "a")
+        waiter = asyncio.create_task(scheduler.acquire("interactive", "b"))
+        await _settle()
+        waiter.cancel()
+        await _settle()
+        stats = scheduler.get_stats()
+        assert stats["queued_total"] == 0 and stats["queued_users"] == 0
+        scheduler.release("interactive")
+        assert scheduler.get_stats()["active_total"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,42 @@
+import google.genai as genai
+
+from benchmarks import fake_genai
+from benchmarks.fake_genai import FakeGenaiConfig, LatencyModel
+
+
+def _agent(monkeypatch):
+    monkeypatch.setenv("GOOGLE_GEMINI_API_KEY", "test-key")
+    # install() replaces genai.Client globally; monkeypatch restores it afterwards
+    monkeypatch.setattr(genai, "Client", genai.Client)
+    fake_genai.install(FakeGenaiConfig(
+        analysis_latency=LatencyModel(0), agent_latency=LatencyModel(0), upload_latency=LatencyModel(0), seed=1
+    ))
+    from agents.speech_to_text_agent import GeminiSpeechToTextAgent
+    return GeminiSpeechToTextAgent()
+
+
+def test_transcribe_and_analyze_defaults_to_agent_client(monkeypatch, tmp_path):
+    agent = _agent(monkeypatch)
+    audio = tmp_path / "lecture.wav"
+    audio.write_bytes(b"\0" * 64)
+    uploads_before = fake_genai.stats.snapshot()["uploads"]
+
+    result = agent.transcribe_and_analyze(str(audio), {"work_orders_mode": "guided"})
+
+    assert result["provider"] == "google_genai"
+    assert "work_orders" in result
+    assert fake_genai.stats.snapshot()["uploads"] == uploads_before + 1
+
+
+def test_transcribe_and_analyze_uses_given_client(monkeypatch, tmp_path):
+    agent = _agent(monkeypatch)
+    audio = tmp_path / "lecture.wav"
+    audio.write_bytes(b"\0" * 64)
+    pool_client = genai.Client(api_key="pool-key", vertexai=False)
+    uploaded = []
+    original_upload = pool_client._upload
+    monkeypatch.setattr(pool_client, "_upload", lambda file: uploaded.append(file) or original_upload(file))
+
+    agent.transcribe_and_analyze(str(audio), {}, client=pool_client)
+
+    assert uploaded == [str(audio)]
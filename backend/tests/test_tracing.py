@@ -0,0 +1,28 @@
+import json
+import threading
+
+from utils.tracing import Tracer, span
+
+
+def test_spans_are_written_by_the_background_writer(monkeypatch, tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer()
+    writes = []
+    original_flush = tracer.flush
+    monkeypatch.setattr(tracer, "flush", lambda: writes.append(threading.current_thread().name) or original_flush())
+    try:
+        tracer.configure(exporter="otlp_json", path=str(path), flush_interval=0.01)
+        with span("request.root"):
+            with span("request.child"):
+                pass
+
+        for _ in range(200):
+            if path.exists() and path.read_text():
+                break
+            threading.Event().wait(0.01)
+
+        spans = json.loads(path.read_text().splitlines()[0])["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert sorted(s["name"] for s in spans) == ["request.child", "request.root"]
+        assert writes and set(writes) == {"trace-writer"}
+    finally:
+        tracer.configure(exporter="off")
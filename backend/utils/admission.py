@@ -0,0 +1,272 @@
+import asyncio
+import json
+import math
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional, Tuple
+
+from utils.stage_timer import stage
+from utils.tracing import current_span, log_event
+
+
+# Expensive endpoints by (method, path). Everything else is admitted without limits.
+ENDPOINT_CLASSES = {
+    ("POST", "/api/process-video-complete"): "pipeline",
+    ("POST", "/api/extract-audio"): "media",
+    ("POST", "/api/process-video"): "media",
+    ("POST", "/api/gemini-transcribe"): "media",
+}
+
+# Worst-case temp disk per media request: 100MB upload plus the extracted 16kHz WAV
+DISK_PER_REQUEST_MB = 250
+# A pipeline holds scheduler slots only while its agents run (the upload, ffmpeg
+# and analysis phases don't), so about twice slots/agents pipelines fit at once
+PIPELINE_OVERLAP = 2
+
+
+def _percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 4)
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, endpoint_class: str, reason: str, retry_after: int):
+        super().__init__(f"{endpoint_class} {reason}")
+        self.endpoint_class = endpoint_class
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _ClassState:
+    def __init__(self, limit: int, queue_size: int):
+        self.limit = max(1, limit)
+        self.queue_size = max(0, queue_size)
+        self.active = 0
+        self.waiters: deque = deque()
+        self.admitted = 0
+        self.completed = 0
+        self.rejected_queue_full = 0
+        self.rejected_wait_timeout = 0
+        self.waits = deque(maxlen=512)
+        self.service_times = deque(maxlen=512)
+
+
+class AdmissionController:
+    """
+    Concurrency limit plus bounded FIFO wait queue per endpoint class.
+
+    Limits are sized from the Gemini key pool (keys x per-key concurrency,
+    divided over the agents of a pipeline), CPU count (one ffmpeg per core)
+    and free temp disk; ADMISSION_<CLASS>_LIMIT / _QUEUE override them.
+    Requests that find the queue full, or wait longer than
+    ADMISSION_MAX_WAIT_SECONDS, are rejected with 429 and a Retry-After
+    estimated from recent service times, so overload turns into fast
+    rejections instead of every request slowing down together.
+
+    Must be used from the server's event loop.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if getattr(self, "initialized", False):
+            return
+        self.initialized = True
+        self.enabled = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+        self.max_wait = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "30"))
+        self.queue_factor = float(os.getenv("ADMISSION_QUEUE_FACTOR", "2"))
+        self.sizing: Dict[str, Any] = {}
+        self._classes: Dict[str, _ClassState] = {}
+        self.configure_from_resources(key_count=1, per_key_concurrency=1, agents_per_pipeline=1)
+
+    def configure_from_resources(self, key_count: int, per_key_concurrency: int, agents_per_pipeline: int) -> None:
+        """Size each class from the key pool, CPU count and temp disk headroom."""
+        gemini_slots = max(1, key_count * per_key_concurrency)
+        cpu_count = os.cpu_count() or 1
+        try:
+            disk_free_mb = shutil.disk_usage(tempfile.gettempdir()).free // (1024 * 1024)
+        except OSError:
+            disk_free_mb = None
+        # Leave half the temp disk for everything else
+        disk_bound = max(1, int(disk_free_mb * 0.5 // DISK_PER_REQUEST_MB)) if disk_free_mb is not None else None
+
+        gemini_bound = max(1, math.ceil(gemini_slots * PIPELINE_OVERLAP / max(1, agents_per_pipeline)))
+        # ffmpeg is a short phase of a pipeline but the whole of a media request
+        pipeline_bounds = [gemini_bound, cpu_count * 4] + ([disk_bound] if disk_bound else [])
+        media_bounds = [cpu_count * 2] + ([disk_bound] if disk_bound else [])
+
+        self.sizing = {
+            "gemini_keys": key_count,
+            "gemini_slots": gemini_slots,
+            "agents_per_pipeline": agents_per_pipeline,
+            "cpu_count": cpu_count,
+            "disk_free_mb": disk_free_mb,
+        }
+        limits = {"pipeline": min(pipeline_bounds), "media": min(media_bounds)}
+        self.configure({
+            name: self._override(name, limit)
+            for name, limit in limits.items()
+        })
+
+    def _override(self, name: str, limit: int) -> Tuple[int, int]:
+        limit = int(os.getenv(f"ADMISSION_{name.upper()}_LIMIT", "0")) or limit
+        queue_size = os.getenv(f"ADMISSION_{name.upper()}_QUEUE")
+        return limit, int(queue_size) if queue_size else math.ceil(limit * self.queue_factor)
+
+    def configure(self, limits: Dict[str, Tuple[int, int]]) -> None:
+        """Set (concurrency limit, queue size) per class; counters restart."""
+        self._classes = {name: _ClassState(limit, queue_size) for name, (limit, queue_size) in limits.items()}
+
+    def classify(self, method: str, path: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        return ENDPOINT_CLASSES.get((method, path))
+
+    def _retry_after(self, state: _ClassState) -> int:
+        """Seconds until a slot is likely free for a new arrival."""
+        service = _percentile(state.service_times, 0.5) or 10.0
+        return max(1, min(300, math.ceil(service * (len(state.waiters) + 1) / state.limit)))
+
+    async def acquire(self, endpoint_class: str) -> float:
+        """Wait for a slot; returns the queue wait or raises AdmissionRejected."""
+        state = self._classes[endpoint_class]
+        if state.active < state.limit and not state.waiters:
+            state.active += 1
+            state.admitted += 1
+            state.waits.append(0.0)
+            return 0.0
+
+        if len(state.waiters) >= state.queue_size:
+            state.rejected_queue_full += 1
+            raise AdmissionRejected(endpoint_class, "queue full", self._retry_after(state))
+
+        waiter = asyncio.get_running_loop().create_future()
+        state.waiters.append(waiter)
+        queued_at = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            # A waiter granted just as the wait ran out keeps its slot
+            if not waiter.done():
+                waiter.cancel()
+                state.waiters.remove(waiter)
+                state.rejected_wait_timeout += 1
+                raise AdmissionRejected(endpoint_class, "wait timeout", self._retry_after(state))
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                self.release(endpoint_class, None)
+            else:
+                waiter.cancel()
+                if waiter in state.waiters:
+                    state.waiters.remove(waiter)
+            raise
+
+        wait = time.monotonic() - queued_at
+        state.waits.append(wait)
+        return wait
+
+    def release(self, endpoint_class: str, service_time: Optional[float]) -> None:
+        state = self._classes[endpoint_class]
+        if service_time is not None:
+            state.completed += 1
+            state.service_times.append(service_time)
+        # Hand the slot straight to the oldest waiter, if any
+        while state.waiters:
+            waiter = state.waiters.popleft()
+            if not waiter.done():
+                state.admitted += 1
+                waiter.set_result(None)
+                return
+        state.active -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "max_wait_s": self.max_wait,
+            "sizing": self.sizing,
+            "classes": {
+                name: {
+                    "limit": state.limit,
+                    "queue_capacity": state.queue_size,
+                    "active": state.active,
+                    "queue_depth": len(state.waiters),
+                    "admitted_total": state.admitted,
+                    "completed_total": state.completed,
+                    "rejected_queue_full": state.rejected_queue_full,
+                    "rejected_wait_timeout": state.rejected_wait_timeout,
+                    "wait_p50_s": _percentile(state.waits, 0.5),
+                    "wait_p95_s": _percentile(state.waits, 0.95),
+                    "service_p50_s": _percentile(state.service_times, 0.5),
+                    "retry_after_s": self._retry_after(state),
+                }
+                for name, state in self._classes.items()
+            },
+        }
+
+
+class AdmissionMiddleware:
+    """
+    Pure ASGI middleware in front of the expensive endpoints.
+
+    Rejects before the request body is read, so a saturated server doesn't
+    spend time and temp disk receiving uploads it will not process.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.controller = AdmissionController()
+
+    async def __call__(self, scope, receive, send):
+        endpoint_class = self.controller.classify(scope.get("method"), scope.get("path")) if scope["type"] == "http" else None
+        if endpoint_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            with stage("admission-queue", **{"admission.class": endpoint_class}):
+                await self.controller.acquire(endpoint_class)
+        except AdmissionRejected as e:
+            span = current_span()
+            if span is not None:
+                span.set_attribute("admission.rejected", e.reason)
+            log_event("admission_rejected", "warning", endpoint_class=e.endpoint_class,
+                      reason=e.reason, retry_after_s=e.retry_after)
+            await _send_rejection(send, e)
+            return
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(endpoint_class, time.monotonic() - started)
+
+
+async def _send_rejection(send, rejection: AdmissionRejected) -> None:
+    body = json.dumps({
+        "detail": "Server is at capacity, please retry later",
+        "reason": rejection.reason,
+        "retry_after": rejection.retry_after,
+    }).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"retry-after", str(rejection.retry_after).encode("latin-1")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
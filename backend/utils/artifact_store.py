@@ -0,0 +1,387 @@
+import asyncio
+import glob
+import os
+import re
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, List
+
+from fastapi import HTTPException, status
+
+from utils.tracing import log_event
+
+
+# extract_audio writes 16kHz mono PCM 16-bit WAV
+WAV_BYTES_PER_SECOND = 16000 * 2
+# Writers that died mid-file (killed worker) leave partials; reclaim them after this long
+PARTIAL_MAX_AGE_SECONDS = 3600
+# Auto quota: this share of the temp filesystem (512MB /tmp on Lambda -> 256MB)
+AUTO_QUOTA_SHARE = 0.5
+
+_ARTIFACT_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+# {artifact_id}-{expires_at}[.partial]{suffix}; the name carries all metadata, so
+# uvicorn workers sharing the directory see each other's artifacts
+_FILE_NAME_PATTERN = re.compile(r"([0-9a-f]{32})-(\d+)(\.partial)?(\.[A-Za-z0-9]+)?$")
+
+
+def estimate_wav_bytes(duration_seconds: float) -> int:
+    """Size of the WAV extract_audio produces for a video of this duration (plus header slack)."""
+    return int(duration_seconds * WAV_BYTES_PER_SECOND) + 4096
+
+
+class Artifact:
+    """A temp file owned by the store; `path` is only for server-side use, clients get `artifact_id`."""
+    __slots__ = ("artifact_id", "backend", "directory", "suffix", "expires_at", "reserved_bytes", "committed")
+
+    def __init__(self, artifact_id: str, backend: str, directory: str, suffix: str,
+                 expires_at: int, reserved_bytes: int = 0, committed: bool = False):
+        self.artifact_id = artifact_id
+        self.backend = backend
+        self.directory = directory
+        self.suffix = suffix
+        self.expires_at = expires_at
+        self.reserved_bytes = reserved_bytes
+        self.committed = committed
+
+    @property
+    def path(self) -> str:
+        marker = "" if self.committed else ".partial"
+        return os.path.join(self.directory, f"{self.artifact_id}-{self.expires_at}{marker}{self.suffix}")
+
+    @property
+    def size_bytes(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+
+class ArtifactStore:
+    """
+    Temp files (uploaded videos, extracted audio) with opaque IDs, a TTL per
+    artifact and a disk quota.
+
+    Files live under ARTIFACT_DIR, named by ID and expiry, so every worker on
+    the host can resolve an ID. Writers reserve their expected size up front;
+    when the quota (ARTIFACT_QUOTA_MB, default half the temp filesystem) would
+    be exceeded, least recently used artifacts that are not in use are
+    evicted, and if that isn't enough the request is rejected with 503.
+    Expired artifacts and abandoned partial files are removed by a periodic
+    sweep. Small audio can be kept on a tmpfs (ARTIFACT_TMPFS_DIR, e.g.
+    /dev/shm/...) with its own quota.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if getattr(self, "initialized", False):
+            return
+        self.initialized = True
+        self.configure(
+            directory=os.getenv("ARTIFACT_DIR") or os.path.join(tempfile.gettempdir(), "studysurf_artifacts"),
+            quota_mb=int(os.getenv("ARTIFACT_QUOTA_MB", "0")),
+            ttl_seconds=int(os.getenv("ARTIFACT_TTL_SECONDS", "3600")),
+            tmpfs_dir=os.getenv("ARTIFACT_TMPFS_DIR") or None,
+            tmpfs_quota_mb=int(os.getenv("ARTIFACT_TMPFS_QUOTA_MB", "64")),
+            tmpfs_max_artifact_mb=int(os.getenv("ARTIFACT_TMPFS_MAX_ARTIFACT_MB", "16")),
+            sweep_interval=float(os.getenv("ARTIFACT_SWEEP_INTERVAL_SECONDS", "60"))
+        )
+
+    def configure(self, directory: str, quota_mb: int = 0, ttl_seconds: int = 3600,
+                  tmpfs_dir: Optional[str] = None, tmpfs_quota_mb: int = 64,
+                  tmpfs_max_artifact_mb: int = 16, sweep_interval: float = 60.0) -> None:
+        """(Re)configure; quota_mb=0 sizes the quota from the filesystem holding `directory`."""
+        os.makedirs(directory, exist_ok=True)
+        self.directories = {"disk": directory}
+        if tmpfs_dir:
+            try:
+                os.makedirs(tmpfs_dir, exist_ok=True)
+                self.directories["tmpfs"] = tmpfs_dir
+            except OSError as e:
+                log_event("artifact_tmpfs_unavailable", "warning", directory=tmpfs_dir, error=str(e))
+
+        if quota_mb > 0:
+            quota = quota_mb * 1024 * 1024
+        else:
+            quota = int(shutil.disk_usage(directory).total * AUTO_QUOTA_SHARE)
+        self.quotas = {"disk": quota, "tmpfs": tmpfs_quota_mb * 1024 * 1024}
+        self.ttl_seconds = ttl_seconds
+        self.tmpfs_max_artifact_bytes = tmpfs_max_artifact_mb * 1024 * 1024
+        self.sweep_interval = sweep_interval
+
+        self._state_lock = threading.RLock()
+        # Artifacts being written by this process, and pins held by readers
+        self._pending: Dict[str, Artifact] = {}
+        self._pins: Dict[str, int] = {}
+        self._last_sweep = 0.0
+        self.created = 0
+        self.deleted = 0
+        self.evicted = 0
+        self.expired = 0
+        self.partials_reclaimed = 0
+        self.rejected = 0
+
+    # ---- writing ----
+
+    def create(self, suffix: str, expected_bytes: int = 0, ttl_seconds: Optional[int] = None,
+               prefer_memory: bool = False) -> Artifact:
+        """
+        Reserve space for a new artifact and return it; write to artifact.path,
+        then commit() (or delete() on failure). Raises HTTPException 503 when
+        the quota can't be met even after evicting idle artifacts.
+        """
+        self.maybe_sweep()
+        with self._state_lock:
+            backend = "disk"
+            if (prefer_memory and "tmpfs" in self.directories
+                    and expected_bytes <= self.tmpfs_max_artifact_bytes
+                    and self._usage("tmpfs") + expected_bytes <= self.quotas["tmpfs"]):
+                backend = "tmpfs"
+            else:
+                self._make_room("disk", expected_bytes)
+
+            artifact = Artifact(
+                secrets.token_hex(16), backend, self.directories[backend], suffix,
+                int(time.time() + (ttl_seconds or self.ttl_seconds)), expected_bytes
+            )
+            # Claim the name right away so other workers count the reservation
+            open(artifact.path, "wb").close()
+            self._pending[artifact.artifact_id] = artifact
+            self.created += 1
+        return artifact
+
+    def commit(self, artifact: Artifact) -> Artifact:
+        """Publish a fully written artifact under its final name."""
+        with self._state_lock:
+            partial_path = artifact.path
+            artifact.committed = True
+            os.replace(partial_path, artifact.path)
+            self._pending.pop(artifact.artifact_id, None)
+            # The actual size may be larger than reserved
+            if artifact.backend == "disk":
+                self._make_room("disk", 0, strict=False)
+        return artifact
+
+    # ---- reading ----
+
+    def get(self, artifact_id: str) -> Optional[Artifact]:
+        """The committed, unexpired artifact with this ID (marked as recently used), or None."""
+        if not isinstance(artifact_id, str) or not _ARTIFACT_ID_PATTERN.fullmatch(artifact_id):
+            return None
+        for path in self._locate(artifact_id):
+            artifact = self._from_path(path)
+            if artifact is None or not artifact.committed:
+                continue
+            if artifact.expires_at < time.time():
+                self.delete(artifact_id)
+                return None
+            try:
+                # mtime doubles as the LRU clock
+                os.utime(path)
+            except OSError:
+                return None
+            return artifact
+        return None
+
+    @contextmanager
+    def use(self, artifact_id: str):
+        """Pin an artifact against eviction while the block reads it; 404 if unknown or expired."""
+        with self._state_lock:
+            artifact = self.get(artifact_id)
+            if artifact is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Artifact {artifact_id} not found or expired"
+                )
+            self._pins[artifact_id] = self._pins.get(artifact_id, 0) + 1
+        try:
+            yield artifact
+        finally:
+            with self._state_lock:
+                remaining = self._pins.get(artifact_id, 1) - 1
+                if remaining > 0:
+                    self._pins[artifact_id] = remaining
+                else:
+                    self._pins.pop(artifact_id, None)
+
+    def delete(self, artifact_id: Optional[str]) -> bool:
+        """Remove an artifact (committed or still being written); False if it was already gone."""
+        if not artifact_id:
+            return False
+        removed = False
+        with self._state_lock:
+            self._pending.pop(artifact_id, None)
+            for path in self._locate(artifact_id):
+                try:
+                    os.unlink(path)
+                    removed = True
+                except FileNotFoundError:
+                    pass
+            if removed:
+                self.deleted += 1
+        return removed
+
+    # ---- quota and sweeping ----
+
+    def _locate(self, artifact_id: str) -> List[str]:
+        return [
+            path
+            for directory in self.directories.values()
+            for path in glob.glob(os.path.join(directory, f"{artifact_id}-*"))
+        ]
+
+    def _from_path(self, path: str) -> Optional[Artifact]:
+        match = _FILE_NAME_PATTERN.fullmatch(os.path.basename(path))
+        if match is None:
+            return None
+        directory = os.path.dirname(path)
+        backend = next((name for name, d in self.directories.items() if d == directory), "disk")
+        return Artifact(match.group(1), backend, directory, match.group(4) or "",
+                        int(match.group(2)), committed=match.group(3) is None)
+
+    def _scan(self, backend: str) -> List[Dict[str, Any]]:
+        entries = []
+        try:
+            iterator = os.scandir(self.directories[backend])
+        except (KeyError, OSError):
+            return entries
+        with iterator:
+            for entry in iterator:
+                match = _FILE_NAME_PATTERN.fullmatch(entry.name)
+                if match is None:
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append({
+                    "artifact_id": match.group(1),
+                    "path": entry.path,
+                    "expires_at": int(match.group(2)),
+                    "partial": match.group(3) is not None,
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                })
+        return entries
+
+    def _usage(self, backend: str, entries: Optional[List[Dict[str, Any]]] = None) -> int:
+        """Bytes on the backend, counting this process's writers at their reserved size."""
+        total = 0
+        for entry in entries if entries is not None else self._scan(backend):
+            pending = self._pending.get(entry["artifact_id"]) if entry["partial"] else None
+            total += max(entry["size"], pending.reserved_bytes if pending else 0)
+        return total
+
+    def _make_room(self, backend: str, needed: int, strict: bool = True) -> None:
+        entries = self._scan(backend)
+        usage = self._usage(backend, entries)
+        quota = self.quotas[backend]
+        if usage + needed <= quota:
+            return
+        idle = sorted(
+            (e for e in entries if not e["partial"] and e["artifact_id"] not in self._pins),
+            key=lambda e: e["mtime"]
+        )
+        for entry in idle:
+            if usage + needed <= quota:
+                break
+            try:
+                os.unlink(entry["path"])
+            except FileNotFoundError:
+                continue
+            usage -= entry["size"]
+            self.evicted += 1
+            log_event("artifact_evicted", "warning", artifact_id=entry["artifact_id"], size_bytes=entry["size"])
+        if usage + needed > quota and strict:
+            self.rejected += 1
+            log_event("artifact_quota_exceeded", "warning", backend=backend,
+                      usage_bytes=usage, needed_bytes=needed, quota_bytes=quota)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Temporary storage is full, please retry",
+                headers={"Retry-After": "5"}
+            )
+
+    def sweep(self) -> Dict[str, int]:
+        """Remove expired artifacts and abandoned partials, then evict down to the quotas."""
+        now = time.time()
+        expired = reclaimed = 0
+        with self._state_lock:
+            self._last_sweep = time.monotonic()
+            for backend in self.directories:
+                for entry in self._scan(backend):
+                    if entry["partial"]:
+                        stale = entry["artifact_id"] not in self._pending and entry["mtime"] < now - PARTIAL_MAX_AGE_SECONDS
+                    else:
+                        stale = entry["expires_at"] < now and entry["artifact_id"] not in self._pins
+                    if not stale:
+                        continue
+                    try:
+                        os.unlink(entry["path"])
+                    except FileNotFoundError:
+                        continue
+                    if entry["partial"]:
+                        reclaimed += 1
+                    else:
+                        expired += 1
+                self._make_room(backend, 0, strict=False)
+            self.expired += expired
+            self.partials_reclaimed += reclaimed
+        if expired or reclaimed:
+            log_event("artifacts_swept", expired=expired, partials_reclaimed=reclaimed)
+        return {"expired": expired, "partials_reclaimed": reclaimed}
+
+    def maybe_sweep(self) -> None:
+        """Sweep if the last sweep is older than the interval (covers runtimes that freeze between requests)."""
+        if time.monotonic() - self._last_sweep >= self.sweep_interval:
+            self.sweep()
+
+    async def run_sweeper(self) -> None:
+        """Background task: sweep every ARTIFACT_SWEEP_INTERVAL_SECONDS until cancelled."""
+        while True:
+            try:
+                await asyncio.to_thread(self.maybe_sweep)
+            except Exception as e:
+                log_event("artifact_sweep_failed", "error", error=str(e))
+            await asyncio.sleep(self.sweep_interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        backends = {}
+        for backend, directory in self.directories.items():
+            entries = self._scan(backend)
+            try:
+                disk = shutil.disk_usage(directory)
+                filesystem = {"total_bytes": disk.total, "free_bytes": disk.free}
+            except OSError:
+                filesystem = None
+            backends[backend] = {
+                "directory": directory,
+                "quota_bytes": self.quotas[backend],
+                "used_bytes": self._usage(backend, entries),
+                "artifacts": sum(1 for e in entries if not e["partial"]),
+                "partial": sum(1 for e in entries if e["partial"]),
+                "filesystem": filesystem,
+            }
+        return {
+            "backends": backends,
+            "ttl_seconds": self.ttl_seconds,
+            "writing": len(self._pending),
+            "pinned": len(self._pins),
+            "created_total": self.created,
+            "deleted_total": self.deleted,
+            "evicted_total": self.evicted,
+            "expired_total": self.expired,
+            "partials_reclaimed_total": self.partials_reclaimed,
+            "rejected_total": self.rejected,
+        }
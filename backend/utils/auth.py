@@ -1,43 +1,59 @@
-import bcrypt
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Dict, Any
+import copy
+import hashlib
 import os
 from fastapi import HTTPException, status
 
+from utils.ttl_cache import TTLCache
+
 # Simple JWT configuration for hackathon
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "study_surf_users_jwt_secret_key_for_demo")
 JWT_ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_HOURS = 24
 
+# Preferences copied into the token ("prefs" claim) so the pipeline can personalize
+# without reading the profile; refreshed whenever preferences are updated
+PREFERENCE_CLAIM_FIELDS = ("major", "academicLevel", "languagePreference", "dyslexiaSupport", "learningStyles")
+EMBED_PREFERENCES = os.getenv("JWT_EMBED_PREFERENCES", "true").lower() == "true"
+
+# Verified token payloads keyed by token digest; each entry expires with its token
+_verified_tokens = TTLCache(
+    maxsize=int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "4096")),
+    ttl=ACCESS_TOKEN_EXPIRE_HOURS * 3600
+)
+
+
+def get_token_cache_stats() -> Dict[str, Any]:
+    return _verified_tokens.stats()
+
+
 class AuthManager:
     @staticmethod
-    def hash_password(password: str) -> str:
-        """Hash a password using bcrypt."""
-        salt = bcrypt.gensalt()
-        hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-        return hashed.decode('utf-8')
-    
-    @staticmethod
-    def verify_password(password: str, hashed_password: str) -> bool:
-        """Verify a password against its hash."""
-        return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
-    
-    @staticmethod
-    def create_access_token(data: dict) -> str:
-        """Create a JWT access token."""
+    def create_access_token(data: dict, preferences: Optional[dict] = None) -> str:
+        """Create a JWT access token, optionally carrying a preferences snapshot."""
         to_encode = data.copy()
         expire = datetime.utcnow() + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
         to_encode.update({"exp": expire})
+        if preferences and EMBED_PREFERENCES:
+            to_encode["prefs"] = {
+                field: preferences[field] for field in PREFERENCE_CLAIM_FIELDS if field in preferences
+            }
         
         encoded_jwt = jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
         return encoded_jwt
     
     @staticmethod
     def verify_token(token: str) -> dict:
-        """Verify and decode a JWT token."""
+        """Verify and decode a JWT token (served from the verified-token cache when possible)."""
+        digest = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        cached = _verified_tokens.get(digest)
+        if cached is not None:
+            return copy.deepcopy(cached)
         try:
             payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+            _verified_tokens.set(digest, copy.deepcopy(payload), expires_at=payload.get("exp"))
             return payload
         except JWTError as e:
             if "expired" in str(e).lower():
@@ -51,14 +67,18 @@ class AuthManager:
                     detail="Invalid token"
                 )
 
-def get_current_user_id(authorization: Optional[str] = None) -> Optional[str]:
-    """Extract user ID from JWT token (optional for hackathon demo)."""
+def get_token_claims(authorization: Optional[str] = None) -> Optional[dict]:
+    """Verified claims of a Bearer token, or None if missing or invalid."""
     if not authorization or not authorization.startswith("Bearer "):
         return None
     
     token = authorization.split(" ")[1]
     try:
-        payload = AuthManager.verify_token(token)
-        return payload.get("user_id")
+        return AuthManager.verify_token(token)
     except (HTTPException, JWTError):
         return None
+
+def get_current_user_id(authorization: Optional[str] = None) -> Optional[str]:
+    """Extract user ID from JWT token (optional for hackathon demo)."""
+    claims = get_token_claims(authorization)
+    return claims.get("user_id") if claims else None
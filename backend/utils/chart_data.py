@@ -0,0 +1,210 @@
+import ast
+import math
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+
+# Functions an LLM-authored expression may call, mapped to their NumPy ufuncs
+ALLOWED_FUNCTIONS = {
+    "sin": np.sin, "cos": np.cos, "tan": np.tan,
+    "asin": np.arcsin, "acos": np.arccos, "atan": np.arctan,
+    "arcsin": np.arcsin, "arccos": np.arccos, "arctan": np.arctan,
+    "sinh": np.sinh, "cosh": np.cosh, "tanh": np.tanh,
+    "exp": np.exp, "log": np.log, "ln": np.log, "log10": np.log10, "log2": np.log2,
+    "sqrt": np.sqrt, "abs": np.abs, "floor": np.floor, "ceil": np.ceil,
+    "sign": np.sign, "minimum": np.minimum, "maximum": np.maximum,
+}
+ALLOWED_CONSTANTS = {"pi": math.pi, "e": math.e}
+ALLOWED_BINOPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod, ast.FloorDiv)
+ALLOWED_UNARYOPS = (ast.UAdd, ast.USub)
+
+MIN_SAMPLES = 41
+MAX_SAMPLES = 401
+# Dense first pass used to count oscillations before choosing a resolution
+PROBE_SAMPLES = 4 * (MAX_SAMPLES - 1) + 1
+# Samples needed between neighbouring extrema for a faithful line
+SAMPLES_PER_EXTREMUM = 8
+
+
+class ChartExpressionError(ValueError):
+    """Raised when a chart expression is not a safe arithmetic expression."""
+
+
+def _normalize_expression(expression: str) -> str:
+    text = expression.strip()
+    # Accept "y = ..." / "f(x) = ..." forms and caret exponentiation
+    if "=" in text:
+        text = text.split("=", 1)[1]
+    return text.replace("^", "**").strip()
+
+
+def parse_expression(expression: str, variables: List[str]) -> ast.Expression:
+    """Parse and validate an expression against the arithmetic whitelist."""
+    try:
+        tree = ast.parse(_normalize_expression(expression), mode="eval")
+    except SyntaxError as e:
+        raise ChartExpressionError(f"Invalid expression {expression!r}: {e.msg}")
+
+    allowed_names = set(variables) | set(ALLOWED_CONSTANTS) | set(ALLOWED_FUNCTIONS)
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Expression, ast.Load)):
+            continue
+        if isinstance(node, ast.Constant):
+            if not isinstance(node.value, (int, float)) or isinstance(node.value, bool):
+                raise ChartExpressionError("Only numeric constants are allowed")
+        elif isinstance(node, ast.Name):
+            if node.id not in allowed_names:
+                raise ChartExpressionError(f"Unknown name {node.id!r} in expression")
+        elif isinstance(node, ast.BinOp):
+            if not isinstance(node.op, ALLOWED_BINOPS):
+                raise ChartExpressionError(f"Operator {type(node.op).__name__} is not allowed")
+        elif isinstance(node, ast.UnaryOp):
+            if not isinstance(node.op, ALLOWED_UNARYOPS):
+                raise ChartExpressionError(f"Operator {type(node.op).__name__} is not allowed")
+        elif isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in ALLOWED_FUNCTIONS or node.keywords:
+                raise ChartExpressionError("Only plain calls to math functions are allowed")
+        elif isinstance(node, ast.operator) or isinstance(node, ast.unaryop):
+            continue
+        else:
+            raise ChartExpressionError(f"{type(node).__name__} is not allowed in expressions")
+
+    # Evaluate numeric literals as floats so constant powers overflow to inf
+    # instead of building arbitrarily large Python integers
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant):
+            node.value = float(node.value)
+    return tree
+
+
+def compile_expression(expression: str, parameters: Optional[Dict[str, float]] = None, variable: str = "x"):
+    """Return a vectorized f(x_array) -> y_array for a validated expression."""
+    parameters = {k: float(v) for k, v in (parameters or {}).items() if k != variable}
+    tree = parse_expression(expression, [variable] + list(parameters))
+    code = compile(tree, "<chart-expression>", "eval")
+    namespace = dict(ALLOWED_FUNCTIONS)
+    namespace.update(ALLOWED_CONSTANTS)
+    namespace.update(parameters)
+
+    def evaluate(x: np.ndarray) -> np.ndarray:
+        try:
+            with np.errstate(all="ignore"):
+                y = eval(code, {"__builtins__": {}}, dict(namespace, **{variable: x}))
+        except (OverflowError, ZeroDivisionError, TypeError, ValueError) as e:
+            raise ChartExpressionError(f"Expression {expression!r} could not be evaluated: {e}")
+        return np.broadcast_to(np.asarray(y, dtype=float), x.shape)
+
+    return evaluate
+
+
+def _count_extrema(ys: np.ndarray) -> int:
+    """Number of direction changes along the finite values; flat runs are ignored."""
+    slopes = np.sign(np.diff(ys[np.isfinite(ys)]))
+    slopes = slopes[slopes != 0]
+    return int(np.count_nonzero(slopes[1:] != slopes[:-1]))
+
+
+def sample_function(
+    expression: str,
+    domain: Tuple[float, float],
+    parameters: Optional[Dict[str, float]] = None,
+    variable: str = "x"
+) -> List[Dict[str, float]]:
+    """
+    Sample an expression over a domain at a resolution that fits its shape.
+
+    A dense probe counts the local extrema first, so the starting resolution
+    gives every oscillation SAMPLES_PER_EXTREMUM points; a coarse grid would
+    otherwise alias a fast wave into a smooth, wrong one. The resolution is
+    then doubled while linear interpolation between neighbours still misses
+    the midpoints by more than 0.5% of the value range, up to MAX_SAMPLES.
+    Expressions that oscillate too fast for MAX_SAMPLES are rejected.
+    """
+    lo, hi = float(domain[0]), float(domain[1])
+    if not (math.isfinite(lo) and math.isfinite(hi)) or lo == hi:
+        raise ChartExpressionError(f"Invalid domain {domain!r}")
+    if lo > hi:
+        lo, hi = hi, lo
+
+    f = compile_expression(expression, parameters, variable)
+    required = _count_extrema(f(np.linspace(lo, hi, PROBE_SAMPLES))) * SAMPLES_PER_EXTREMUM
+    if required > MAX_SAMPLES:
+        raise ChartExpressionError(
+            f"Expression {expression!r} oscillates too fast to plot on {domain!r} "
+            f"with at most {MAX_SAMPLES} points; narrow the domain"
+        )
+    samples = MIN_SAMPLES
+    while samples < required:
+        samples = (samples - 1) * 2 + 1
+    samples = min(samples, MAX_SAMPLES)
+
+    while True:
+        xs = np.linspace(lo, hi, samples)
+        ys = f(xs)
+        if samples >= MAX_SAMPLES:
+            break
+        finite = np.isfinite(ys)
+        if not finite.any():
+            break
+        value_range = np.ptp(ys[finite]) or 1.0
+        mid_x = (xs[:-1] + xs[1:]) / 2
+        interpolation_error = np.abs(f(mid_x) - (ys[:-1] + ys[1:]) / 2)
+        if np.nanmax(interpolation_error) <= 0.005 * value_range:
+            break
+        samples = min(MAX_SAMPLES, (samples - 1) * 2 + 1)
+
+    mask = np.isfinite(ys)
+    if not mask.any():
+        raise ChartExpressionError(f"Expression {expression!r} has no finite values on {domain!r}")
+    return [
+        {"x": float(np.round(x, 6)), "y": float(np.round(y, 6))}
+        for x, y in zip(xs[mask], ys[mask])
+    ]
+
+
+def synthesize_chart(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build a full chart config from a compact LLM chart spec.
+
+    Function specs (expression + x_domain + parameters) are sampled here;
+    category specs carry their labels and values through unchanged.
+    """
+    data_format = spec.get("data_format") or ("function" if spec.get("expression") else "categories")
+    config = {
+        "chart_id": spec.get("chart_id") or "chart",
+        "chart_type": spec.get("chart_type") or ("line" if data_format == "function" else "bar"),
+        "title": spec.get("title") or "Chart",
+        "description": spec.get("description", ""),
+        "data_format": data_format,
+        "axes": spec.get("axes") or {"x_axis": "x", "y_axis": "y"},
+        "annotations": spec.get("annotations") or [],
+    }
+
+    if data_format == "function":
+        expression = spec.get("expression")
+        if not expression:
+            raise ChartExpressionError("Function chart is missing an expression")
+        domain = spec.get("x_domain") or [0, 10]
+        parameters = spec.get("parameters") or {}
+        variable = spec.get("variable") or "x"
+        config["data"] = {
+            "points": sample_function(expression, (domain[0], domain[1]), parameters, variable),
+            "expression": expression,
+            "parameters": parameters,
+        }
+    elif data_format == "categories":
+        labels = [str(label) for label in spec.get("labels") or []]
+        values = [float(v) for v in spec.get("values") or []]
+        if not labels or len(labels) != len(values):
+            raise ChartExpressionError("Category chart needs matching labels and values")
+        config["data"] = {"labels": labels, "values": values}
+    elif data_format == "points":
+        points = [{"x": float(p["x"]), "y": float(p["y"])} for p in spec.get("points") or []]
+        if not points:
+            raise ChartExpressionError("Point chart has no points")
+        config["data"] = {"points": points}
+    else:
+        raise ChartExpressionError(f"Unsupported data_format {data_format!r}")
+
+    return config
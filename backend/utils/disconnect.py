@@ -0,0 +1,105 @@
+import asyncio
+import contextvars
+import threading
+from typing import Optional
+
+from utils.tracing import current_span, log_event
+
+
+# Endpoints whose work is cancelled when the client goes away
+CANCELLABLE_ENDPOINTS = {
+    ("POST", "/api/process-video-complete"),
+    ("POST", "/api/process-video"),
+    ("POST", "/api/extract-audio"),
+    ("POST", "/api/gemini-transcribe"),
+}
+
+# Set for the request being served; worker threads see it through the copied context
+_cancel_event: contextvars.ContextVar = contextvars.ContextVar("request_cancel_event", default=None)
+
+
+class ClientDisconnected(Exception):
+    """Raised at cancellation checkpoints in blocking code once the client has gone."""
+
+
+def raise_if_cancelled() -> None:
+    """Checkpoint for code running on worker threads (which asyncio cannot cancel)."""
+    event: Optional[threading.Event] = _cancel_event.get()
+    if event is not None and event.is_set():
+        raise ClientDisconnected("Client disconnected")
+
+
+def detach_from_client(request) -> None:
+    """Keep this request's work running to completion even if the client disconnects."""
+    request.state.detached = True
+
+
+class DisconnectCancellationMiddleware:
+    """
+    Pure ASGI middleware: once a cancellable endpoint has read its request
+    body, watch for the client disconnecting and cancel the handler task.
+
+    Cancellation propagates to the handler's awaits (ffmpeg subprocesses,
+    agent tasks and their scheduler slots, pending executor calls); code on
+    worker threads stops at its next raise_if_cancelled() checkpoint.
+    Requests marked with detach_from_client(), or with retries attached
+    through an Idempotency-Key, keep running.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (scope.get("method"), scope.get("path")) not in CANCELLABLE_ENDPOINTS:
+            await self.app(scope, receive, send)
+            return
+
+        body_received = asyncio.Event()
+        disconnected = asyncio.Event()
+        cancel_event = threading.Event()
+        token = _cancel_event.set(cancel_event)
+
+        async def tracked_receive():
+            if disconnected.is_set():
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request" and not message.get("more_body", False):
+                body_received.set()
+            elif message["type"] == "http.disconnect":
+                disconnected.set()
+            return message
+
+        try:
+            handler = asyncio.create_task(self.app(scope, tracked_receive, send))
+        finally:
+            _cancel_event.reset(token)
+        watcher = asyncio.create_task(self._watch(scope, receive, handler, body_received, disconnected, cancel_event))
+        try:
+            await handler
+        except asyncio.CancelledError:
+            if not cancel_event.is_set():
+                # We were cancelled ourselves (server shutdown), not the client
+                raise
+        finally:
+            watcher.cancel()
+
+    async def _watch(self, scope, receive, handler, body_received, disconnected, cancel_event) -> None:
+        await body_received.wait()
+        # The handler doesn't read again after its body, so the next message is the disconnect
+        message = await receive()
+        if message["type"] != "http.disconnect" or handler.done():
+            return
+        disconnected.set()
+
+        state = scope.get("state") or {}
+        # Set by IdempotencyMiddleware: retries waiting on this run
+        waiters = state["idempotency_waiters"]() if "idempotency_waiters" in state else 0
+        span = current_span()
+        if state.get("detached") or waiters:
+            log_event("client_disconnected", detached=bool(state.get("detached")), attached_retries=waiters)
+            return
+        if span is not None:
+            span.set_attribute("request.cancelled", True)
+        log_event("client_disconnected_cancelling", "warning", path=scope.get("path"))
+        cancel_event.set()
+        handler.cancel()
@@ -1,113 +1,260 @@
 from google.cloud import firestore
-from google.api_core.exceptions import GoogleAPIError, NotFound
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, GoogleAPIError, NotFound
 from fastapi import HTTPException, status
 from typing import Dict, Any, Optional
 from datetime import datetime
+from urllib.parse import quote
+import copy
 import os
 import uuid
 
-class FirestoreClient:
+from utils.ttl_cache import TTLCache
+from utils.tracing import log_event
+from utils.user_store import (
+    UserStore, build_user_item, preference_update_data, merge_update, username_taken_error, users_not_found_error
+)
+
+class FirestoreClient(UserStore):
+    """
+    User storage on Firestore through the async client.
+
+    All operations are coroutines so request handlers never block the event
+    loop on a Firestore round trip. The Firestore client is created on first
+    use, so the app starts (and other backends work) without GCP credentials.
+    """
+
     def __init__(self):
-        """Initialize Firestore client."""
-        # Authenticate using GOOGLE_APPLICATION_CREDENTIALS env var
-        self.db = firestore.Client(project=os.getenv("GCP_PROJECT_ID"))
-        self.users_collection = self.db.collection(os.getenv("FIRESTORE_USERS_COLLECTION", "study_surf_users"))
+        """Initialize Firestore client settings."""
+        self._db = None
+        self.users_collection_name = os.getenv("FIRESTORE_USERS_COLLECTION", "study_surf_users")
+        # One document per username (document ID = username) -> userId; makes signin a key
+        # fetch and lets signup claim a username atomically with a create precondition
+        self.usernames_collection_name = os.getenv("FIRESTORE_USERNAMES_COLLECTION", "study_surf_usernames")
+        # Users created before the index existed are found by query and backfilled. Off by
+        # default: run scripts/backfill_username_index.py once instead of querying on every miss
+        self.legacy_username_lookup = os.getenv("USERNAME_INDEX_LEGACY_FALLBACK", "false").lower() == "true"
+        # Read-through profile cache; profiles change rarely and every authenticated request reads one
+        self.user_cache = TTLCache(
+            maxsize=int(os.getenv("USER_CACHE_MAX_ENTRIES", "2048")),
+            ttl=float(os.getenv("USER_CACHE_TTL_SECONDS", "300"))
+        )
+
+    @property
+    def db(self) -> firestore.AsyncClient:
+        if self._db is None:
+            # Authenticate using GOOGLE_APPLICATION_CREDENTIALS env var
+            self._db = firestore.AsyncClient(project=os.getenv("GCP_PROJECT_ID"))
+        return self._db
+
+    @property
+    def users_collection(self):
+        return self.db.collection(self.users_collection_name)
+
+    @property
+    def usernames_collection(self):
+        return self.db.collection(self.usernames_collection_name)
+
+    def _cache_user(self, user: Dict[str, Any], update_time: Any = None) -> None:
+        """Cache a profile with the document's update_time, used as a write precondition."""
+        self.user_cache.set(user["userId"], {"user": copy.deepcopy(user), "update_time": update_time})
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        return self.user_cache.stats()
+
+    @staticmethod
+    def _username_doc_id(username: str) -> str:
+        """Escape a username into a valid document ID ("/", ".", "..", "__x__" are not)."""
+        doc_id = quote(username, safe="").replace(".", "%2E")
+        if doc_id.startswith("__") and doc_id.endswith("__"):
+            doc_id = doc_id.replace("_", "%5F")
+        return doc_id
 
     # ============= USER OPERATIONS =============
 
-    def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new user document in Firestore."""
         user_id = str(uuid.uuid4())
         timestamp = datetime.utcnow().isoformat()
 
-        item = {
-            "userId": user_id,
-            "username": user_data["username"],
-            "name": user_data["name"],
-            "passwordHash": user_data["password_hash"],
-            "preferences": {
-                "age": user_data["age"],
-                "academicLevel": user_data["academic_level"],
-                "major": user_data["major"],
-                "dyslexiaSupport": user_data.get("dyslexia_support", False),
-                "languagePreference": user_data.get("language_preference", "English"),
-                "learningStyles": user_data.get("learning_styles", []),
-                "metadata": user_data.get("metadata", []),
-            },
-            "createdAt": timestamp,
-            "updatedAt": timestamp,
-        }
+        item = build_user_item(user_data, user_id, timestamp)
 
+        username_ref = self.usernames_collection.document(self._username_doc_id(user_data["username"]))
         try:
-            # Ensure username is unique
-            existing_user = self.get_user_by_username(user_data["username"])
-            if existing_user:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="User already exists"
-                )
+            # Users created before the index have no entry to collide with; finding one
+            # backfills its entry, so a racing signup also fails on the create below
+            if self.legacy_username_lookup and await self._get_legacy_user_by_username(user_data["username"]):
+                raise username_taken_error()
 
-            self.users_collection.document(user_id).set(item)
+            # Both creates commit atomically; the index create fails if the username is taken
+            batch = self.db.batch()
+            batch.create(username_ref, {"userId": user_id, "username": user_data["username"], "createdAt": timestamp})
+            batch.create(self.users_collection.document(user_id), item)
+            write_results = await batch.commit()
+            self._cache_user(item, write_results[1].update_time)
             return item
 
+        except AlreadyExists:
+            raise username_taken_error()
         except GoogleAPIError as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to create user: {str(e)}"
             )
 
-    def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
-        """Get user by username using Firestore query."""
+    async def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+        """Get user by username through the usernames index."""
         try:
-            query = self.users_collection.where("username", "==", username).limit(1)
-            results = query.stream()
-            for doc in results:
-                return doc.to_dict()
+            index_doc = await self.usernames_collection.document(self._username_doc_id(username)).get()
+            if index_doc.exists:
+                return await self.get_user_by_id(index_doc.to_dict()["userId"])
+            if self.legacy_username_lookup:
+                return await self._get_legacy_user_by_username(username)
             return None
         except GoogleAPIError as e:
-            print(f"Error querying user by username: {e}")
+            log_event("user_lookup_failed", "error", username=username, error=str(e))
             return None
 
-    def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
-        """Get user by userId."""
+    async def _get_legacy_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+        """Query fallback for users created before the index; backfills their index entry."""
+        query = self.users_collection.where("username", "==", username).limit(1)
+        async for doc in query.stream():
+            user = doc.to_dict()
+            try:
+                await self.usernames_collection.document(self._username_doc_id(username)).create(
+                    {"userId": user["userId"], "username": username, "createdAt": user.get("createdAt")}
+                )
+                log_event("username_index_backfilled", username=username, user_id=user["userId"])
+            except AlreadyExists:
+                pass
+            self._cache_user(user, doc.update_time)
+            return user
+        return None
+
+    async def backfill_username_index(self, page_size: int = 400, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Create the missing usernames index entry of every existing user.
+
+        Users are read a page at a time; each page's entries are looked up with
+        one get_all and the missing ones created in one batch. Create (not set)
+        means a username already claimed by another user is never overwritten;
+        such clashes are reported as conflicts for manual cleanup.
+        """
+        stats = {"users": 0, "indexed": 0, "created": 0, "conflicts": []}
+        query = self.users_collection.select(["userId", "username", "createdAt"]).order_by("__name__")
+        last_doc = None
+        while True:
+            page_query = query.start_after(last_doc) if last_doc is not None else query
+            docs = [doc async for doc in page_query.limit(page_size).stream()]
+            if not docs:
+                return stats
+            users = [user for user in (doc.to_dict() for doc in docs) if user.get("username")]
+
+            refs = {
+                user["userId"]: self.usernames_collection.document(self._username_doc_id(user["username"]))
+                for user in users
+            }
+            existing = {
+                snapshot.id: snapshot.to_dict()
+                async for snapshot in self.db.get_all(list(refs.values())) if snapshot.exists
+            }
+            batch = self.db.batch()
+            pending = 0
+            page_stats = {"indexed": 0, "conflicts": []}
+            for user in users:
+                entry = existing.get(refs[user["userId"]].id)
+                if entry is None:
+                    batch.create(refs[user["userId"]], {
+                        "userId": user["userId"], "username": user["username"], "createdAt": user.get("createdAt")
+                    })
+                    pending += 1
+                elif entry.get("userId") == user["userId"]:
+                    page_stats["indexed"] += 1
+                else:
+                    page_stats["conflicts"].append({"username": user["username"], "userId": user["userId"],
+                                               "indexedUserId": entry.get("userId")})
+            if pending and not dry_run:
+                try:
+                    await batch.commit()
+                except AlreadyExists:
+                    # A signup claimed one of these usernames meanwhile; redo the page
+                    continue
+            last_doc = docs[-1]
+            stats["users"] += len(users)
+            stats["indexed"] += page_stats["indexed"]
+            stats["conflicts"].extend(page_stats["conflicts"])
+            stats["created"] += pending
+
+    async def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get user by userId, served from the profile cache when fresh."""
+        cached = self.user_cache.get(user_id)
+        if cached is not None:
+            # Copy so callers can't mutate the cached profile
+            return copy.deepcopy(cached["user"])
         try:
             doc_ref = self.users_collection.document(user_id)
-            doc = doc_ref.get()
+            doc = await doc_ref.get()
             if doc.exists:
-                return doc.to_dict()
+                user = doc.to_dict()
+                self._cache_user(user, doc.update_time)
+                return user
             return None
         except NotFound:
             return None
         except GoogleAPIError as e:
-            print(f"Error getting user by ID: {e}")
+            log_event("user_lookup_failed", "error", user_id=user_id, error=str(e))
             return None
 
-    def update_user_preferences(self, user_id: str, preferences: Dict[str, Any]) -> Dict[str, Any]:
-        """Update user preferences (or other fields)."""
-        try:
-            doc_ref = self.users_collection.document(user_id)
-            doc = doc_ref.get()
-
-            if not doc.exists:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="User not found"
-                )
-
-            update_data = {"updatedAt": datetime.utcnow().isoformat()}
+    async def update_user_preferences(self, user_id: str, preferences: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Update user preferences (or other fields) and return the updated profile.
 
-            for key, value in preferences.items():
-                if key == "name":
-                    update_data["name"] = value
-                else:
-                    update_data[f"preferences.{key}"] = value
+        With a cached profile this is a single update guarded by the cached
+        update_time; the response is merged locally. Otherwise (or if the
+        document changed since it was cached) the update is sent directly,
+        with Firestore's must-exist precondition, and the profile is read back
+        afterwards. A missing user is a 404.
+        """
+        doc_ref = self.users_collection.document(user_id)
+        update_data = preference_update_data(preferences)
+        try:
+            cached = self.user_cache.get(user_id)
+            if cached is not None and cached["update_time"] is not None:
+                try:
+                    result = await doc_ref.update(
+                        update_data, option=self.db.write_option(last_update_time=cached["update_time"])
+                    )
+                    updated_user = merge_update(cached["user"], update_data)
+                    self._cache_user(updated_user, result.update_time)
+                    return updated_user
+                except (FailedPrecondition, NotFound):
+                    # Changed or deleted elsewhere since it was cached
+                    self.user_cache.pop(user_id)
 
-            doc_ref.update(update_data)
-            updated_doc = doc_ref.get().to_dict()
-            return updated_doc
+            try:
+                await doc_ref.update(update_data)
+            except NotFound:
+                raise users_not_found_error([user_id])
+            updated_user = await self.get_user_by_id(user_id)
+            if updated_user is None:
+                raise users_not_found_error([user_id])
+            return updated_user
 
         except GoogleAPIError as e:
+            self.user_cache.pop(user_id)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to update user: {str(e)}"
             )
+
+    async def update_password_hash(self, user_id: str, password_hash: str) -> None:
+        """Replace the password hash; the cached profile is dropped and re-read on next use."""
+        self.user_cache.pop(user_id)
+        try:
+            await self.users_collection.document(user_id).update({"passwordHash": password_hash})
+        except NotFound:
+            raise users_not_found_error([user_id])
+        except GoogleAPIError as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to update password: {str(e)}"
+            )
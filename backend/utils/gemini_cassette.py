@@ -0,0 +1,241 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Dict, Any, Optional, List
+
+from google.genai import errors as genai_errors
+
+
+CASSETTE_FILE_PREFIX = "cassette://"
+_USAGE_FIELDS = ("prompt_token_count", "candidates_token_count", "total_token_count")
+
+
+class CassetteMissError(Exception):
+    """Replay mode got a request whose fingerprint is not on the cassette."""
+
+
+def _file_sha(path: str) -> str:
+    if path.startswith(CASSETTE_FILE_PREFIX):
+        return path[len(CASSETTE_FILE_PREFIX):]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _usage(response: Any) -> Optional[Dict[str, Any]]:
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return None
+    return {field: getattr(usage, field, None) for field in _USAGE_FIELDS}
+
+
+class GeminiCassette:
+    """
+    Record/replay layer for Gemini traffic.
+
+    GEMINI_CASSETTE_MODE=record passes calls through and appends one gzip
+    JSON line per call to GEMINI_CASSETTE_PATH: call site, model, request
+    fingerprint, prompt size, response text (or error), token usage and
+    observed latency. Prompts themselves are not stored, but responses
+    (transcripts included) are, so treat cassettes as user data.
+
+    GEMINI_CASSETTE_MODE=replay serves those responses back without network
+    access. Requests with the same fingerprint replay in recorded order, and
+    each call sleeps its recorded latency times GEMINI_CASSETTE_TIME_SCALE
+    (1 = original timing, 0 = instant). Uploaded files are fingerprinted by
+    content hash; replay accepts "cassette://<sha256>" in place of a path.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if getattr(self, "initialized", False):
+            return
+        self.initialized = True
+        self.configure(
+            mode=os.getenv("GEMINI_CASSETTE_MODE", "off"),
+            path=os.getenv("GEMINI_CASSETTE_PATH"),
+            time_scale=float(os.getenv("GEMINI_CASSETTE_TIME_SCALE", "1.0"))
+        )
+
+    def configure(self, mode: str = "off", path: Optional[str] = None, time_scale: float = 1.0) -> None:
+        mode = mode.lower()
+        if mode not in ("off", "record", "replay"):
+            raise ValueError(f"Unknown GEMINI_CASSETTE_MODE '{mode}' (expected off, record or replay)")
+        self.mode = mode
+        self.path = path or os.path.join(tempfile.gettempdir(), "studysurf_gemini.cassette.jsonl.gz")
+        self.time_scale = time_scale
+        self._write_lock = threading.Lock()
+        self._files: Dict[str, str] = {}
+        self._replay: Dict[str, List[Dict[str, Any]]] = {}
+        self._replay_cursor: Dict[str, int] = defaultdict(int)
+        self._recorded = 0
+        self._hits = 0
+        self._misses = 0
+        if mode == "replay":
+            for entry in load_cassette(self.path):
+                self._replay.setdefault(entry["fp"], []).append(entry)
+            print(f"📼 Replaying Gemini traffic from {self.path} ({len(self._replay)} fingerprints)")
+        elif mode == "record":
+            print(f"📼 Recording Gemini traffic to {self.path}")
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "path": self.path if self.enabled else None,
+            "recorded": self._recorded,
+            "replay_hits": self._hits,
+            "replay_misses": self._misses,
+        }
+
+    def _describe_part(self, part: Any) -> Any:
+        if isinstance(part, str):
+            return part
+        name = getattr(part, "name", None)
+        if name in self._files:
+            return f"file:{self._files[name]}"
+        return f"{type(part).__name__}:{name or ''}"
+
+    def fingerprint(self, site: str, model: str, contents: Any, config: Any = None) -> str:
+        parts = contents if isinstance(contents, (list, tuple)) else [contents]
+        system_instruction = getattr(config, "system_instruction", None) if config is not None else None
+        payload = json.dumps({
+            "site": site,
+            "model": model,
+            "contents": [self._describe_part(part) for part in parts],
+            "system": system_instruction if isinstance(system_instruction, str) else None,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        line = (json.dumps(entry, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._write_lock:
+            # One gzip member per line: concatenated members read back as one stream
+            with open(self.path, "ab") as f:
+                f.write(gzip.compress(line))
+            self._recorded += 1
+
+    def _next_recording(self, fp: str, site: str) -> Dict[str, Any]:
+        with self._write_lock:
+            recordings = self._replay.get(fp)
+            if not recordings:
+                self._misses += 1
+                raise CassetteMissError(f"No recorded Gemini response for {site} request {fp}")
+            entry = recordings[self._replay_cursor[fp] % len(recordings)]
+            self._replay_cursor[fp] += 1
+            self._hits += 1
+        if self.time_scale > 0:
+            time.sleep(entry.get("latency", 0.0) * self.time_scale)
+        return entry
+
+    def generate_content(
+        self,
+        client: Any,
+        site: str,
+        model: str,
+        contents: Any,
+        config: Any = None,
+        meta: Optional[Dict[str, Any]] = None
+    ) -> Any:
+        """client.models.generate_content, recorded or replayed according to the mode."""
+        if self.mode == "off":
+            if config is None:
+                return client.models.generate_content(model=model, contents=contents)
+            return client.models.generate_content(model=model, contents=contents, config=config)
+
+        fp = self.fingerprint(site, model, contents, config)
+        if self.mode == "replay":
+            entry = self._next_recording(fp, site)
+            if entry.get("error") is not None:
+                code = entry.get("error_code")
+                if code:
+                    error_class = genai_errors.ClientError if code < 500 else genai_errors.ServerError
+                    raise error_class(code, {"error": {"code": code, "message": entry["error"]}})
+                raise Exception(entry["error"])
+            usage = entry.get("usage") or {}
+            return SimpleNamespace(
+                text=entry.get("text"),
+                usage_metadata=SimpleNamespace(**{field: usage.get(field) for field in _USAGE_FIELDS})
+            )
+
+        parts = contents if isinstance(contents, (list, tuple)) else [contents]
+        entry = {
+            "fp": fp,
+            "site": site,
+            "model": model,
+            "at": time.time(),
+            "prompt_chars": sum(len(part) for part in parts if isinstance(part, str)),
+            "files": [self._files[p.name] for p in parts if getattr(p, "name", None) in self._files],
+        }
+        if meta:
+            entry["meta"] = meta
+        started = time.perf_counter()
+        try:
+            if config is None:
+                response = client.models.generate_content(model=model, contents=contents)
+            else:
+                response = client.models.generate_content(model=model, contents=contents, config=config)
+        except Exception as e:
+            entry.update(latency=time.perf_counter() - started, error=str(e), error_code=getattr(e, "code", None))
+            self._append(entry)
+            raise
+        entry.update(
+            latency=time.perf_counter() - started,
+            text=getattr(response, "text", None),
+            usage=_usage(response)
+        )
+        self._append(entry)
+        return response
+
+    def upload_file(self, client: Any, path: str) -> Any:
+        """client.files.upload; replay returns a placeholder keyed by the file's content hash."""
+        if self.mode == "off":
+            return client.files.upload(file=path)
+
+        sha = _file_sha(path)
+        if self.mode == "replay":
+            self._next_recording(f"upload:{sha}", "files:upload")
+            uploaded = SimpleNamespace(name=f"files/cassette-{sha[:16]}")
+        else:
+            started = time.perf_counter()
+            uploaded = client.files.upload(file=path)
+            self._append({
+                "fp": f"upload:{sha}", "site": "files:upload", "at": time.time(),
+                "latency": time.perf_counter() - started, "bytes": os.path.getsize(path)
+            })
+        self._files[uploaded.name] = sha
+        return uploaded
+
+    def delete_file(self, client: Any, name: str) -> None:
+        self._files.pop(name, None)
+        if self.mode != "replay":
+            client.files.delete(name=name)
+
+
+def load_cassette(path: str) -> List[Dict[str, Any]]:
+    """All entries of a cassette file in recorded order."""
+    entries = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entries.append(json.loads(line))
+    return entries
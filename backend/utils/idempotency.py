@@ -0,0 +1,462 @@
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from utils.auth import get_token_claims
+from utils.tracing import current_span, log_event
+
+
+# Endpoints whose POSTs honour Idempotency-Key (each reruns ffmpeg and/or Gemini)
+IDEMPOTENT_ENDPOINTS = {
+    ("POST", "/api/process-video-complete"),
+    ("POST", "/api/process-video"),
+    ("POST", "/api/extract-audio"),
+    ("POST", "/api/gemini-transcribe"),
+}
+
+_KEY_PATTERN = re.compile(r"[\x21-\x7e]{1,255}")
+
+# A retry's body is read ahead to compare it with the run's; larger bodies spill to disk
+BODY_SPOOL_BYTES = 1024 * 1024
+REPLAY_CHUNK_BYTES = 64 * 1024
+
+# Outcome of claiming a key
+CLAIMED, IN_PROGRESS, COMPLETED, MISMATCH = "claimed", "in_progress", "completed", "mismatch"
+
+
+class StoredResponse:
+    __slots__ = ("status", "content_type", "body")
+
+    def __init__(self, status: int, content_type: str, body: bytes):
+        self.status = status
+        self.content_type = content_type
+        self.body = body
+
+
+class _InFlight:
+    """A run in this process; retries with the same key await its response."""
+
+    def __init__(self, fingerprint: str):
+        loop = asyncio.get_running_loop()
+        self.fingerprint = fingerprint
+        self.future: asyncio.Future = loop.create_future()
+        # SHA-256 of the run's request body once the endpoint has read it (None if it never did)
+        self.body_digest: asyncio.Future = loop.create_future()
+        self.waiters = 0
+
+
+class IdempotencyStore:
+    """
+    Idempotency keys for the pipeline endpoints, stored in SQLite.
+
+    A key is claimed by the first request that uses it (scoped to the
+    caller: user ID from the Bearer token, else a hash of the API key).
+    Retries arriving while that run is in flight attach to it and get the
+    same response; retries after it finished get the stored response until
+    IDEMPOTENCY_TTL_SECONDS pass. Only responses below 400 are kept, so a
+    failed run can be retried; retries attached to a run that ends in a 5xx
+    run the request again rather than getting the error. Reusing a key for a
+    different request (method, path, query or body SHA-256) is rejected
+    with 422.
+
+    Other workers sharing IDEMPOTENCY_STORE_PATH see in-progress claims and
+    poll for the result; a claim not completed within
+    IDEMPOTENCY_LOCK_SECONDS (crashed worker) can be taken over.
+
+    Must be used from the server's event loop.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if getattr(self, "initialized", False):
+            return
+        self.initialized = True
+        self.configure(
+            path=os.getenv("IDEMPOTENCY_STORE_PATH"),
+            ttl_seconds=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400")),
+            lock_seconds=float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "900"))
+        )
+
+    def configure(self, path: Optional[str] = None, ttl_seconds: float = 86400, lock_seconds: float = 900) -> None:
+        self.path = path or os.path.join(tempfile.gettempdir(), "studysurf_idempotency.db")
+        self.ttl_seconds = ttl_seconds
+        self.lock_seconds = lock_seconds
+        self.poll_interval = 0.5
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                scope TEXT NOT NULL,
+                idempotency_key TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                state TEXT NOT NULL,
+                status INTEGER,
+                content_type TEXT,
+                body BLOB,
+                body_digest TEXT,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (scope, idempotency_key)
+            );
+            CREATE INDEX IF NOT EXISTS idx_idempotency_expiry ON idempotency_keys (expires_at);
+        """)
+        # Added after the first release of the schema
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(idempotency_keys)")}
+        if "body_digest" not in columns:
+            self._conn.execute("ALTER TABLE idempotency_keys ADD COLUMN body_digest TEXT")
+        self._conn.commit()
+        self._in_flight: Dict[Tuple[str, str], _InFlight] = {}
+        self._writes_since_prune = 0
+        self._stats = {"claimed": 0, "attached": 0, "replayed": 0, "stored": 0, "mismatched": 0}
+
+    # ---- SQLite (runs on worker threads) ----
+
+    def _claim(self, scope: str, key: str, fingerprint: str) -> Tuple[str, Optional[StoredResponse], Optional[str]]:
+        now = time.time()
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT fingerprint, state, status, content_type, body, expires_at, body_digest FROM idempotency_keys "
+                "WHERE scope = ? AND idempotency_key = ?",
+                (scope, key)
+            ).fetchone()
+            if row is not None and row[5] > now:
+                if row[0] != fingerprint:
+                    return MISMATCH, None, None
+                if row[1] == COMPLETED:
+                    return COMPLETED, StoredResponse(row[2], row[3], zlib.decompress(row[4])), row[6]
+                return IN_PROGRESS, None, None
+            # New key, or an expired result / abandoned claim
+            self._conn.execute(
+                "INSERT OR REPLACE INTO idempotency_keys (scope, idempotency_key, fingerprint, state, expires_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (scope, key, fingerprint, IN_PROGRESS, now + self.lock_seconds)
+            )
+            self._conn.commit()
+            return CLAIMED, None, None
+
+    def _complete(self, scope: str, key: str, response: Optional[StoredResponse],
+                  body_digest: Optional[str] = None) -> None:
+        with self._db_lock:
+            if response is None:
+                self._conn.execute(
+                    "DELETE FROM idempotency_keys WHERE scope = ? AND idempotency_key = ?", (scope, key)
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE idempotency_keys SET state = ?, status = ?, content_type = ?, body = ?, body_digest = ?, "
+                    "expires_at = ? WHERE scope = ? AND idempotency_key = ?",
+                    (COMPLETED, response.status, response.content_type, zlib.compress(response.body, 6),
+                     body_digest, time.time() + self.ttl_seconds, scope, key)
+                )
+            self._writes_since_prune += 1
+            if self._writes_since_prune >= 100:
+                self._writes_since_prune = 0
+                self._conn.execute("DELETE FROM idempotency_keys WHERE expires_at <= ?", (time.time(),))
+            self._conn.commit()
+
+    # ---- request flow ----
+
+    async def begin(self, scope: str, key: str, fingerprint: str,
+                    body_digest: Callable[[], Awaitable[str]]) -> Tuple[str, Any]:
+        """
+        Claim a key or find its run.
+
+        body_digest reads this request's body and returns its SHA-256; it is
+        only called when the key is already in use, to compare with the body
+        of the run that claimed it. The claimer reports its own through
+        record_body_digest() as the endpoint reads the body.
+
+        Returns (CLAIMED, None), (COMPLETED, StoredResponse), (MISMATCH, None),
+        or (IN_PROGRESS, awaitable StoredResponse) for a run started earlier.
+        """
+        local = self._in_flight.get((scope, key))
+        if local is not None:
+            if local.fingerprint != fingerprint or not await self._same_body(local, body_digest):
+                self._stats["mismatched"] += 1
+                return MISMATCH, None
+            self._stats["attached"] += 1
+            return IN_PROGRESS, self._attach(local)
+
+        outcome, stored, stored_digest = await asyncio.to_thread(self._claim, scope, key, fingerprint)
+        if outcome == CLAIMED:
+            self._in_flight[(scope, key)] = _InFlight(fingerprint)
+            self._stats["claimed"] += 1
+            return CLAIMED, None
+        if outcome == COMPLETED and (stored_digest is None or await body_digest() == stored_digest):
+            self._stats["replayed"] += 1
+            return COMPLETED, stored
+        if outcome in (COMPLETED, MISMATCH):
+            self._stats["mismatched"] += 1
+            return MISMATCH, None
+        # Claimed by another request: attach locally if it runs here, else poll for the other worker
+        self._stats["attached"] += 1
+        return IN_PROGRESS, self._poll(scope, key, fingerprint, body_digest)
+
+    async def _same_body(self, run: _InFlight, body_digest: Callable[[], Awaitable[str]]) -> bool:
+        digest = await body_digest()
+        expected = await asyncio.shield(run.body_digest)
+        return expected is None or digest == expected
+
+    def record_body_digest(self, scope: str, key: str, digest: str) -> None:
+        """Called by the claiming run once its endpoint has read the whole request body."""
+        run = self._in_flight.get((scope, key))
+        if run is not None and not run.body_digest.done():
+            run.body_digest.set_result(digest)
+
+    async def _attach(self, run: _InFlight) -> Optional[StoredResponse]:
+        run.waiters += 1
+        try:
+            return await asyncio.shield(run.future)
+        finally:
+            run.waiters -= 1
+
+    async def _poll(self, scope: str, key: str, fingerprint: str,
+                    body_digest: Callable[[], Awaitable[str]]) -> Optional[StoredResponse]:
+        while True:
+            local = self._in_flight.get((scope, key))
+            if local is not None:
+                if not await self._same_body(local, body_digest):
+                    # Claiming again reports the mismatch
+                    return None
+                return await self._attach(local)
+            await asyncio.sleep(self.poll_interval)
+            outcome, stored, stored_digest = await asyncio.to_thread(self._claim, scope, key, fingerprint)
+            if outcome == COMPLETED:
+                if stored_digest is not None and await body_digest() != stored_digest:
+                    return None
+                return stored
+            if outcome == CLAIMED:
+                # The other run failed or was abandoned; this request has to run after all
+                await asyncio.to_thread(self._complete, scope, key, None)
+                return None
+            if outcome == MISMATCH:
+                return None
+
+    async def finish(self, scope: str, key: str, response: Optional[StoredResponse]) -> None:
+        """
+        Store the run's response (kept only below 400) and hand it to attached
+        requests. A 5xx releases the key: attached requests get None and run
+        the request again.
+        """
+        run = self._in_flight.pop((scope, key), None)
+        keep = response if response is not None and response.status < 400 else None
+        digest = run.body_digest.result() if run is not None and run.body_digest.done() else None
+        try:
+            await asyncio.to_thread(self._complete, scope, key, keep, digest)
+            if keep is not None:
+                self._stats["stored"] += 1
+        finally:
+            if run is not None:
+                if not run.body_digest.done():
+                    run.body_digest.set_result(None)
+                if not run.future.done():
+                    run.future.set_result(response if response is not None and response.status < 500 else None)
+
+    def waiters(self, scope: str, key: str) -> int:
+        """Requests currently attached to an in-flight run."""
+        run = self._in_flight.get((scope, key))
+        return run.waiters if run is not None else 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "ttl_seconds": self.ttl_seconds,
+            "in_flight": len(self._in_flight),
+            "attached_waiters": sum(run.waiters for run in self._in_flight.values()),
+            **{f"{name}_total": count for name, count in self._stats.items()},
+        }
+
+
+def request_scope(headers: Dict[str, str]) -> Optional[str]:
+    """Who an idempotency key belongs to: the token's user, else the API key (hashed)."""
+    claims = get_token_claims(headers.get("authorization"))
+    if claims and claims.get("user_id"):
+        return f"user:{claims['user_id']}"
+    api_key = headers.get("x-api-key")
+    if api_key:
+        return f"api_key:{hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:32]}"
+    return None
+
+
+def request_fingerprint(scope: Dict[str, Any], headers: Dict[str, str]) -> str:
+    """
+    Identity of a request for key reuse checks, apart from its body: that is
+    hashed as it streams in and compared separately (see IdempotencyStore.begin).
+    """
+    parts = [scope.get("method", ""), scope.get("path", ""),
+             scope.get("query_string", b"").decode("latin-1"), headers.get("content-length", "")]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()[:32]
+
+
+class _BodyDisconnected(Exception):
+    """The client went away while its body was being read ahead."""
+
+
+class _RequestBody:
+    """
+    A request body that may be read ahead of the endpoint to hash it. Once
+    read, it is spooled (to disk beyond BODY_SPOOL_BYTES) and replayed to the
+    endpoint; otherwise receive() passes straight through.
+    """
+
+    def __init__(self, receive):
+        self._receive = receive
+        self._file = None
+        self._digest: Optional[str] = None
+        self._size = 0
+        self._replayed = False
+
+    def _in_memory(self) -> bool:
+        return not getattr(self._file, "_rolled", True)
+
+    async def digest(self) -> str:
+        if self._digest is None:
+            self._file = tempfile.SpooledTemporaryFile(max_size=BODY_SPOOL_BYTES)
+            sha = hashlib.sha256()
+            while True:
+                message = await self._receive()
+                if message["type"] == "http.disconnect":
+                    raise _BodyDisconnected()
+                chunk = message.get("body", b"")
+                sha.update(chunk)
+                if self._in_memory():
+                    self._file.write(chunk)
+                else:
+                    await asyncio.to_thread(self._file.write, chunk)
+                self._size += len(chunk)
+                if not message.get("more_body", False):
+                    break
+            self._file.seek(0)
+            self._digest = sha.hexdigest()
+        return self._digest
+
+    async def receive(self):
+        if self._digest is None or self._replayed:
+            return await self._receive()
+        if self._in_memory():
+            chunk = self._file.read(REPLAY_CHUNK_BYTES)
+        else:
+            chunk = await asyncio.to_thread(self._file.read, REPLAY_CHUNK_BYTES)
+        self._replayed = self._file.tell() >= self._size
+        return {"type": "http.request", "body": chunk, "more_body": not self._replayed}
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+
+class IdempotencyMiddleware:
+    """
+    Pure ASGI middleware applying Idempotency-Key to IDEMPOTENT_ENDPOINTS.
+
+    Sits outside admission control, so retries that attach to a running
+    pipeline or replay a stored result never take a pipeline slot.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.store = IdempotencyStore()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (scope.get("method"), scope.get("path")) not in IDEMPOTENT_ENDPOINTS:
+            await self.app(scope, receive, send)
+            return
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        key = headers.get("idempotency-key", "").strip()
+        owner = request_scope(headers) if key else None
+        if not key or owner is None:
+            await self.app(scope, receive, send)
+            return
+        if not _KEY_PATTERN.fullmatch(key):
+            await _send(send, StoredResponse(400, "application/json", b'{"detail":"Invalid Idempotency-Key"}'))
+            return
+
+        span = current_span()
+        body = _RequestBody(receive)
+        try:
+            while True:
+                outcome, result = await self.store.begin(owner, key, request_fingerprint(scope, headers), body.digest)
+                if span is not None:
+                    span.set_attribute("idempotency.outcome", outcome)
+                if outcome == MISMATCH:
+                    await _send(send, StoredResponse(
+                        422, "application/json",
+                        b'{"detail":"Idempotency-Key was already used for a different request"}'
+                    ))
+                    return
+                if outcome == COMPLETED:
+                    await _send(send, result, replayed=True)
+                    return
+                if outcome == IN_PROGRESS:
+                    response = await result
+                    if response is not None:
+                        await _send(send, response, replayed=True)
+                        return
+                    # The run we attached to failed or produced nothing; claim the key again
+                    continue
+                break
+
+            await self._run(scope, body.receive, send, owner, key)
+        except _BodyDisconnected:
+            log_event("idempotent_retry_disconnected", path=scope.get("path"))
+        finally:
+            body.close()
+
+    async def _run(self, scope, receive, send, owner: str, key: str) -> None:
+        captured = {"status": None, "content_type": "application/json", "chunks": []}
+        # Lets disconnect handling keep the run going while retries wait on it
+        scope.setdefault("state", {})["idempotency_waiters"] = lambda: self.store.waiters(owner, key)
+        sha = hashlib.sha256()
+
+        async def hashing_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                sha.update(message.get("body", b""))
+                if not message.get("more_body", False):
+                    self.store.record_body_digest(owner, key, sha.hexdigest())
+            return message
+
+        async def capturing_send(message):
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+                for name, value in message.get("headers", []):
+                    if name.lower() == b"content-type":
+                        captured["content_type"] = value.decode("latin-1")
+            elif message["type"] == "http.response.body":
+                captured["chunks"].append(message.get("body", b""))
+            await send(message)
+
+        response = None
+        try:
+            await self.app(scope, hashing_receive, capturing_send)
+            if captured["status"] is not None:
+                response = StoredResponse(captured["status"], captured["content_type"], b"".join(captured["chunks"]))
+        finally:
+            await self.store.finish(owner, key, response)
+            log_event("idempotent_run_finished", status=captured["status"], stored=bool(response and response.status < 400))
+
+
+async def _send(send, response: StoredResponse, replayed: bool = False) -> None:
+    headers = [
+        (b"content-type", response.content_type.encode("latin-1")),
+        (b"content-length", str(len(response.body)).encode("latin-1")),
+    ]
+    if replayed:
+        headers.append((b"idempotent-replayed", b"true"))
+    await send({"type": "http.response.start", "status": response.status, "headers": headers})
+    await send({"type": "http.response.body", "body": response.body})
@@ -0,0 +1,471 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import uuid
+import zlib
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, Any, Optional, List
+
+import orjson
+
+
+# Firestore rejects documents over 1 MiB; keep each stored blob well below it
+MAX_INLINE_BYTES = 900 * 1024
+# Firestore commits are capped at 500 writes and 10 MiB
+MAX_BATCH_WRITES = 500
+CHUNKS_PER_BATCH = 8
+
+
+def _serialize(payload: Any) -> bytes:
+    return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+
+
+def encode_payload(payload: Any) -> bytes:
+    """Serialize and zlib-compress a stored payload."""
+    return zlib.compress(_serialize(payload), 6)
+
+
+def decode_payload(blob: bytes) -> Any:
+    return orjson.loads(zlib.decompress(blob))
+
+
+def payload_etag(payload: Any) -> str:
+    """Content hash of a payload; identical payloads always get the same tag."""
+    return hashlib.sha256(_serialize(payload)).hexdigest()[:32]
+
+
+def _lecture_summary(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    educational_analysis = (analysis.get("gemini_analysis") or {}).get("educational_analysis") or {}
+    return {
+        "subject": educational_analysis.get("subject"),
+        "topic": educational_analysis.get("topic"),
+    }
+
+
+class LectureStore(ABC):
+    """
+    Persistence for processed lectures.
+
+    Each pipeline run becomes a lecture record (analysis, work orders and the
+    user context it was generated for) plus one document per learning format.
+    Payloads are stored zlib-compressed. Lecture records are returned as
+    dicts with lectureId, userId, generationMode, subject, topic, userContext,
+    analysis, createdAt and updatedAt.
+
+    Every stored format carries an ETag (payload_etag) and every write to a
+    lecture or one of its formats bumps the lecture's changedAt, so clients
+    can revalidate and sync without downloading payloads.
+    """
+
+    @abstractmethod
+    async def create_lecture(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Persist a new lecture record and return it with its generated ID."""
+
+    @abstractmethod
+    async def get_lecture(self, lecture_id: str) -> Optional[Dict[str, Any]]:
+        """Get a full lecture record by ID."""
+
+    @abstractmethod
+    async def update_lecture(self, lecture_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Merge top-level fields into a lecture record."""
+
+    @abstractmethod
+    async def list_lectures(self, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """A user's lectures, newest first, without the analysis payload."""
+
+    @abstractmethod
+    async def list_changes(
+        self, user_id: str, since: str, limit: int = 200, after_id: str = ""
+    ) -> List[Dict[str, Any]]:
+        """
+        A user's lectures changed after the cursor, oldest change first.
+
+        The cursor is (since, after_id): a lecture is returned if it changed
+        after `since` (ISO timestamp), or exactly at `since` with a lecture ID
+        greater than `after_id`, so changes sharing a timestamp are never skipped.
+        """
+
+    @abstractmethod
+    async def save_format(self, lecture_id: str, format_name: str, payload: Dict[str, Any]) -> str:
+        """Store the generated payload for one learning format and return its ETag."""
+
+    @abstractmethod
+    async def get_format(self, lecture_id: str, format_name: str) -> Optional[Dict[str, Any]]:
+        """Get a stored learning format, or None if it has not been generated yet."""
+
+    @abstractmethod
+    async def get_format_etag(self, lecture_id: str, format_name: str) -> Optional[str]:
+        """ETag of a stored format without loading its payload."""
+
+    @abstractmethod
+    async def list_formats(self, lecture_id: str) -> List[str]:
+        """Names of the formats already generated for a lecture."""
+
+    @abstractmethod
+    async def list_format_etags(self, lecture_id: str) -> Dict[str, str]:
+        """Format name -> ETag for every stored format of a lecture."""
+
+    @staticmethod
+    def _new_record(record: Dict[str, Any]) -> Dict[str, Any]:
+        timestamp = datetime.utcnow().isoformat()
+        lecture = dict(record)
+        lecture.update(_lecture_summary(lecture.get("analysis") or {}))
+        lecture.update({
+            "lectureId": str(uuid.uuid4()),
+            "createdAt": timestamp,
+            "updatedAt": timestamp,
+        })
+        return lecture
+
+
+class LocalLectureStore(LectureStore):
+    """
+    SQLite-backed lecture store for local development, tests and benchmarks.
+
+    Uses one database file (LECTURE_STORE_PATH) in WAL mode; calls run on a
+    worker thread so the event loop never blocks on disk.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv(
+            "LECTURE_STORE_PATH", os.path.join(tempfile.gettempdir(), "studysurf_lectures.db")
+        )
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS lectures (
+                lecture_id TEXT PRIMARY KEY,
+                user_id TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                body BLOB NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_lectures_user ON lectures (user_id, created_at);
+            CREATE TABLE IF NOT EXISTS lecture_formats (
+                lecture_id TEXT NOT NULL,
+                format_name TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                payload BLOB NOT NULL,
+                PRIMARY KEY (lecture_id, format_name)
+            );
+        """)
+        # Columns added after the first release of the schema
+        self._ensure_column("lectures", "changed_at", "TEXT")
+        self._ensure_column("lecture_formats", "etag", "TEXT")
+        # Rows written before changed_at existed would never show up in the changes feed
+        self._conn.execute("""
+            UPDATE lectures SET changed_at = MAX(updated_at, COALESCE(
+                (SELECT MAX(f.updated_at) FROM lecture_formats AS f WHERE f.lecture_id = lectures.lecture_id),
+                updated_at
+            )) WHERE changed_at IS NULL
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_lectures_changes ON lectures (user_id, changed_at)")
+        self._conn.commit()
+
+    def _ensure_column(self, table: str, column: str, declaration: str) -> None:
+        columns = {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+            self._conn.commit()
+            return rows
+
+    async def _run(self, sql: str, params: tuple = ()) -> List[tuple]:
+        return await asyncio.to_thread(self._execute, sql, params)
+
+    async def create_lecture(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        lecture = self._new_record(record)
+        await self._run(
+            "INSERT INTO lectures (lecture_id, user_id, created_at, updated_at, changed_at, body) VALUES (?, ?, ?, ?, ?, ?)",
+            (lecture["lectureId"], lecture.get("userId"), lecture["createdAt"], lecture["updatedAt"],
+             lecture["updatedAt"], encode_payload(lecture))
+        )
+        return lecture
+
+    async def get_lecture(self, lecture_id: str) -> Optional[Dict[str, Any]]:
+        rows = await self._run("SELECT body FROM lectures WHERE lecture_id = ?", (lecture_id,))
+        return decode_payload(rows[0][0]) if rows else None
+
+    async def update_lecture(self, lecture_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        lecture = await self.get_lecture(lecture_id)
+        if lecture is None:
+            return None
+        lecture.update(fields)
+        lecture["updatedAt"] = datetime.utcnow().isoformat()
+        await self._run(
+            "UPDATE lectures SET user_id = ?, updated_at = ?, changed_at = ?, body = ? WHERE lecture_id = ?",
+            (lecture.get("userId"), lecture["updatedAt"], lecture["updatedAt"], encode_payload(lecture), lecture_id)
+        )
+        return lecture
+
+    async def list_lectures(self, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        rows = await self._run(
+            "SELECT body FROM lectures WHERE user_id = ? ORDER BY created_at DESC LIMIT ?",
+            (user_id, limit)
+        )
+        lectures = []
+        for (body,) in rows:
+            lecture = decode_payload(body)
+            lecture.pop("analysis", None)
+            lectures.append(lecture)
+        return lectures
+
+    async def list_changes(
+        self, user_id: str, since: str, limit: int = 200, after_id: str = ""
+    ) -> List[Dict[str, Any]]:
+        rows = await self._run(
+            "SELECT l.lecture_id, l.changed_at, f.format_name, f.etag FROM "
+            "(SELECT lecture_id, changed_at FROM lectures WHERE user_id = ? "
+            "AND (changed_at > ? OR (changed_at = ? AND lecture_id > ?)) "
+            "ORDER BY changed_at, lecture_id LIMIT ?) AS l "
+            "LEFT JOIN lecture_formats AS f ON f.lecture_id = l.lecture_id ORDER BY l.changed_at, l.lecture_id",
+            (user_id, since, since, after_id, limit)
+        )
+        changes: Dict[str, Dict[str, Any]] = {}
+        for lecture_id, changed_at, format_name, etag in rows:
+            change = changes.setdefault(lecture_id, {"lectureId": lecture_id, "changedAt": changed_at, "formats": {}})
+            if format_name:
+                change["formats"][format_name] = etag
+        return list(changes.values())
+
+    def _save_format(self, lecture_id: str, format_name: str, payload: Dict[str, Any]) -> str:
+        timestamp = datetime.utcnow().isoformat()
+        etag = payload_etag(payload)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO lecture_formats (lecture_id, format_name, updated_at, etag, payload) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (lecture_id, format_name, timestamp, etag, encode_payload(payload))
+            )
+            self._conn.execute("UPDATE lectures SET changed_at = ? WHERE lecture_id = ?", (timestamp, lecture_id))
+            self._conn.commit()
+        return etag
+
+    async def save_format(self, lecture_id: str, format_name: str, payload: Dict[str, Any]) -> str:
+        return await asyncio.to_thread(self._save_format, lecture_id, format_name, payload)
+
+    async def get_format(self, lecture_id: str, format_name: str) -> Optional[Dict[str, Any]]:
+        rows = await self._run(
+            "SELECT payload FROM lecture_formats WHERE lecture_id = ? AND format_name = ?",
+            (lecture_id, format_name)
+        )
+        return decode_payload(rows[0][0]) if rows else None
+
+    async def get_format_etag(self, lecture_id: str, format_name: str) -> Optional[str]:
+        rows = await self._run(
+            "SELECT etag FROM lecture_formats WHERE lecture_id = ? AND format_name = ?",
+            (lecture_id, format_name)
+        )
+        return rows[0][0] if rows else None
+
+    async def list_formats(self, lecture_id: str) -> List[str]:
+        rows = await self._run(
+            "SELECT format_name FROM lecture_formats WHERE lecture_id = ? ORDER BY format_name",
+            (lecture_id,)
+        )
+        return [row[0] for row in rows]
+
+    async def list_format_etags(self, lecture_id: str) -> Dict[str, str]:
+        rows = await self._run(
+            "SELECT format_name, etag FROM lecture_formats WHERE lecture_id = ? ORDER BY format_name",
+            (lecture_id,)
+        )
+        return dict(rows)
+
+
+class FirestoreLectureStore(LectureStore):
+    """
+    Firestore-backed lecture store.
+
+    Lectures live in FIRESTORE_LECTURES_COLLECTION with a "formats"
+    subcollection. Payloads are stored as compressed blobs; anything still
+    over MAX_INLINE_BYTES after compression is split across a "chunks"
+    subcollection so no document crosses Firestore's 1 MiB limit.
+    """
+
+    def __init__(self):
+        from google.cloud import firestore
+
+        self._firestore = firestore
+        self.db = firestore.AsyncClient(project=os.getenv("GCP_PROJECT_ID"))
+        self.lectures_collection = self.db.collection(
+            os.getenv("FIRESTORE_LECTURES_COLLECTION", "study_surf_lectures")
+        )
+
+    def _chunk_ref(self, doc_ref, data: Dict[str, Any], index: int):
+        # Documents written before chunk generations existed use bare indexes
+        generation = data.get("chunkGeneration")
+        name = f"{generation}-{index}" if generation else str(index)
+        return doc_ref.collection("chunks").document(name)
+
+    async def _write_blob(self, doc_ref, fields: Dict[str, Any], blob: bytes) -> None:
+        """
+        Write fields plus a compressed blob, chunking it when too large.
+
+        Chunks go under a fresh generation that nothing references yet; the
+        parent document is then switched to that generation in a transaction,
+        so readers see either the old payload or the new one, never a mix.
+        Chunks of the replaced generation are deleted afterwards.
+        """
+        chunks = []
+        generation = None
+        if len(blob) > MAX_INLINE_BYTES:
+            chunks = [blob[i:i + MAX_INLINE_BYTES] for i in range(0, len(blob), MAX_INLINE_BYTES)]
+            generation = uuid.uuid4().hex
+            target = {"chunkGeneration": generation}
+            # Each commit is capped at 10 MiB, so chunks are spread over several batches
+            for start in range(0, len(chunks), CHUNKS_PER_BATCH):
+                batch = self.db.batch()
+                for index in range(start, min(start + CHUNKS_PER_BATCH, len(chunks))):
+                    batch.set(self._chunk_ref(doc_ref, target, index), {"data": chunks[index]})
+                await batch.commit()
+
+        parent = dict(fields, payload=b"" if chunks else blob, chunkCount=len(chunks), chunkGeneration=generation)
+        transaction = self.db.transaction()
+
+        @self._firestore.async_transactional
+        async def switch_generation(transaction):
+            snapshot = await doc_ref.get(transaction=transaction)
+            transaction.set(doc_ref, parent)
+            return snapshot.to_dict() if snapshot.exists else {}
+
+        try:
+            previous = await switch_generation(transaction)
+        except Exception:
+            await self._delete_chunks(doc_ref, {"chunkGeneration": generation}, len(chunks))
+            raise
+        if previous.get("chunkCount") and previous.get("chunkGeneration") != generation:
+            await self._delete_chunks(doc_ref, previous, previous["chunkCount"])
+
+    async def _delete_chunks(self, doc_ref, data: Dict[str, Any], chunk_count: int) -> None:
+        for start in range(0, chunk_count, MAX_BATCH_WRITES):
+            batch = self.db.batch()
+            for index in range(start, min(start + MAX_BATCH_WRITES, chunk_count)):
+                batch.delete(self._chunk_ref(doc_ref, data, index))
+            await batch.commit()
+
+    async def _read_blob(self, doc_ref, data: Dict[str, Any]) -> bytes:
+        for _ in range(2):
+            chunk_count = data.get("chunkCount", 0)
+            if not chunk_count:
+                return data["payload"]
+            chunks = await asyncio.gather(*[
+                self._chunk_ref(doc_ref, data, index).get() for index in range(chunk_count)
+            ])
+            if all(chunk.exists for chunk in chunks):
+                return b"".join(chunk.to_dict()["data"] for chunk in chunks)
+            # A concurrent write replaced this generation; follow the parent to the new one
+            data = (await doc_ref.get()).to_dict() or {}
+        raise RuntimeError(f"Chunks for {doc_ref.path} changed while reading")
+
+    def _index_fields(self, lecture: Dict[str, Any]) -> Dict[str, Any]:
+        """Queryable fields kept uncompressed next to the blob."""
+        return {
+            "lectureId": lecture["lectureId"],
+            "userId": lecture.get("userId"),
+            "subject": lecture.get("subject"),
+            "topic": lecture.get("topic"),
+            "generationMode": lecture.get("generationMode"),
+            "createdAt": lecture["createdAt"],
+            "updatedAt": lecture["updatedAt"],
+            "changedAt": lecture["updatedAt"],
+        }
+
+    async def create_lecture(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        lecture = self._new_record(record)
+        doc_ref = self.lectures_collection.document(lecture["lectureId"])
+        await self._write_blob(doc_ref, self._index_fields(lecture), encode_payload(lecture))
+        return lecture
+
+    async def get_lecture(self, lecture_id: str) -> Optional[Dict[str, Any]]:
+        doc_ref = self.lectures_collection.document(lecture_id)
+        doc = await doc_ref.get()
+        if not doc.exists:
+            return None
+        return decode_payload(await self._read_blob(doc_ref, doc.to_dict()))
+
+    async def update_lecture(self, lecture_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        lecture = await self.get_lecture(lecture_id)
+        if lecture is None:
+            return None
+        lecture.update(fields)
+        lecture["updatedAt"] = datetime.utcnow().isoformat()
+        doc_ref = self.lectures_collection.document(lecture_id)
+        await self._write_blob(doc_ref, self._index_fields(lecture), encode_payload(lecture))
+        return lecture
+
+    async def list_lectures(self, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        # Only the uncompressed index fields are needed for a listing
+        query = (
+            self.lectures_collection
+            .where("userId", "==", user_id)
+            .order_by("createdAt", direction="DESCENDING")
+            .limit(limit)
+            .select(["lectureId", "userId", "subject", "topic", "generationMode", "createdAt", "updatedAt"])
+        )
+        return [doc.to_dict() async for doc in query.stream()]
+
+    async def list_changes(
+        self, user_id: str, since: str, limit: int = 200, after_id: str = ""
+    ) -> List[Dict[str, Any]]:
+        query = (
+            self.lectures_collection
+            .where("userId", "==", user_id)
+            .order_by("changedAt")
+            .order_by("lectureId")
+            .start_after({"changedAt": since, "lectureId": after_id})
+            .limit(limit)
+            .select(["lectureId", "changedAt"])
+        )
+        lectures = [doc.to_dict() async for doc in query.stream()]
+        etags = await asyncio.gather(*[self.list_format_etags(l["lectureId"]) for l in lectures])
+        return [dict(lecture, formats=formats) for lecture, formats in zip(lectures, etags)]
+
+    async def save_format(self, lecture_id: str, format_name: str, payload: Dict[str, Any]) -> str:
+        timestamp = datetime.utcnow().isoformat()
+        etag = payload_etag(payload)
+        lecture_ref = self.lectures_collection.document(lecture_id)
+        doc_ref = lecture_ref.collection("formats").document(format_name)
+        fields = {"formatName": format_name, "updatedAt": timestamp, "etag": etag}
+        await self._write_blob(doc_ref, fields, encode_payload(payload))
+        await lecture_ref.update({"changedAt": timestamp})
+        return etag
+
+    async def get_format(self, lecture_id: str, format_name: str) -> Optional[Dict[str, Any]]:
+        doc_ref = self.lectures_collection.document(lecture_id).collection("formats").document(format_name)
+        doc = await doc_ref.get()
+        if not doc.exists:
+            return None
+        return decode_payload(await self._read_blob(doc_ref, doc.to_dict()))
+
+    async def get_format_etag(self, lecture_id: str, format_name: str) -> Optional[str]:
+        doc_ref = self.lectures_collection.document(lecture_id).collection("formats").document(format_name)
+        doc = await doc_ref.get(field_paths=["etag"])
+        return doc.to_dict().get("etag") if doc.exists else None
+
+    async def list_formats(self, lecture_id: str) -> List[str]:
+        formats = self.lectures_collection.document(lecture_id).collection("formats")
+        return sorted([doc.id async for doc in formats.select(["formatName"]).stream()])
+
+    async def list_format_etags(self, lecture_id: str) -> Dict[str, str]:
+        formats = self.lectures_collection.document(lecture_id).collection("formats")
+        return {doc.id: doc.to_dict().get("etag") async for doc in formats.select(["etag"]).stream()}
+
+
+def create_lecture_store() -> LectureStore:
+    """Select the lecture store backend from LECTURE_STORE_BACKEND (local | firestore)."""
+    backend = os.getenv("LECTURE_STORE_BACKEND", "local").lower()
+    if backend == "firestore":
+        return FirestoreLectureStore()
+    if backend == "local":
+        return LocalLectureStore()
+    raise ValueError(f"Unknown LECTURE_STORE_BACKEND '{backend}' (expected local or firestore)")
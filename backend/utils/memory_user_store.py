@@ -0,0 +1,76 @@
+import asyncio
+import copy
+import os
+import uuid
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from utils.user_store import (
+    UserStore, build_user_item, preference_update_data, merge_update, username_taken_error, users_not_found_error
+)
+
+
+class InMemoryUserStore(UserStore):
+    """
+    In-process user store with the same semantics as FirestoreClient.
+
+    Used to load-test the auth and profile paths without a live project.
+    MEMORY_STORE_LATENCY_MS adds a simulated round trip to every call.
+    """
+
+    def __init__(self):
+        self.latency = float(os.getenv("MEMORY_STORE_LATENCY_MS", "0")) / 1000
+        self._users: Dict[str, Dict[str, Any]] = {}
+        self._usernames: Dict[str, str] = {}
+        self._lock = asyncio.Lock()
+        self.reads = 0
+        self.writes = 0
+
+    async def _round_trip(self) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", "users": len(self._users), "reads": self.reads, "writes": self.writes}
+
+    async def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
+        await self._round_trip()
+        user_id = str(uuid.uuid4())
+        item = build_user_item(user_data, user_id, datetime.utcnow().isoformat())
+        async with self._lock:
+            if user_data["username"] in self._usernames:
+                raise username_taken_error()
+            self._usernames[user_data["username"]] = user_id
+            self._users[user_id] = copy.deepcopy(item)
+            self.writes += 1
+        return item
+
+    async def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+        user_id = self._usernames.get(username)
+        if user_id is None:
+            await self._round_trip()
+            return None
+        return await self.get_user_by_id(user_id)
+
+    async def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        await self._round_trip()
+        self.reads += 1
+        user = self._users.get(user_id)
+        return copy.deepcopy(user) if user is not None else None
+
+    async def update_user_preferences(self, user_id: str, preferences: Dict[str, Any]) -> Dict[str, Any]:
+        await self._round_trip()
+        async with self._lock:
+            if user_id not in self._users:
+                raise users_not_found_error([user_id])
+            self._users[user_id] = merge_update(self._users[user_id], preference_update_data(preferences))
+            self.writes += 1
+            return copy.deepcopy(self._users[user_id])
+
+    async def update_password_hash(self, user_id: str, password_hash: str) -> None:
+        await self._round_trip()
+        async with self._lock:
+            if user_id not in self._users:
+                raise users_not_found_error([user_id])
+            self._users[user_id]["passwordHash"] = password_hash
+            self.writes += 1
@@ -0,0 +1,170 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Optional
+
+import bcrypt
+from fastapi import HTTPException, status
+
+from utils.tracing import log_event
+
+
+DEFAULT_BCRYPT_ROUNDS = 12
+
+
+def _hash_password(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _verify_password(password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(password.encode("utf-8"), hashed_password.encode("utf-8"))
+
+
+def hash_cost(hashed_password: str) -> Optional[int]:
+    """Cost factor of a bcrypt hash ("$2b$12$..." -> 12), or None if unparseable."""
+    parts = hashed_password.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def _percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))], 4)
+
+
+class PasswordHashPool:
+    """
+    Runs bcrypt on a bounded process pool so login bursts don't hold the GIL
+    of the serving process.
+
+    Submissions beyond pool size + BCRYPT_MAX_QUEUE are rejected with a 503
+    instead of queueing without bound. BCRYPT_POOL_SIZE=0 runs bcrypt on a
+    worker thread instead (for runtimes without multiprocessing, e.g. Lambda).
+    Workers are spawned, so they re-import the __main__ script: serve with
+    `uvicorn main:app` rather than `python main.py`.
+
+    Must be used from the server's event loop.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if getattr(self, "initialized", False):
+            return
+        self.initialized = True
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.configure(
+            pool_size=int(os.getenv("BCRYPT_POOL_SIZE", str(min(4, os.cpu_count() or 1)))),
+            rounds=int(os.getenv("BCRYPT_ROUNDS", str(DEFAULT_BCRYPT_ROUNDS))),
+            max_queue=int(os.getenv("BCRYPT_MAX_QUEUE", "64"))
+        )
+
+    def configure(self, pool_size: int, rounds: int, max_queue: int = 64) -> None:
+        """(Re)size the pool; running work on a replaced executor finishes in the background."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._executor = None
+        self.pool_size = max(0, pool_size)
+        self.rounds = rounds
+        self.max_queue = max_queue
+        self._in_flight = 0
+        self._rejected = 0
+        self._completed = 0
+        self._waits = deque(maxlen=512)
+        self._run_times = deque(maxlen=512)
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.pool_size and self._executor is None:
+            try:
+                # spawn: forking a process that already runs an event loop and threads is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.pool_size, mp_context=multiprocessing.get_context("spawn")
+                )
+            except (OSError, NotImplementedError) as e:
+                log_event("bcrypt_pool_unavailable", "warning", error=str(e), fallback="threads")
+                self.pool_size = 0
+        return self._executor
+
+    async def _run(self, fn, *args):
+        capacity = max(1, self.pool_size) + self.max_queue
+        if self._in_flight >= capacity:
+            self._rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication is busy, please retry",
+                headers={"Retry-After": "1"}
+            )
+
+        self._in_flight += 1
+        submitted_at = time.monotonic()
+        try:
+            executor = self._get_executor()
+            timed = _TimedCall(fn)
+            if executor is not None:
+                result, started_at, finished_at = await asyncio.get_running_loop().run_in_executor(
+                    executor, timed, *args
+                )
+            else:
+                result, started_at, finished_at = await asyncio.to_thread(timed, *args)
+        finally:
+            self._in_flight -= 1
+
+        # time.time() is comparable across processes, monotonic clocks are not
+        wall_submitted = time.time() - (time.monotonic() - submitted_at)
+        self._waits.append(max(0.0, started_at - wall_submitted))
+        self._run_times.append(finished_at - started_at)
+        self._completed += 1
+        return result
+
+    async def hash_password(self, password: str) -> str:
+        return await self._run(_hash_password, password, self.rounds)
+
+    async def verify_password(self, password: str, hashed_password: str) -> bool:
+        return await self._run(_verify_password, password, hashed_password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """True if a stored hash was made with a different cost factor than configured."""
+        return hash_cost(hashed_password) != self.rounds
+
+    def get_stats(self) -> Dict[str, Any]:
+        capacity = max(1, self.pool_size) + self.max_queue
+        return {
+            "mode": "process" if self.pool_size else "thread",
+            "pool_size": self.pool_size,
+            "rounds": self.rounds,
+            "in_flight": self._in_flight,
+            "queue_depth": max(0, self._in_flight - max(1, self.pool_size)),
+            "queue_capacity": capacity,
+            "completed_total": self._completed,
+            "rejected_total": self._rejected,
+            "wait_p50_s": _percentile(self._waits, 0.5),
+            "wait_p95_s": _percentile(self._waits, 0.95),
+            "run_p50_s": _percentile(self._run_times, 0.5),
+            "run_p95_s": _percentile(self._run_times, 0.95),
+        }
+
+
+class _TimedCall:
+    """Picklable wrapper returning (result, start, end) wall times measured in the worker."""
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def __call__(self, *args):
+        started_at = time.time()
+        result = self.fn(*args)
+        return result, started_at, time.time()
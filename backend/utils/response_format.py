@@ -0,0 +1,233 @@
+import hashlib
+import time
+from typing import Dict, Any, List, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import ORJSONResponse, Response
+
+from utils.stage_timer import current_timer
+
+
+RESPONSE_FORMAT_VERSIONS = ("v1", "v2")
+
+# Stored content is per user and can change (re-personalization), so browsers
+# keep it but must revalidate with If-None-Match on every use
+CONTENT_CACHE_CONTROL = "private, no-cache"
+
+# Top-level keys of complete-pipeline responses per version (fields= is checked against them)
+RESPONSE_FIELDS = {
+    "v1": ("pipeline", "lecture_id", "extraction", "gemini_analysis", "content_generation",
+           "processing_summary", "timings"),
+    "v2": ("format_version", "pipeline", "lecture_id", "extraction", "analysis", "agents", "agent_status",
+           "learning_formats", "orchestration_summary", "processing_summary", "timings"),
+}
+
+_MISSING = object()
+
+
+def build_slim_response(full: Dict[str, Any], format_mapping: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Convert a v1 complete-pipeline response into the deduplicated v2 format.
+
+    v1 stores every agent payload twice (content_generation.content and
+    content_generation.learning_formats) and nests the analysis as
+    gemini_analysis.gemini_analysis. v2 keeps each payload once under
+    "agents", has learning_formats point at it with {"$ref": "agents.<name>"},
+    and flattens the analysis. format_mapping maps format names to agent names.
+    """
+    analysis = dict(full.get("gemini_analysis") or {})
+    analysis_body = analysis.pop("gemini_analysis", {}) or {}
+    content_generation = full.get("content_generation") or {}
+    agent_results = content_generation.get("content") or {}
+
+    agents = {}
+    agent_status = {}
+    for agent_name, entry in agent_results.items():
+        agents[agent_name] = entry.get("content", entry.get("fallback_content"))
+        agent_status[agent_name] = {k: v for k, v in entry.items() if k not in ("content", "fallback_content")}
+
+    learning_formats = {}
+    for format_name, entry in (content_generation.get("learning_formats") or {}).items():
+        agent_name = format_mapping.get(format_name)
+        if agent_name in agents:
+            learning_formats[format_name] = {"status": entry.get("status"), "$ref": f"agents.{agent_name}"}
+        else:
+            learning_formats[format_name] = entry
+
+    slim = {
+        "format_version": "v2",
+        "pipeline": full.get("pipeline"),
+        "lecture_id": full.get("lecture_id"),
+        "extraction": full.get("extraction"),
+        "analysis": dict(analysis_body, **analysis),
+        "agents": agents,
+        "agent_status": agent_status,
+        "learning_formats": learning_formats,
+        "orchestration_summary": content_generation.get("orchestration_summary"),
+        "processing_summary": full.get("processing_summary"),
+    }
+    # Keep any extra top-level keys (e.g. timings) that later stages add
+    for key, value in full.items():
+        if key not in ("gemini_analysis", "content_generation") and key not in slim:
+            slim[key] = value
+    return slim
+
+
+def _lookup(data: Any, path: List[str]) -> Any:
+    for part in path:
+        if not isinstance(data, dict) or part not in data:
+            return _MISSING
+        data = data[part]
+    return data
+
+
+def _assign(target: Dict[str, Any], path: List[str], value: Any) -> None:
+    """Set value at path, creating fresh containers (never writing into selected values)."""
+    for part in path[:-1]:
+        target = target.setdefault(part, {})
+    target[path[-1]] = value
+
+
+def _collect_refs(value: Any, refs: List[str]) -> None:
+    if isinstance(value, dict):
+        ref = value.get("$ref")
+        if isinstance(ref, str):
+            refs.append(ref)
+        for child in value.values():
+            _collect_refs(child, refs)
+    elif isinstance(value, list):
+        for child in value:
+            _collect_refs(child, refs)
+
+
+def _split_fields(fields: Optional[str]) -> List[str]:
+    return [f.strip() for f in (fields or "").split(",") if f.strip()]
+
+
+def validate_fields(fields: Optional[str], response_format: Optional[str], format_mapping: Dict[str, str]) -> None:
+    """
+    Reject unknown fields= paths before any work is done (400).
+
+    The top-level key must exist in the chosen version, and paths into the
+    per-format / per-agent maps must name a known format or agent; deeper
+    segments are agent payload and can't be checked up front.
+    """
+    response_format = (response_format or "v1").lower()
+    formats, agents = set(format_mapping), set(format_mapping.values())
+    keyed_maps = {
+        "v1": {("content_generation", "learning_formats"): formats, ("content_generation", "content"): agents},
+        "v2": {("learning_formats",): formats, ("agents",): agents, ("agent_status",): agents},
+    }[response_format]
+
+    for field in _split_fields(fields):
+        path = field.split(".")
+        if path[0] not in RESPONSE_FIELDS[response_format] or "" in path:
+            raise HTTPException(status_code=400, detail=f"Unknown field '{field}'")
+        for prefix, names in keyed_maps.items():
+            if tuple(path[:len(prefix)]) == prefix and len(path) > len(prefix) and path[len(prefix)] not in names:
+                raise HTTPException(status_code=400, detail=f"Unknown field '{field}'")
+
+
+def select_fields(data: Dict[str, Any], fields: Optional[str]) -> Dict[str, Any]:
+    """
+    Sparse field selection: keep only the comma-separated dotted paths.
+
+    Example: fields=learning_formats.summary_cards,lecture_id. Any
+    {"$ref": ...} inside the selection pulls in the referenced payload so the
+    result is self-contained. When paths overlap the broader one wins. Paths
+    are validated up front (validate_fields); ones absent from this particular
+    response (e.g. a key of an agent that failed) are left out.
+    """
+    if not fields:
+        return data
+
+    values: Dict[str, Any] = {}
+    pending = _split_fields(fields)
+    while pending:
+        field = pending.pop(0)
+        if field in values:
+            continue
+        value = _lookup(data, field.split("."))
+        values[field] = value
+        refs: List[str] = []
+        _collect_refs(value, refs)
+        pending.extend(ref for ref in refs if ref not in values)
+
+    selected: Dict[str, Any] = {}
+    for field, value in values.items():
+        covered = any(field.startswith(other + ".") for other in values if other != field)
+        if value is not _MISSING and not covered:
+            _assign(selected, field.split("."), value)
+
+    if "format_version" in data:
+        selected.setdefault("format_version", data["format_version"])
+    return selected
+
+
+def render_pipeline_response(full: Dict[str, Any], response_format: Optional[str], fields: Optional[str],
+                             format_mapping: Dict[str, str]) -> ORJSONResponse:
+    """Apply the requested response format version and field selection."""
+    response_format = (response_format or "v1").lower()
+    if response_format not in RESPONSE_FORMAT_VERSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown response_format '{response_format}'. Available: {list(RESPONSE_FORMAT_VERSIONS)}"
+        )
+    timer = current_timer()
+    if timer is not None:
+        full["timings"] = timer.summary()
+    body = build_slim_response(full, format_mapping) if response_format == "v2" else full
+    return timed_json_response(select_fields(body, fields))
+
+
+def timed_json_response(content: Any) -> ORJSONResponse:
+    """
+    ORJSONResponse whose render time is recorded as the "serialize" stage.
+
+    Pipeline bodies get their timings block before rendering, so serialize
+    only appears in the Server-Timing header.
+    """
+    started = time.perf_counter()
+    response = ORJSONResponse(content)
+    timer = current_timer()
+    if timer is not None:
+        timer.add("serialize", time.perf_counter() - started)
+    return response
+
+
+def etag_header(etag: str) -> str:
+    """
+    Weak validator for a stored payload.
+
+    The tag identifies the payload, not the bytes on the wire, and the same
+    tag is sent whether or not BrotliMiddleware compressed the body.
+    """
+    return f'W/"{etag}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    """True if an If-None-Match header value matches the given ETag."""
+    if not if_none_match or not etag:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or f'"{etag}"' in candidates or f'W/"{etag}"' in candidates
+
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag_header(etag), "Cache-Control": CONTENT_CACHE_CONTROL})
+
+
+def conditional_response(content: Any, if_none_match: Optional[str], etag: Optional[str] = None) -> Response:
+    """
+    Serve content with ETag and Cache-Control headers, or a 304 if the client's copy is current.
+
+    Without an explicit etag the tag is the hash of the rendered body.
+    """
+    response = ORJSONResponse(content)
+    if etag is None:
+        etag = hashlib.sha256(response.body).hexdigest()[:32]
+    if etag_matches(if_none_match, etag):
+        return not_modified_response(etag)
+    response.headers["ETag"] = etag_header(etag)
+    response.headers["Cache-Control"] = CONTENT_CACHE_CONTROL
+    return response
@@ -0,0 +1,120 @@
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+from utils.tracing import span
+
+
+# Timer of the request being served; asyncio tasks spawned by the handler
+# (orchestrator agents) inherit it, so their stages land on the same request
+_current_timer: contextvars.ContextVar = contextvars.ContextVar("stage_timer", default=None)
+
+
+class StageTimer:
+    """Per-request stage durations, rendered as a Server-Timing header and a timings block."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.agents: Dict[str, Dict[str, float]] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        """Add to a stage's duration (repeated stages accumulate)."""
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_agent_call(self, agent_name: str, queue_wait: float, api_time: float) -> None:
+        entry = self.agents.setdefault(agent_name, {"queue": 0.0, "api": 0.0, "calls": 0})
+        entry["queue"] += queue_wait
+        entry["api"] += api_time
+        entry["calls"] += 1
+
+    def summary(self) -> Dict[str, Any]:
+        """Timings block for response bodies (milliseconds, up to the moment of the call)."""
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "stages": {name: round(seconds * 1000, 1) for name, seconds in self.stages.items()},
+            "agents": {
+                name: {
+                    "queue_ms": round(entry["queue"] * 1000, 1),
+                    "api_ms": round(entry["api"] * 1000, 1),
+                    "calls": entry["calls"],
+                }
+                for name, entry in self.agents.items()
+            },
+        }
+
+    def server_timing(self) -> str:
+        """Server-Timing header value (durations in milliseconds)."""
+        metrics = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        for name, entry in self.agents.items():
+            metrics.append(f"agent-{name}-queue;dur={entry['queue'] * 1000:.1f}")
+            metrics.append(f"agent-{name}-api;dur={entry['api'] * 1000:.1f}")
+        metrics.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+def current_timer() -> Optional[StageTimer]:
+    return _current_timer.get()
+
+
+@contextmanager
+def stage(name: str, **attributes):
+    """Time a block as a named stage of the current request, inside a span of the same name."""
+    started = time.perf_counter()
+    try:
+        with span(name, **attributes) as current:
+            yield current
+    finally:
+        timer = _current_timer.get()
+        if timer is not None:
+            timer.add(name, time.perf_counter() - started)
+
+
+def record_agent_call(agent_name: str, queue_wait: float, api_time: float) -> None:
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.add_agent_call(agent_name, queue_wait, api_time)
+
+
+def timings_summary() -> Optional[Dict[str, Any]]:
+    timer = _current_timer.get()
+    return timer.summary() if timer is not None else None
+
+
+class ServerTimingMiddleware:
+    """
+    Pure ASGI middleware: starts a StageTimer per HTTP request, times the
+    request body upload, and adds Server-Timing (plus Timing-Allow-Origin so
+    cross-origin frontends can read it in devtools) to the response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timer = StageTimer()
+        token = _current_timer.set(timer)
+
+        async def timed_receive():
+            message = await receive()
+            if message["type"] == "http.request" and not message.get("more_body", False):
+                timer.add("upload", time.perf_counter() - timer.started)
+            return message
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timer.server_timing().encode("latin-1")))
+                headers.append((b"timing-allow-origin", b"*"))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, timed_receive, send_with_timing)
+        finally:
+            _current_timer.reset(token)
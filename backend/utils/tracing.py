@@ -0,0 +1,357 @@
+import atexit
+import contextvars
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, List
+
+
+SERVICE_NAME = os.getenv("SERVICE_NAME", "studysurf-backend")
+
+# OTLP span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._:-]{1,128}")
+
+LOG_LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("trace_span", default=None)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+class Span:
+    """One timed operation; trace and span IDs follow the W3C / OpenTelemetry formats."""
+    __slots__ = (
+        "name", "kind", "trace_id", "span_id", "parent_id", "request_id", "sampled", "log_sampled",
+        "attributes", "events", "start_ns", "end_ns", "status", "status_message", "is_root"
+    )
+
+    def __init__(self, name: str, kind: int, parent: Optional["Span"] = None,
+                 trace_id: Optional[str] = None, parent_id: Optional[str] = None,
+                 sampled: Optional[bool] = None, request_id: Optional[str] = None):
+        self.name = name
+        self.kind = kind
+        self.span_id = f"{random.getrandbits(64):016x}"
+        if parent is not None:
+            self.trace_id = parent.trace_id
+            self.parent_id = parent.span_id
+            self.request_id = parent.request_id
+            self.sampled = parent.sampled
+            self.log_sampled = parent.log_sampled
+        else:
+            self.trace_id = trace_id or f"{random.getrandbits(128):032x}"
+            self.parent_id = parent_id
+            self.request_id = request_id or self.trace_id
+            self.sampled = sampled if sampled is not None else random.random() < tracer.sample_rate
+            self.log_sampled = random.random() < tracer.log_sample_rate
+        self.is_root = parent is None
+        self.attributes: Dict[str, Any] = {}
+        self.events: List[Dict[str, Any]] = []
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = 0
+        self.status_message: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        self.attributes.update(attributes)
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> None:
+        if self.sampled:
+            self.events.append({"name": name, "time_ns": time.time_ns(), "attributes": attributes or {}})
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.status = STATUS_ERROR
+        self.status_message = str(exc)[:500]
+        self.add_event("exception", {"exception.type": type(exc).__name__, "exception.message": str(exc)[:500]})
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_otlp(self) -> Dict[str, Any]:
+        data = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": _otlp_attributes(self.attributes),
+            "status": {"code": self.status, "message": self.status_message} if self.status_message else {"code": self.status},
+        }
+        if self.parent_id:
+            data["parentSpanId"] = self.parent_id
+        if self.events:
+            data["events"] = [
+                {"timeUnixNano": str(e["time_ns"]), "name": e["name"], "attributes": _otlp_attributes(e["attributes"])}
+                for e in self.events
+            ]
+        return data
+
+
+class Tracer:
+    """
+    Minimal OpenTelemetry-compatible tracer with a collector-free file exporter.
+
+    TRACE_EXPORTER=otlp_json appends finished spans to TRACE_EXPORT_PATH as
+    OTLP/JSON lines (one ExportTraceServiceRequest per line, the format the
+    OpenTelemetry Collector file exporter writes and its otlpjsonfile
+    receiver reads). TRACE_SAMPLE_RATE picks which traces are exported;
+    trace and request IDs are assigned either way so logs stay correlated.
+
+    Finished spans are only buffered on the caller's thread; a background
+    writer thread appends them to the file, woken when a root span ends and
+    at least every TRACE_FLUSH_INTERVAL_SECONDS, so request handlers never
+    wait on disk.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if getattr(self, "initialized", False):
+            return
+        self.initialized = True
+        self.configure(
+            exporter=os.getenv("TRACE_EXPORTER", "off"),
+            path=os.getenv("TRACE_EXPORT_PATH"),
+            sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "1.0")),
+            log_sample_rate=float(os.getenv("LOG_SAMPLE_RATE", "1.0")),
+            log_format=os.getenv("LOG_FORMAT", "json"),
+            log_level=os.getenv("LOG_LEVEL", "info"),
+            flush_interval=float(os.getenv("TRACE_FLUSH_INTERVAL_SECONDS", "1.0"))
+        )
+        atexit.register(self.flush)
+
+    def configure(self, exporter: str = "off", path: Optional[str] = None, sample_rate: float = 1.0,
+                  log_sample_rate: float = 1.0, log_format: str = "json", log_level: str = "info",
+                  flush_interval: float = 1.0) -> None:
+        exporter = exporter.lower()
+        if exporter not in ("off", "otlp_json"):
+            raise ValueError(f"Unknown TRACE_EXPORTER '{exporter}' (expected off or otlp_json)")
+        self.exporter = exporter
+        self.path = path or os.path.join(tempfile.gettempdir(), "studysurf_traces.jsonl")
+        self.sample_rate = sample_rate if exporter != "off" else 0.0
+        self.log_sample_rate = log_sample_rate
+        self.log_format = log_format.lower()
+        self.log_level = LOG_LEVELS.get(log_level.lower(), LOG_LEVELS["info"])
+        self.flush_interval = flush_interval
+        self._buffer: List[Dict[str, Any]] = []
+        self._buffer_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self.exported = 0
+        if self.exporter != "off" and getattr(self, "_writer", None) is None:
+            self._wake = threading.Event()
+            self._writer = threading.Thread(target=self._write_loop, name="trace-writer", daemon=True)
+            self._writer.start()
+
+    def export(self, span: Span) -> None:
+        if self.exporter == "off" or not span.sampled:
+            return
+        with self._buffer_lock:
+            self._buffer.append(span.to_otlp())
+            # A request's spans normally end with its root span: write them together
+            wake = span.is_root or len(self._buffer) >= 256
+        if wake:
+            self._wake.set()
+
+    def _write_loop(self) -> None:
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except OSError as e:
+                sys.stderr.write(f"trace export to {self.path} failed: {e}\n")
+
+    def flush(self) -> None:
+        """Write buffered spans now; called by the writer thread and at exit."""
+        with self._write_lock:
+            with self._buffer_lock:
+                spans, self._buffer = self._buffer, []
+            if not spans:
+                return
+            line = json.dumps({"resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+                "scopeSpans": [{"scope": {"name": "studysurf"}, "spans": spans}],
+            }]}, separators=(",", ":"))
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self.exported += len(spans)
+
+
+tracer = Tracer()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes):
+    """
+    Run a block inside a child span of the current one (or a new trace).
+
+    asyncio tasks created inside the block inherit it; use run_in_context for
+    executor threads.
+    """
+    current = Span(name, kind, parent=_current_span.get())
+    if attributes:
+        current.set_attributes(attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end_ns = time.time_ns()
+        tracer.export(current)
+
+
+def run_in_context(fn, *args, **kwargs):
+    """Callable for run_in_executor that runs fn with the caller's span and request ID."""
+    context = contextvars.copy_context()
+    return lambda: context.run(fn, *args, **kwargs)
+
+
+def gen_ai_usage_attributes(response: Any) -> Dict[str, Any]:
+    """Token counts of a genai response as OpenTelemetry GenAI semantic-convention attributes."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return {}
+    return {
+        "gen_ai.usage.input_tokens": getattr(usage, "prompt_token_count", None),
+        "gen_ai.usage.output_tokens": getattr(usage, "candidates_token_count", None),
+        "gen_ai.usage.total_tokens": getattr(usage, "total_token_count", None),
+    }
+
+
+def log_event(event: str, level: str = "info", **fields) -> None:
+    """
+    Structured log line correlated with the current trace.
+
+    Warnings and errors are always written (and attached to the span);
+    lower levels are kept for a LOG_SAMPLE_RATE share of traces, decided
+    once per trace so a sampled request's log is complete.
+    """
+    severity = LOG_LEVELS.get(level, LOG_LEVELS["info"])
+    if severity < tracer.log_level:
+        return
+    current = _current_span.get()
+    if current is not None and severity < LOG_LEVELS["warning"] and not current.log_sampled:
+        return
+    if current is not None and severity >= LOG_LEVELS["warning"]:
+        current.add_event(event, fields)
+
+    if tracer.log_format == "text":
+        details = " ".join(f"{key}={value}" for key, value in fields.items())
+        print(f"[{level}] {event} {details}".rstrip())
+        return
+    record = {"ts": round(time.time(), 3), "level": level, "event": event}
+    if current is not None:
+        record.update(trace_id=current.trace_id, span_id=current.span_id, request_id=current.request_id)
+    record.update(fields)
+    sys.stdout.write(json.dumps(record, default=str, ensure_ascii=False) + "\n")
+
+
+def _parse_traceparent(value: Optional[str]):
+    """(trace_id, parent span_id, sampled) from a W3C traceparent header, or None."""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or set(parts[1]) == {"0"}:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16), int(parts[3], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], bool(int(parts[3], 16) & 1)
+
+
+class RequestTracingMiddleware:
+    """
+    Pure ASGI middleware: one server span per HTTP request.
+
+    Continues an incoming W3C traceparent, takes the request ID from
+    X-Request-ID (or uses the trace ID), and returns both as X-Request-ID
+    and traceparent response headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        incoming = _parse_traceparent(headers.get("traceparent"))
+        request_id = headers.get("x-request-id", "").strip()
+        if not _REQUEST_ID_PATTERN.fullmatch(request_id):
+            request_id = None
+        root = Span(
+            f"{scope.get('method', 'HTTP')} {scope.get('path', '')}", SPAN_KIND_SERVER,
+            trace_id=incoming[0] if incoming else None,
+            parent_id=incoming[1] if incoming else None,
+            sampled=(incoming[2] and tracer.exporter != "off") if incoming else None,
+            request_id=request_id
+        )
+        root.set_attributes({"http.method": scope.get("method"), "http.target": scope.get("path")})
+        token = _current_span.set(root)
+
+        async def send_with_ids(message):
+            if message["type"] == "http.response.start":
+                root.set_attribute("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    root.status = STATUS_ERROR
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", root.request_id.encode("latin-1")))
+                headers.append((b"traceparent", root.traceparent().encode("latin-1")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_ids)
+        except BaseException as e:
+            root.record_exception(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            root.end_ns = time.time_ns()
+            tracer.export(root)
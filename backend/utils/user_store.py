@@ -0,0 +1,218 @@
+import asyncio
+import copy
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from fastapi import HTTPException, status
+
+
+def build_user_item(user_data: Dict[str, Any], user_id: str, timestamp: str) -> Dict[str, Any]:
+    """Stored user document for signup data."""
+    return {
+        "userId": user_id,
+        "username": user_data["username"],
+        "name": user_data["name"],
+        "passwordHash": user_data["password_hash"],
+        "preferences": {
+            "age": user_data["age"],
+            "academicLevel": user_data["academic_level"],
+            "major": user_data["major"],
+            "dyslexiaSupport": user_data.get("dyslexia_support", False),
+            "languagePreference": user_data.get("language_preference", "English"),
+            "learningStyles": user_data.get("learning_styles", []),
+            "metadata": user_data.get("metadata", []),
+        },
+        "createdAt": timestamp,
+        "updatedAt": timestamp,
+    }
+
+
+def preference_update_data(preferences: Dict[str, Any]) -> Dict[str, Any]:
+    """Field-path update for a preferences change ("name" is top level)."""
+    update_data = {"updatedAt": datetime.utcnow().isoformat()}
+    for key, value in preferences.items():
+        if key == "name":
+            update_data["name"] = value
+        else:
+            update_data[f"preferences.{key}"] = value
+    return update_data
+
+
+def merge_update(user: Dict[str, Any], update_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply an update's field paths to a copy of the document."""
+    merged = copy.deepcopy(user)
+    for field_path, value in update_data.items():
+        target = merged
+        *parents, leaf = field_path.split(".")
+        for part in parents:
+            target = target.setdefault(part, {})
+        target[leaf] = value
+    return merged
+
+
+def username_taken_error() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username already registered")
+
+
+def users_not_found_error(user_ids) -> HTTPException:
+    user_ids = list(user_ids)
+    detail = "User not found" if len(user_ids) == 1 else f"Users not found: {', '.join(user_ids)}"
+    return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail)
+
+
+class UserStore(ABC):
+    """
+    Async user storage used by the auth and profile endpoints.
+
+    Every backend has the same semantics: usernames are unique (a duplicate
+    signup is a 400 "Username already registered"), lookups return None for
+    unknown users, and preference updates return the full updated profile or
+    a 404 if the user does not exist.
+    """
+
+    @abstractmethod
+    async def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a user from signup data and return the stored document."""
+
+    @abstractmethod
+    async def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+        """Get a user by username."""
+
+    @abstractmethod
+    async def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get a user by userId."""
+
+    @abstractmethod
+    async def update_user_preferences(self, user_id: str, preferences: Dict[str, Any]) -> Dict[str, Any]:
+        """Update preferences (or name) and return the updated profile."""
+
+    @abstractmethod
+    async def update_password_hash(self, user_id: str, password_hash: str) -> None:
+        """Replace a user's password hash (rehash on login after a cost change)."""
+
+    @abstractmethod
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Backend counters for /api/cache-stats."""
+
+
+class SQLiteUserStore(UserStore):
+    """
+    SQLite user store (WAL mode, unique username index) for local benchmarks and CI.
+
+    Each worker thread keeps its own connection so reads run concurrently
+    under WAL; writes take the database write lock with BEGIN IMMEDIATE.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv(
+            "USER_STORE_PATH", os.path.join(tempfile.gettempdir(), "studysurf_users.db")
+        )
+        self._local = threading.local()
+        self.reads = 0
+        self.writes = 0
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS users (
+                user_id TEXT PRIMARY KEY,
+                username TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                body TEXT NOT NULL
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users (username);
+        """)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode; write transactions are opened explicitly
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=5.0)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        return {"backend": "sqlite", "path": self.path, "reads": self.reads, "writes": self.writes}
+
+    def _insert_user(self, item: Dict[str, Any]) -> None:
+        try:
+            self._connection().execute(
+                "INSERT INTO users (user_id, username, updated_at, body) VALUES (?, ?, ?, ?)",
+                (item["userId"], item["username"], item["updatedAt"], json.dumps(item))
+            )
+        except sqlite3.IntegrityError:
+            raise username_taken_error()
+        self.writes += 1
+
+    async def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
+        item = build_user_item(user_data, str(uuid.uuid4()), datetime.utcnow().isoformat())
+        await asyncio.to_thread(self._insert_user, item)
+        return item
+
+    def _select_user(self, column: str, value: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(f"SELECT body FROM users WHERE {column} = ?", (value,)).fetchone()
+        self.reads += 1
+        return json.loads(row[0]) if row else None
+
+    async def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._select_user, "username", username)
+
+    async def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._select_user, "user_id", user_id)
+
+    def _apply_updates(self, updates: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Apply field-path updates (userId -> update data) in one write transaction."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = {}
+            for user_id in updates:
+                row = conn.execute("SELECT body FROM users WHERE user_id = ?", (user_id,)).fetchone()
+                if row is not None:
+                    current[user_id] = json.loads(row[0])
+            unknown = [user_id for user_id in updates if user_id not in current]
+            if unknown:
+                raise users_not_found_error(unknown)
+
+            updated_users = {}
+            for user_id, update_data in updates.items():
+                user = merge_update(current[user_id], update_data)
+                conn.execute(
+                    "UPDATE users SET updated_at = ?, body = ? WHERE user_id = ?",
+                    (user["updatedAt"], json.dumps(user), user_id)
+                )
+                updated_users[user_id] = user
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.writes += 1
+        return updated_users
+
+    async def update_user_preferences(self, user_id: str, preferences: Dict[str, Any]) -> Dict[str, Any]:
+        update_data = preference_update_data(preferences)
+        return (await asyncio.to_thread(self._apply_updates, {user_id: update_data}))[user_id]
+
+    async def update_password_hash(self, user_id: str, password_hash: str) -> None:
+        await asyncio.to_thread(self._apply_updates, {user_id: {"passwordHash": password_hash}})
+
+
+def create_user_store() -> UserStore:
+    """Select the user store from USER_STORE_BACKEND (firestore | sqlite | memory)."""
+    backend = os.getenv("USER_STORE_BACKEND", "firestore").lower()
+    if backend == "firestore":
+        from utils.firestore_client import FirestoreClient
+        return FirestoreClient()
+    if backend == "sqlite":
+        return SQLiteUserStore()
+    if backend == "memory":
+        from utils.memory_user_store import InMemoryUserStore
+        return InMemoryUserStore()
+    raise ValueError(f"Unknown USER_STORE_BACKEND '{backend}' (expected firestore, sqlite or memory)")
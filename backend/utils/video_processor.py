@@ -1,7 +1,9 @@
+import asyncio
+import json
 import os
 import tempfile
 from pathlib import Path
-from typing import Dict, Any, Union
+from typing import Dict, Any, Optional, Union
 
 import ffmpeg
 import requests
@@ -11,6 +13,10 @@ import google.genai as genai
 from google.genai import types
 from fastapi import HTTPException
 
+from utils.artifact_store import ArtifactStore, estimate_wav_bytes
+from utils.gemini_cassette import GeminiCassette
+from utils.stage_timer import stage
+
 
 class VideoProcessor:
 
@@ -26,67 +32,125 @@ class VideoProcessor:
         api_key=os.getenv("ELEVENLABS_API_KEY"),
         )
         self.client = genai.Client(api_key=api_key, vertexai=False)
+        self.cassette = GeminiCassette()
+        self.artifacts = ArtifactStore()
         
     def extract_audio(self, video_path: str, return_info: bool = False) -> Union[str, Dict[str, Any]]:
         """Extract audio from video file using ffmpeg."""
+        # Create temporary file for audio
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_audio:
+            audio_path = temp_audio.name
         try:
-            # Create temporary file for audio
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_audio:
-                audio_path = temp_audio.name
-            
             # Get video info first
-            probe = ffmpeg.probe(video_path)
-            video_info = {
-                "duration": float(probe['format']['duration']),
-                "size": int(probe['format']['size']),
-                "format": probe['format']['format_name'],
-                "streams": len(probe['streams'])
-            }
-            
-            # Extract audio using ffmpeg-python
-            # Optimized settings for speech-to-text:
-            # - 16kHz sample rate (optimal for speech recognition)
-            # - mono channel (reduces file size)
-            # - PCM 16-bit (uncompressed, high quality)
-            (
-                ffmpeg
-                .input(video_path)
-                .output(
-                    audio_path, 
-                    acodec='pcm_s16le',  # 16-bit PCM
-                    ar=16000,            # 16kHz sample rate
-                    ac=1                 # mono channel
-                )
-                .overwrite_output()
-                .run(capture_stdout=True, capture_stderr=True)
-            )
+            with stage("ffprobe"):
+                probe = ffmpeg.probe(video_path)
+            video_info = self._video_info(probe)
             
-            # Get audio file info
-            audio_size = os.path.getsize(audio_path)
+            with stage("ffmpeg", **{"media.duration_s": video_info["duration"], "media.size_bytes": video_info["size"]}):
+                self._audio_stream(video_path, audio_path).run(capture_stdout=True, capture_stderr=True)
             
             if return_info:
                 return {
                     "audio_path": audio_path,
                     "video_info": video_info,
-                    "audio_info": {
-                        "path": audio_path,
-                        "size_bytes": audio_size,
-                        "size_mb": round(audio_size / (1024 * 1024), 2),
-                        "sample_rate": 16000,
-                        "channels": 1,
-                        "format": "WAV (PCM 16-bit)"
-                    },
+                    "audio_info": dict(path=audio_path, **self._audio_info(os.path.getsize(audio_path))),
                     "extraction_status": "success"
                 }
-            
             return audio_path
             
         except ffmpeg.Error as e:
+            os.unlink(audio_path)
             error_msg = e.stderr.decode() if e.stderr else str(e)
             raise HTTPException(
                 status_code=500, 
                 detail=f"Audio extraction failed: {error_msg}"
             )
+        except BaseException:
+            if os.path.exists(audio_path):
+                os.unlink(audio_path)
+            raise
+    
+    async def extract_audio_async(self, video_path: str, ttl_seconds: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Extract audio into the artifact store on asyncio subprocesses: doesn't block
+        the event loop, and if ffmpeg fails or the awaiting task is cancelled,
+        ffprobe/ffmpeg are killed and the partial WAV is removed. Returns the
+        extraction info with the audio's artifact ID.
+        """
+        audio = None
+        try:
+            with stage("ffprobe"):
+                probe_output = await _run_process(
+                    ["ffprobe", "-show_format", "-show_streams", "-of", "json", video_path]
+                )
+            video_info = self._video_info(json.loads(probe_output.decode("utf-8")))
+            
+            audio = self.artifacts.create(
+                ".wav", expected_bytes=estimate_wav_bytes(video_info["duration"]),
+                ttl_seconds=ttl_seconds, prefer_memory=True
+            )
+            with stage("ffmpeg", **{"media.duration_s": video_info["duration"], "media.size_bytes": video_info["size"]}):
+                await _run_process(self._audio_stream(video_path, audio.path).compile())
+            self.artifacts.commit(audio)
+            
+            return {
+                "audio_artifact_id": audio.artifact_id,
+                "video_info": video_info,
+                "audio_info": dict(
+                    artifact_id=audio.artifact_id,
+                    expires_at=audio.expires_at,
+                    **self._audio_info(audio.size_bytes)
+                ),
+                "extraction_status": "success"
+            }
+            
+        except ffmpeg.Error as e:
+            self.artifacts.delete(audio.artifact_id if audio else None)
+            error_msg = e.stderr.decode() if e.stderr else str(e)
+            raise HTTPException(
+                status_code=500, 
+                detail=f"Audio extraction failed: {error_msg}"
+            )
+        except BaseException:
+            self.artifacts.delete(audio.artifact_id if audio else None)
+            raise
+    
+    @staticmethod
+    def _audio_stream(video_path: str, audio_path: str):
+        # Optimized settings for speech-to-text:
+        # - 16kHz sample rate (optimal for speech recognition)
+        # - mono channel (reduces file size)
+        # - PCM 16-bit (uncompressed, high quality)
+        return (
+            ffmpeg
+            .input(video_path)
+            .output(
+                audio_path, 
+                acodec='pcm_s16le',  # 16-bit PCM
+                ar=16000,            # 16kHz sample rate
+                ac=1                 # mono channel
+            )
+            .overwrite_output()
+        )
+    
+    @staticmethod
+    def _video_info(probe: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "duration": float(probe['format']['duration']),
+            "size": int(probe['format']['size']),
+            "format": probe['format']['format_name'],
+            "streams": len(probe['streams'])
+        }
+    
+    @staticmethod
+    def _audio_info(audio_size: int) -> Dict[str, Any]:
+        return {
+            "size_bytes": audio_size,
+            "size_mb": round(audio_size / (1024 * 1024), 2),
+            "sample_rate": 16000,
+            "channels": 1,
+            "format": "WAV (PCM 16-bit)"
+        }
     
     def transcribe_audio(self, audio_path: str) -> Dict[str, Any]:
         """Transcribe audio using Gemini API with audio file upload."""
@@ -132,7 +196,9 @@ Return the analysis as a structured JSON object with the following keys:
 
 """
             
-            response = self.client.models.generate_content(
+            response = self.cassette.generate_content(
+                self.client,
+                "video:concepts",
                 model="gemini-2.5-flash",
                 config=types.GenerateContentConfig(
                      system_instruction=prompt,
@@ -184,4 +250,20 @@ Return the analysis as a structured JSON object with the following keys:
             if audio_path and os.path.exists(audio_path):
                 os.unlink(audio_path)
             if os.path.exists(video_path):
-                os.unlink(video_path)
\ No newline at end of file
+                os.unlink(video_path)
+
+
+async def _run_process(args) -> bytes:
+    """Run a command and return its stdout; killed if the awaiting task is cancelled."""
+    process = await asyncio.create_subprocess_exec(
+        *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        process.kill()
+        await process.wait()
+        raise
+    if process.returncode != 0:
+        raise ffmpeg.Error(args[0], stdout, stderr)
+    return stdout
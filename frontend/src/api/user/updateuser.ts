@@ -69,6 +69,12 @@ export async function updateUserPreferences(updateData: UpdateUserRequest): Prom
 
         const updatedProfile: UpdatedUserProfile = await response.json();
 
+        // The pipeline personalizes from the token's preference claims: keep the refreshed token
+        const refreshedToken = response.headers.get('X-Access-Token');
+        if (refreshedToken) {
+            localStorage.setItem('auth_token', refreshedToken);
+        }
+
         // Update stored user data with latest info
         localStorage.setItem('user_data', JSON.stringify(updatedProfile));
 
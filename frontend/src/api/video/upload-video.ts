@@ -35,6 +35,22 @@ export interface ApiError {
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_BASE_URL || 'http://localhost:8000';
 const API_KEY = process.env.NEXT_PUBLIC_API_KEY || 'study_surf_users_secret_key';
 
+// Retries reuse the upload's Idempotency-Key, so the backend attaches them to the
+// pipeline run already in progress (or returns its stored result) instead of rerunning it
+const MAX_UPLOAD_ATTEMPTS = 3;
+const MAX_RETRY_AFTER_SECONDS = 30;
+
+function newIdempotencyKey(): string {
+    if (typeof crypto !== 'undefined' && typeof crypto.randomUUID === 'function') {
+        return crypto.randomUUID();
+    }
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+function sleep(ms: number): Promise<void> {
+    return new Promise(resolve => setTimeout(resolve, ms));
+}
+
 export async function uploadVideo(
     uploadData: UploadVideoRequest,
     onProgress?: (progress: number) => void
@@ -53,16 +69,41 @@ export async function uploadVideo(
         formData.append('subject_preference', uploadData.subject_preference);
         formData.append('auth_token', authToken);
 
-        const response = await fetch(`${API_BASE_URL}/api/process-video-complete`, {
-            method: 'POST',
-            headers: {
-                'Authorization': `Bearer ${authToken}`,
-                'X-API-Key': API_KEY,
-                // Don't set Content-Type header - let browser set it with boundary for FormData
-            },
-            body: formData,
-            
-        });
+        const idempotencyKey = newIdempotencyKey();
+        let response: Response | null = null;
+        for (let attempt = 1; attempt <= MAX_UPLOAD_ATTEMPTS; attempt++) {
+            try {
+                response = await fetch(`${API_BASE_URL}/api/process-video-complete`, {
+                    method: 'POST',
+                    headers: {
+                        'Authorization': `Bearer ${authToken}`,
+                        'X-API-Key': API_KEY,
+                        'Idempotency-Key': idempotencyKey,
+                        // Don't set Content-Type header - let browser set it with boundary for FormData
+                    },
+                    body: formData,
+                });
+            } catch (networkError) {
+                if (attempt === MAX_UPLOAD_ATTEMPTS) {
+                    throw networkError;
+                }
+                await sleep(1000 * 2 ** (attempt - 1));
+                continue;
+            }
+
+            // Server at capacity: wait as told, if it is reasonable, then retry
+            const retryAfter = Number(response.headers.get('Retry-After'));
+            if (response.status === 429 && attempt < MAX_UPLOAD_ATTEMPTS
+                && retryAfter > 0 && retryAfter <= MAX_RETRY_AFTER_SECONDS) {
+                await sleep(retryAfter * 1000);
+                continue;
+            }
+            break;
+        }
+        if (!response) {
+            throw new Error('Network error occurred while uploading video');
+        }
+
         if (!response.ok) {
             if (response.status === 401) {
                 // Token expired or invalid
@@ -75,6 +116,10 @@ export async function uploadVideo(
                 throw new Error('Video file is too large. Please upload a smaller file.');
             }
 
+            if (response.status === 429) {
+                throw new Error('The server is busy processing other videos. Please try again in a minute.');
+            }
+
             let errorMessage = 'Failed to upload video';
             try {
                 const errorData: ApiError = await response.json();